@@ -0,0 +1,130 @@
+#!/usr/bin/env python3
+# Benchmarks for the data preparation helpers, run on synthetic data.
+#
+# Usage: python benchmarks.py <benchmark name> [--sizes N N ...]
+
+import argparse
+import time
+
+import numpy as np
+import pandas as pd
+
+from dataframe_utils import coalesce_duplicate_columns, remove_duplicates_keep_least_nulls
+from mutation_matrix import build_mutation_matrix
+
+
+# Generate a synthetic MAF table with n_rows mutations spread over the given
+# number of samples and genes.
+def synthetic_maf(n_rows, n_samples, n_genes, seed=42):
+    rng = np.random.default_rng(seed)
+    consequences = np.array(['missense_variant', 'stop_gained', 'frameshift_variant',
+                             'splice_donor_variant', 'inframe_deletion'])
+    return pd.DataFrame({
+        'Hugo_Symbol': 'GENE' + pd.Series(rng.integers(0, n_genes, n_rows)).astype(str),
+        'Tumor_Sample_Barcode': 'P-' + pd.Series(rng.integers(0, n_samples, n_rows)).astype(str) + '-T01',
+        'Consequence': consequences[rng.integers(0, len(consequences), n_rows)],
+    })
+
+
+# Time a function call, best of `repeats`.
+def best_time(func, repeats=3):
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def benchmark_mutation_matrix(sizes):
+    """
+    Time build_mutation_matrix() for growing MAF sizes (468 IMPACT-sized gene
+    list, one sample per ~10 mutations) and report the time per MAF row, which
+    stays roughly constant when the builder scales linearly.
+    """
+    n_genes = 468
+    genes = [f'GENE{g}' for g in range(n_genes)]
+
+    print(f"{'MAF rows':>12} {'value':>12} {'seconds':>10} {'us/row':>10}")
+    for n_rows in sizes:
+        maf = synthetic_maf(n_rows, n_samples=max(1, n_rows // 10), n_genes=n_genes)
+        for value in ('consequence', 'count', 'binary'):
+            seconds = best_time(lambda: build_mutation_matrix(maf, genes, value=value))
+            print(f"{n_rows:>12} {value:>12} {seconds:>10.3f} {seconds / n_rows * 1e6:>10.2f}")
+
+
+# Generate a synthetic merged patient-sample table with n_rows rows, about two
+# rows per patient and a random share of nulls in every column.
+def synthetic_patient_samples(n_rows, n_columns=30, null_share=0.3, seed=42):
+    rng = np.random.default_rng(seed)
+    data = {'PATIENT_ID': 'P-' + pd.Series(rng.integers(0, max(1, n_rows // 2), n_rows)).astype(str)}
+    for i in range(n_columns):
+        values = pd.Series(rng.random(n_rows)) if i % 2 else 'V' + pd.Series(rng.integers(0, 5, n_rows)).astype(str)
+        data[f'COLUMN_{i}'] = values.mask(rng.random(n_rows) < null_share)
+    return pd.DataFrame(data)
+
+
+# Previous row-wise version of remove_duplicates_keep_least_nulls(), kept as
+# the baseline of the benchmark.
+def remove_duplicates_keep_least_nulls_rowwise(df, key_column):
+    df = df.copy()
+    df['_non_null_counts'] = df.apply(lambda row: row.notnull().sum(), axis=1)
+    df = df.sort_values(by=[key_column, '_non_null_counts'], ascending=[True, False])
+    df = df.drop_duplicates(subset=key_column, keep='first')
+    return df.drop(columns=['_non_null_counts'])
+
+
+def benchmark_remove_duplicates(sizes):
+    """
+    Compare remove_duplicates_keep_least_nulls() with the previous row-wise
+    version on synthetic merged patient-sample tables and check that both
+    keep the same rows in the same order.
+    """
+    print(f"{'rows':>12} {'row-wise s':>12} {'vectorized s':>14} {'speedup':>9} {'identical':>10}")
+    for n_rows in sizes:
+        df = synthetic_patient_samples(n_rows)
+        rowwise_seconds = best_time(lambda: remove_duplicates_keep_least_nulls_rowwise(df, 'PATIENT_ID'), repeats=1)
+        vectorized_seconds = best_time(lambda: remove_duplicates_keep_least_nulls(df, 'PATIENT_ID'))
+        identical = remove_duplicates_keep_least_nulls_rowwise(df, 'PATIENT_ID').equals(
+            remove_duplicates_keep_least_nulls(df, 'PATIENT_ID'))
+        print(f"{n_rows:>12} {rowwise_seconds:>12.3f} {vectorized_seconds:>14.3f} "
+              f"{rowwise_seconds / vectorized_seconds:>8.1f}x {str(identical):>10}")
+
+
+# Previous row-wise column coalescing of data_prep_dev.py, kept as the
+# baseline of the benchmark.
+def coalesce_duplicate_columns_rowwise(df):
+    return df.fillna('').astype(str).groupby(level=0, axis=1).apply(
+        lambda x: x.apply(lambda y: next((item for item in y if item), ''), axis=1))
+
+
+def benchmark_coalesce_columns(sizes):
+    """
+    Compare coalesce_duplicate_columns() with the previous row-wise version on
+    synthetic tables where every harmonized column has three synonym columns.
+    """
+    print(f"{'rows':>12} {'row-wise s':>12} {'vectorized s':>14} {'speedup':>9}")
+    for n_rows in sizes:
+        df = synthetic_patient_samples(n_rows, n_columns=12)
+        df.columns = ['PATIENT_ID'] + [f'COLUMN_{i % 4}' for i in range(12)]
+        rowwise_seconds = best_time(lambda: coalesce_duplicate_columns_rowwise(df), repeats=1)
+        vectorized_seconds = best_time(lambda: coalesce_duplicate_columns(df))
+        print(f"{n_rows:>12} {rowwise_seconds:>12.3f} {vectorized_seconds:>14.3f} "
+              f"{rowwise_seconds / vectorized_seconds:>8.1f}x")
+
+
+BENCHMARKS = {
+    'coalesce_columns': (benchmark_coalesce_columns, [1_000, 10_000, 100_000]),
+    'mutation_matrix': (benchmark_mutation_matrix, [10_000, 100_000, 1_000_000]),
+    'remove_duplicates': (benchmark_remove_duplicates, [10_000, 100_000, 1_000_000]),
+}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the data preparation helpers on synthetic data.')
+    parser.add_argument('benchmark', choices=sorted(BENCHMARKS), help='Benchmark to run.')
+    parser.add_argument('--sizes', type=int, nargs='+', help='Input sizes (rows) to benchmark.')
+    args = parser.parse_args()
+
+    func, default_sizes = BENCHMARKS[args.benchmark]
+    func(args.sizes or default_sizes)
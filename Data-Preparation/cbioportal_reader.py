@@ -0,0 +1,268 @@
+#!/usr/bin/env python3
+# Read cBioPortal data files (data_clinical_*.txt, data_mutations.txt, ...).
+#
+# cBioPortal files may start with '#' metadata lines. The clinical files carry
+# four of them (display names, descriptions, datatypes and priorities of the
+# columns), MAF files may carry e.g. '#version 2.4'. The reader skips these lines
+# while streaming through the file once and keeps them in a header dict; the
+# source file is never rewritten.
+#
+# Parsed tables can be cached as Parquet (see read_cached_table()): the first
+# read of a file parses the tab separated text and stores the table together
+# with a manifest holding the source file's size, mtime and content hash. Later
+# reads are served from the Parquet copy and only load the requested columns.
+# A cache entry is used when the source size and mtime are unchanged, or when
+# the mtime changed but the content hash did not.
+
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+
+# Names of the metadata rows of cBioPortal clinical files, in file order.
+CLINICAL_METADATA_ROWS = ['display_name', 'description', 'datatype', 'priority']
+
+
+def parse_metadata_lines(metadata_lines, columns):
+    """
+    Parse the '#' metadata lines of a cBioPortal file into a header dict.
+
+    Parameters:
+    metadata_lines (list): The metadata lines, without the leading '#'.
+    columns (list): The column names of the table.
+
+    Returns:
+    dict: {'lines': the raw metadata lines,
+           'columns': {column: {'display_name': ..., 'description': ...,
+                                'datatype': ..., 'priority': ...}}}
+          'columns' is only filled for files using the clinical metadata layout.
+    """
+    header = {'lines': list(metadata_lines), 'columns': {}}
+
+    rows = [line.split('\t') for line in metadata_lines]
+    if len(rows) == len(CLINICAL_METADATA_ROWS) and all(len(row) == len(columns) for row in rows):
+        for i, column in enumerate(columns):
+            header['columns'][column] = {name: row[i] for name, row in zip(CLINICAL_METADATA_ROWS, rows)}
+
+    return header
+
+
+def read_cbioportal_table(file_path, **read_csv_kwargs):
+    """
+    Read a tab separated cBioPortal file, skipping (and keeping) its leading '#'
+    metadata lines. The file is streamed once: the metadata lines are consumed,
+    then pandas parses the rest starting at the header line.
+
+    Parameters:
+    file_path (str): Path to the file.
+    **read_csv_kwargs: Extra arguments for pandas.read_csv (e.g. usecols).
+
+    Returns:
+    tuple: (pandas.DataFrame, dict) - the table and its header dict, see
+        parse_metadata_lines().
+    """
+    read_csv_kwargs = {'header': 0, 'delimiter': '\t', 'low_memory': False, **read_csv_kwargs}
+
+    metadata_lines = []
+    with open(file_path, 'r') as file:
+        # Consume the metadata lines and remember where the header line starts.
+        while True:
+            header_offset = file.tell()
+            line = file.readline()
+            if not line.startswith('#'):
+                break
+            metadata_lines.append(line[1:].rstrip('\r\n'))
+        columns = line.rstrip('\r\n').split(read_csv_kwargs['delimiter'])
+
+        file.seek(header_offset)
+        df = pd.read_csv(file, **read_csv_kwargs)
+
+    return df, parse_metadata_lines(metadata_lines, columns)
+
+
+# Default directory of the Parquet cache (relative to the working directory).
+DEFAULT_CACHE_DIR = '.study_cache'
+
+# Bytes read at a time when hashing a source file.
+HASH_BLOCK_SIZE = 1 << 20
+
+
+# Hash the content of a file, block by block.
+def content_hash(file_path):
+    sha1 = hashlib.sha1()
+    with open(file_path, 'rb') as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b''):
+            sha1.update(block)
+    return sha1.hexdigest()
+
+
+# Path (without extension) of the cache entry of a source file.
+def _entry_path(file_path, cache_dir):
+    key = hashlib.sha1(os.path.abspath(file_path).encode()).hexdigest()[:16]
+    name = os.path.basename(os.path.dirname(os.path.abspath(file_path)))
+    return os.path.join(cache_dir, f"{name}_{os.path.basename(file_path)}_{key}")
+
+
+# Make object columns storable as Parquet: columns mixing strings with other
+# types (e.g. numbers) get all their non-null values as strings.
+def _arrow_safe(df):
+    df = df.copy()
+    for column in df.columns[df.dtypes == 'object']:
+        if pd.api.types.infer_dtype(df[column], skipna=True) not in ('string', 'empty'):
+            df[column] = df[column].where(df[column].isna(), df[column].astype(str))
+    return df
+
+
+def _read_manifest(manifest_path):
+    if not os.path.isfile(manifest_path):
+        return None
+    with open(manifest_path, 'r') as file:
+        return json.load(file)
+
+
+def _write_manifest(manifest_path, manifest):
+    with open(manifest_path, 'w') as file:
+        json.dump(manifest, file, indent=1)
+
+
+# Check if a cache entry matches the current source file.
+def _is_valid(manifest, file_path, manifest_path):
+    stat = os.stat(file_path)
+    if manifest is None or manifest['size'] != stat.st_size:
+        return False
+    if manifest['mtime_ns'] == stat.st_mtime_ns:
+        return True
+    # Touched but possibly unchanged (e.g. re-downloaded): compare the content.
+    if manifest['sha1'] != content_hash(file_path):
+        return False
+    manifest['mtime_ns'] = stat.st_mtime_ns
+    _write_manifest(manifest_path, manifest)
+    return True
+
+
+def read_cached_table(file_path, cache_dir=DEFAULT_CACHE_DIR, columns=None):
+    """
+    Read a cBioPortal table through the Parquet cache.
+
+    Parameters:
+    file_path (str): Path to the source file.
+    cache_dir (str): Directory holding the cache entries.
+    columns (list, optional): Columns to load (returned in file order). Columns
+        missing in the file are ignored. Defaults to all columns.
+
+    Returns:
+    tuple: (pandas.DataFrame, dict, bool) - the table, its header dict (see
+        cbioportal_reader.parse_metadata_lines()) and whether it was served
+        from the cache.
+    """
+    entry = _entry_path(file_path, cache_dir)
+    parquet_path, manifest_path = entry + '.parquet', entry + '.json'
+
+    manifest = _read_manifest(manifest_path)
+    if _is_valid(manifest, file_path, manifest_path) and os.path.isfile(parquet_path):
+        if columns is not None:
+            columns = [c for c in manifest['columns'] if c in columns]
+        return pd.read_parquet(parquet_path, columns=columns), manifest['header'], True
+
+    # Cache miss: parse the source file and store all of its columns.
+    df, header = read_cbioportal_table(file_path)
+    df = _arrow_safe(df)
+    os.makedirs(cache_dir, exist_ok=True)
+    df.to_parquet(parquet_path, index=False)
+    stat = os.stat(file_path)
+    _write_manifest(manifest_path, {
+        'source': os.path.abspath(file_path),
+        'size': stat.st_size,
+        'mtime_ns': stat.st_mtime_ns,
+        'sha1': content_hash(file_path),
+        'columns': list(df.columns),
+        'header': header,
+    })
+
+    if columns is not None:
+        df = df[[c for c in df.columns if c in columns]]
+    return df, header, False
+
+
+# Read one file and time it (runs in a worker process). Reads through the
+# Parquet cache if cache_dir is given.
+def _read_table_timed(file_path, cache_dir=None, columns=None):
+    start = time.perf_counter()
+    if cache_dir:
+        df, header, cached = read_cached_table(file_path, cache_dir, columns)
+    else:
+        df, header = read_cbioportal_table(file_path, usecols=lambda c: columns is None or c in columns)
+        cached = False
+    return df, header, cached, time.perf_counter() - start
+
+
+def load_studies(data_dirs, file_names, n_workers=None, cache_dir=None, columns=None):
+    """
+    Read the files of several cBioPortal studies, parsing the (study, file kind)
+    pairs in parallel worker processes.
+
+    NOTE: On platforms that start worker processes by spawning (Windows, macOS),
+    the workers re-import the calling script, so the script must guard its
+    top-level code with `if __name__ == '__main__':` when n_workers > 1.
+
+    Parameters:
+    data_dirs (list): Paths to the study directories.
+    file_names (dict): File kind -> file name, e.g.
+        {'patient': 'data_clinical_patient.txt', 'mutation': 'data_mutations.txt'}.
+    n_workers (int, optional): Number of worker processes. Defaults to the
+        number of CPUs; 1 reads the files in the calling process.
+    cache_dir (str, optional): Read the files through the Parquet cache in
+        this directory, see read_cached_table().
+    columns (dict, optional): File kind -> columns to load. File kinds not in
+        the dict are loaded with all columns.
+
+    Returns:
+    tuple: (data, headers, timings)
+        data (dict): File kind -> {study path: pandas.DataFrame}. Studies
+            without the file are left out.
+        headers (dict): File kind -> {study path: header dict}.
+        timings (pandas.DataFrame): Per file wall time (seconds), rows/sec and
+            whether the file was served from the cache.
+    """
+    n_workers = n_workers or os.cpu_count() or 1
+
+    columns = columns or {}
+    jobs = [(kind, path, os.path.join(path, name))
+            for kind, name in file_names.items()
+            for path in data_dirs
+            if os.path.isfile(os.path.join(path, name))]
+
+    # Hand out the largest files first so the workers finish at about the same time.
+    jobs_by_size = sorted(jobs, key=lambda job: os.path.getsize(job[2]), reverse=True)
+    file_paths = [file_path for _, _, file_path in jobs_by_size]
+    job_columns = [columns.get(kind) for kind, _, _ in jobs_by_size]
+    cache_dirs = [cache_dir] * len(jobs)
+
+    start = time.perf_counter()
+    if n_workers == 1:
+        results = list(map(_read_table_timed, file_paths, cache_dirs, job_columns))
+    else:
+        with ProcessPoolExecutor(max_workers=n_workers) as executor:
+            results = list(executor.map(_read_table_timed, file_paths, cache_dirs, job_columns))
+    total_seconds = time.perf_counter() - start
+    results = dict(zip(file_paths, results))
+
+    data = {kind: {} for kind in file_names}
+    headers = {kind: {} for kind in file_names}
+    timing_rows = []
+    for kind, path, file_path in jobs:
+        df, header, cached, seconds = results[file_path]
+        data[kind][path] = df
+        headers[kind][path] = header
+        timing_rows.append({'file': file_path, 'kind': kind, 'rows': len(df), 'cached': cached, 'seconds': seconds,
+                            'rows_per_sec': len(df) / seconds if seconds > 0 else float('nan')})
+
+    timings = pd.DataFrame(timing_rows, columns=['file', 'kind', 'rows', 'cached', 'seconds', 'rows_per_sec'])
+    print(f"Read {len(jobs)} files with {n_workers} worker(s) in {total_seconds:.2f} s:")
+    print(timings.to_string(index=False, float_format=lambda x: f"{x:.2f}"))
+
+    return data, headers, timings
@@ -9,6 +9,11 @@ import glob
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from cbioportal_reader import load_studies
+from dataframe_utils import remove_duplicates_keep_least_nulls
+from harmonization import compile_harmonization_files, harmonize
+from mutation_matrix import add_mutation_columns
+
 
 # DEFINE PARAMETERS
 ### Move some of these to config file?
@@ -17,11 +22,24 @@ mutations_file = "mutations.txt"
 column_names_config_file = "column_names_config.txt"
 columns_of_interest_file = "columns_of_interest.txt"
 column_names_harmonization_file = "column_names_harmonization.txt"
+categories_harmonization_file = "categories_harmonization.txt"
 
 # File names from cBioPortal: 
 patient_file_name = 'data_clinical_patient.txt'
 sample_file_name = 'data_clinical_sample.txt'
 mutation_file_name = 'data_mutations.txt'
+study_file_names = {'patient': patient_file_name, 'sample': sample_file_name, 'mutation': mutation_file_name}
+
+# Number of worker processes used to parse the study files.
+# NOTE: On Windows/macOS the workers re-import this script, which runs its
+# top-level code; keep this at 1 there.
+n_workers = 1
+
+# Directory of the Parquet cache of parsed study files (None disables the cache).
+study_cache_dir = ".study_cache"
+
+# Columns loaded from the mutation files.
+mutation_columns = ['Tumor_Sample_Barcode', 'Hugo_Symbol', 'Consequence', 'Variant_Classification', 'Mutation_Status']
 
 
 
@@ -53,33 +71,6 @@ def get_data_dirs(directory):
     return data_dirs
 
 
-# Remove commented lines (start with '#') from data files
-def remove_commented_lines(path_list, name):
-    for path in path_list:
-        # Define file paths
-        file_path = os.path.join(path, name)
-        # read files
-        with open(file_path, 'r') as file:
-            lines = file.readlines()
-        # Write file, keep only lines that do not start with '#'
-        keep_lines = [line for line in lines if not line.startswith('#')]
-        
-        with open(file_path, 'w') as file:
-            file.writelines(keep_lines)
-
-
-# Read file that matches name in path into dictionary of dataframes
-# Loop over directories included
-def read_data_to_dict(path_list, name, data_dict):
-    for path in path_list:
-    # Read data files:
-        file_path = os.path.join(path, name)
-        if os.path.isfile(file_path):
-            df = pd.read_csv(file_path, header=0, delimiter='\t', low_memory=False)
-            data_dict[path] = df
-            print("Successfully read: " + file_path)
-
-
 # Add column containing study name to each df
 def add_dataframe_name_column(dataframes_dict):
     for df_name in dataframes_dict:
@@ -102,75 +93,6 @@ def concatenate_dfs(df_dict):
     return concatinated_df
 
 
-def remove_duplicates_keep_least_nulls(df, key_column):
-    """
-    Remove duplicate rows based on a key column while keeping the row 
-    with the fewest null values in other columns.
-
-    Parameters:
-    df (pandas.DataFrame): The DataFrame to process.
-    key_column (str): The name of the column to identify duplicates.
-
-    Returns:
-    pandas.DataFrame: DataFrame with duplicates removed.
-    """
-    # Count non-null values in each row
-    non_null_counts = df.apply(lambda row: row.notnull().sum(), axis=1)
-
-    # Add the counts as a temporary column
-    df['_non_null_counts'] = non_null_counts
-
-    # Sort by key column and non-null counts (descending)
-    df = df.sort_values(by=[key_column, '_non_null_counts'], ascending=[True, False])
-
-    # Drop duplicates keeping the first (which has the most non-null values)
-    df = df.drop_duplicates(subset=key_column, keep='first')
-
-    # Drop the temporary count column
-    df = df.drop(columns=['_non_null_counts'])
-
-    return df
-
-
-# PARSE column_name_harmonization.txt
-def parse_column_name_harmonization(file_path):
-    parsed_dict = {}
-    with open(file_path, 'r') as file:
-        for line in file:
-            line = line.strip()
-            if not line.startswith('#'):
-                parts = line.split('=')
-                if len(parts) == 2:
-                    key, values = parts
-                    key = key.strip()
-                    values = [value.strip() for value in values.split(',')]
-                    parsed_dict[key] = values
-                else:
-                    print(f"Ignoring line: {line} - Does not match expected format")
-
-    return parsed_dict
-
-
-def rename_columns_based_on_synonyms(dataframe, synonyms_dict):
-    """
-    Renames columns in the DataFrame based on the provided synonyms dictionary.
-
-    Args:
-    dataframe (pd.DataFrame): The DataFrame whose columns need to be renamed.
-    synonyms_dict (dict): A dictionary where each key is the new column name,
-                          and the value is a list of synonyms for that column.
-
-    Returns:
-    pd.DataFrame: The DataFrame with renamed columns.
-    """
-    for new_column_name, synonyms in synonyms_dict.items():
-        for synonym in synonyms:
-            if synonym in dataframe.columns:
-                dataframe.rename(columns={synonym: new_column_name}, inplace=True)
-
-    return dataframe
-
-
 #### DEV BELOW ####
 #### DEV BELOW ####
 #### DEV BELOW ####
@@ -210,32 +132,33 @@ for mut in mutations_of_interest_list:
     print(mut)
 
 
-# GET PATH to directories included in data folder
-data_included = get_data_dirs(data_path)
-
-
-# REMOVE COMMENTED LINES from data files
-    # Clinical data: 
-remove_commented_lines(data_included, patient_file_name)
-    # Sample data: 
-remove_commented_lines(data_included, sample_file_name)
-    # Mutations data:
-remove_commented_lines(data_included, mutation_file_name)
+# READ columns of interest txt file
+keep_cols = read_lines_from_file(columns_of_interest_file)
+print("columns of interest:")
+for col in keep_cols:
+    print(col)
 
 
-# DEFINE DICTIONARIES to store dataframes
-patient_dfs = {}
-sample_dfs = {}
-mutation_dfs = {}
+# GET PATH to directories included in data folder
+data_included = get_data_dirs(data_path)
 
 
-# READ DATA tables into dictionaries of dataframes
+# READ DATA tables into dictionaries of dataframes (one per file kind),
+# parsing the files of all studies in n_workers processes. The '#' metadata lines of each
+# file are kept in the headers dictionaries. Parsed files are cached as Parquet
+# and only the columns of interest are loaded from the clinical tables.
+columns_to_load = {'patient': keep_cols, 'sample': keep_cols, 'mutation': mutation_columns}
+study_data, study_headers, read_timings = load_studies(data_included, study_file_names, n_workers,
+                                                       cache_dir=study_cache_dir, columns=columns_to_load)
     # Clinical data: 
-read_data_to_dict(data_included, patient_file_name, patient_dfs)
+patient_dfs = study_data['patient']
+patient_headers = study_headers['patient']
     # Sample data:
-read_data_to_dict(data_included, sample_file_name, sample_dfs)
+sample_dfs = study_data['sample']
+sample_headers = study_headers['sample']
     # Mutations data: 
-read_data_to_dict(data_included, mutation_file_name, mutation_dfs)
+mutation_dfs = study_data['mutation']
+mutation_headers = study_headers['mutation']
 
 
 # ADD STUDY NAME as column to dataframes in dictionaries
@@ -277,13 +200,6 @@ all_patient_sample_data = pd.merge(all_patient_data, all_sample_data, on='PATIEN
 all_patient_sample_data = remove_duplicates_keep_least_nulls(all_patient_sample_data, 'PATIENT_ID')
 
 
-# READ columns of interest txt file
-keep_cols = read_lines_from_file(columns_of_interest_file)
-print("columns of interest:")
-for col in keep_cols:
-    print(col)
-
-
 # FILTER: Keep only columns of interest
 all_patient_sample_data_filtered = all_patient_sample_data.filter(keep_cols)
 
@@ -307,17 +223,15 @@ plt.show()
 ### TEMP ANALYTICS ###
 
 
-# Read lists of column name synonyms to dict
-column_name_synonyms = {}
-column_name_synonyms = parse_column_name_harmonization(column_names_harmonization_file)
-
+# COMPILE the column name synonyms and category harmonization files
+# into lookup tables
+harmonization_tables = compile_harmonization_files(column_names_harmonization_file, categories_harmonization_file)
 
-# HARMONIZE Column names based on synonyms in dict
-all_patient_sample_data_filtered = rename_columns_based_on_synonyms(all_patient_sample_data_filtered, column_name_synonyms)
 
-# GROUP BY column name, keep only one entry if for each row
-# for columns that share the same name
-all_patient_sample_data_filtered = all_patient_sample_data_filtered.fillna('').astype(str).groupby(level=0, axis=1).apply(lambda x: x.apply(lambda y: next((item for item in y if item), ''), axis=1))
+# HARMONIZE column names and categories: rename synonym columns,
+# keep the first non-null entry of columns that share the same name
+# and map the categories to their harmonized names
+all_patient_sample_data_filtered = harmonize(all_patient_sample_data_filtered, harmonization_tables)
 
 
 print(all_patient_sample_data_filtered.columns)
@@ -356,53 +270,12 @@ tmp_df = merged_df[['TISSUE_SOURCE_SITE', 'PRIMARY_SITE']]
 ### TEMP ###
 
 
-#### STUCK HERE #####
-
 # ADD MUTATION columns
 
-# Add column for each mutation in mutations list. 
-for mutation in mutations_of_interest_list:
-    patient_sample_data[mutation] = 'WT'
-    
-
-# Create a mask for the rows of interest in all_mutations_data
-mask = all_mutations_data['Hugo_Symbol'].isin(mutations_of_interest_list)
-
-# Filter rows in all_mutations_data and extract relevant columns
-filtered_mutations_data = all_mutations_data.loc[mask, ['Tumor_Sample_Barcode', 'Hugo_Symbol', 'Consequence']]    
-
-for index_ps, row_ps in patient_sample_data.iterrows():
-    for index_mut, row_mut in all_mutations_data.iterrows():
-        if ow_ps['SAMPLE_ID'] == row_mut['Tumor_Sample_Barcode']:
-            
-
-
-# FIRST FILTER dataset
-
-for index_mut, row_mut in all_mutations_data.iterrows():
-    mut_sampleid = row_mut['Tumor_Sample_Barcode']
-    hugo_symbol = row_mut['Hugo_Symbol']
-    consequence = row_mut['Consequence']
-    
-    for index_ps, row_ps in patient_sample_data.iterrows():
-        if hugo_symbol in mutations_of_interest_list:
-            if row_ps['SAMPLE_ID'] == mut_sampleid:
-                row_ps[hugo_symbol] = consequence
-            
-
-# From ChatGPT: 
-
-
-# Merge the filtered data into patient_sample_data based on SAMPLE_ID and Hugo_Symbol
-merged_data = patient_sample_data.merge(filtered_mutations_data, how='left', left_on='SAMPLE_ID', right_on='Tumor_Sample_Barcode')
-
-# Update the columns in patient_sample_data with non-null values from Consequence
-for gene in mutations_of_interest_list:
-    mask = merged_data['Hugo_Symbol'] == gene
-    patient_sample_data[gene].update(merged_data.loc[mask, 'Consequence'])
-
-
-#### STUCK HERE #####^
+# Add column for each mutation in mutations list, holding 'WT' or the
+# consequence(s) of the sample's mutations in that gene. Built with a single
+# group-by pass over the MAF rows (see mutation_matrix.py).
+all_patient_sample_data_filtered = add_mutation_columns(all_patient_sample_data_filtered, all_mutations_data, mutations_of_interest_list)
             
 
 
@@ -412,14 +285,9 @@ for gene in mutations_of_interest_list:
 # STEP 3: Get input for categories harmonization
 #----------------------------------------------
 
-# WRITE categorical entries for each column to a text file:
-write_categorical_columns_to_file(patient_sample_df_colnames_harmonized, "categories_harmonization.txt")
-
-
-# DEFINE column names config string
-categories_harmonization_string = "# Please define the categories that represent the same information in this text file following the example rows below, excluding hashes\n"
-categories_harmonization_string = categories_harmonization_string + '# "SMOKING_STATUS": "SMOKER"="YES", "NO"="NON-SMOKER"="N"\n'
-categories_harmonization_string = categories_harmonization_string + '# "SEX": "MALE"="M"="male", "FEMALE"="F"="female"'
+# WRITE categorical entries for each column to a text file, as a
+# starting point for new lines in categories_harmonization.txt:
+write_categorical_columns_to_file(all_patient_sample_data_filtered, "categories_found.txt")
 
 
 
@@ -441,15 +309,8 @@ all_mutations_data = all_mutations_data[['Tumor_Sample_Barcode', 'Hugo_Symbol',
 mutations_data = all_mutations_data[all_mutations_data['Hugo_Symbol'].isin(mutations_of_interest_list)]
 
 
-# Add column for each mutation in mutations list. 
-for mutation in mutations_of_interest_list:
-    patient_sample_data[mutation] = 'WT'
-
-# Add mutations of interest data 
-for index, row in patient_sample_data.iterrows():
-    if row['SAMPLE_ID'] == all_mutations_data['Tumor_Sample_Barcode']:
-        tempvar = all_mutations_data['Hugo_Symbol']
-        patient_sample_data[tempvar] = all_mutations_data['Consequence']
+# Add column for each mutation in mutations list (WT / consequence).
+patient_sample_data = add_mutation_columns(patient_sample_data, mutations_data, mutations_of_interest_list)
 
 
 # Remove duplicate patient data
@@ -0,0 +1,75 @@
+#!/usr/bin/env python3
+# Vectorized DataFrame helpers used while merging the cBioPortal studies.
+
+import numpy as np
+import pandas as pd
+
+
+def remove_duplicates_keep_least_nulls(df, key_column):
+    """
+    Remove duplicate rows based on a key column while keeping the row
+    with the fewest null values in other columns.
+
+    The non-null counts are computed with one vectorized reduction. The rows
+    are then ordered with a stable np.lexsort on group number and descending
+    count, and the first row of every group in that order is kept, so no
+    Python code runs per row or per group.
+    Ties are resolved in favour of the first row, rows with a null key are
+    treated as one group, and the result is ordered by key (null key last),
+    as with the previous sort/drop_duplicates version.
+
+    Parameters:
+    df (pandas.DataFrame): The DataFrame to process (left unchanged).
+    key_column (str): The name of the column to identify duplicates.
+
+    Returns:
+    pandas.DataFrame: DataFrame with duplicates removed.
+    """
+    # Count non-null values in each row
+    non_null_counts = df.notna().sum(axis=1).to_numpy()
+
+    # Number the keys in sorted order (the null key last).
+    groups = df.groupby(key_column, sort=True, dropna=False).ngroup().to_numpy()
+
+    # Order rows by group, most non-null values first; the sort is stable, so
+    # the first row of each group is its first row with the most values.
+    order = np.lexsort((-non_null_counts, groups))
+    sorted_groups = groups[order]
+    first_in_group = np.ones(len(order), dtype=bool)
+    first_in_group[1:] = sorted_groups[1:] != sorted_groups[:-1]
+
+    return df.iloc[order[first_in_group]]
+
+
+def coalesce_duplicate_columns(df):
+    """
+    Collapse columns sharing the same name (e.g. synonyms renamed to one
+    harmonized name) into one column holding, per row, the first non-null
+    value of the group. Empty strings count as null.
+
+    Each group is filled column by column with vectorized where calls, so the
+    cost is linear in rows x duplicated columns. Numeric columns stay numeric
+    (e.g. TMB or ages); a group mixing numbers and strings becomes object.
+
+    Parameters:
+    df (pandas.DataFrame): The DataFrame to process (left unchanged).
+
+    Returns:
+    pandas.DataFrame: DataFrame with unique column names, in order of first
+        appearance.
+    """
+    if df.columns.is_unique:
+        return df.copy()
+
+    columns = {}
+    for position, name in enumerate(df.columns):
+        column = df.iloc[:, position]
+        if column.dtype == object:
+            column = column.mask(column == '')
+        if name not in columns:
+            columns[name] = column
+        else:
+            # Fill by position, the index may hold duplicate labels.
+            columns[name] = columns[name].where(columns[name].notna(), column.to_numpy())
+
+    return pd.DataFrame(columns, index=df.index)
@@ -0,0 +1,168 @@
+#!/usr/bin/env python3
+# Harmonize column names and categories of the merged cBioPortal studies.
+#
+# The synonym file (column_names_harmonization.txt) and the category file
+# (categories_harmonization.txt) are compiled once into lookup tables: a
+# column alias map and, per harmonized column, a map from every known value
+# to the code of its harmonized category. harmonize() then renames all
+# columns in one step and recodes each categorical column through its integer
+# codes (pandas.factorize), so only the distinct values of a column are looked
+# up instead of replacing strings row by row.
+
+import re
+
+import numpy as np
+import pandas as pd
+
+from dataframe_utils import coalesce_duplicate_columns
+
+
+# Quoted names/categories in categories_harmonization.txt.
+QUOTED_PATTERN = re.compile(r'"([^"]*)"')
+
+
+# PARSE column_name_harmonization.txt
+def parse_column_name_harmonization(file_path):
+    parsed_dict = {}
+    with open(file_path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if line and not line.startswith('#'):
+                parts = line.split('=')
+                if len(parts) == 2:
+                    key, values = parts
+                    key = key.strip()
+                    values = [value.strip() for value in values.split(',')]
+                    parsed_dict[key] = values
+                else:
+                    print(f"Ignoring line: {line} - Does not match expected format")
+
+    return parsed_dict
+
+
+def parse_category_harmonization(file_path):
+    """
+    Parse a category harmonization file. Each line holds a column name and
+    groups of equivalent categories, the first category of a group being the
+    harmonized one:
+
+        "SEX": "MALE"="M"="male", "FEMALE"="F"="female"
+
+    Parameters:
+    file_path (str): Path to the file.
+
+    Returns:
+    dict: {column: {harmonized category: [equivalent categories]}}
+    """
+    parsed_dict = {}
+    with open(file_path, 'r') as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith('#'):
+                continue
+            column, separator, groups = line.partition(':')
+            column = QUOTED_PATTERN.fullmatch(column.strip())
+            if not separator or column is None:
+                print(f"Ignoring line: {line} - Does not match expected format")
+                continue
+            # Split on the commas between groups, not on commas inside quotes.
+            categories = {}
+            for group in re.split(r'"\s*,\s*"', groups.strip()):
+                values = [value.strip().strip('"') for value in re.split(r'"\s*=\s*"', group)]
+                categories[values[0]] = values[1:]
+            parsed_dict[column.group(1)] = categories
+
+    return parsed_dict
+
+
+def compile_harmonization(column_synonyms, category_synonyms=None):
+    """
+    Compile parsed synonym dicts into lookup tables.
+
+    Parameters:
+    column_synonyms (dict): {harmonized column: [synonyms]}, see
+        parse_column_name_harmonization().
+    category_synonyms (dict, optional): {harmonized column: {harmonized
+        category: [equivalent categories]}}, see parse_category_harmonization().
+
+    Returns:
+    dict: {'column_aliases': {column name: harmonized column name},
+           'categories': {harmonized column: [harmonized categories]},
+           'category_codes': {harmonized column: {category: code}}}
+
+    Raises:
+    ValueError: If a column name or category is given for two different
+        harmonized names.
+    """
+    column_aliases = {}
+    for column, synonyms in column_synonyms.items():
+        for synonym in [column] + list(synonyms):
+            if column_aliases.setdefault(synonym, column) != column:
+                raise ValueError(f"Column '{synonym}' is a synonym of both "
+                                 f"'{column_aliases[synonym]}' and '{column}'")
+
+    categories, category_codes = {}, {}
+    for column, groups in (category_synonyms or {}).items():
+        categories[column] = list(groups)
+        codes = {}
+        for code, (category, synonyms) in enumerate(groups.items()):
+            for synonym in [category] + list(synonyms):
+                if codes.setdefault(synonym, code) != code:
+                    raise ValueError(f"Category '{synonym}' of column '{column}' is a synonym of both "
+                                     f"'{categories[column][codes[synonym]]}' and '{category}'")
+        category_codes[column] = codes
+
+    return {'column_aliases': column_aliases, 'categories': categories, 'category_codes': category_codes}
+
+
+def compile_harmonization_files(column_names_file, categories_file=None):
+    """
+    Parse and compile the harmonization files, see compile_harmonization().
+    """
+    category_synonyms = parse_category_harmonization(categories_file) if categories_file else None
+    return compile_harmonization(parse_column_name_harmonization(column_names_file), category_synonyms)
+
+
+# Recode one column: factorize it, look up the harmonized code of each distinct
+# value and map the row codes through that small lookup array. Values without
+# a harmonized category are kept as categories of their own.
+def _harmonize_categories(column, categories, category_codes):
+    codes, uniques = pd.factorize(column)
+
+    all_categories, category_codes = list(categories), dict(category_codes)
+    lookup = []
+    for value in uniques:
+        if value not in category_codes:
+            category_codes[value] = len(all_categories)
+            all_categories.append(value)
+        lookup.append(category_codes[value])
+    lookup = np.array(lookup + [-1], dtype=np.int64)
+
+    # Missing values have code -1, which picks the trailing -1 of the lookup.
+    return pd.Categorical.from_codes(lookup[codes], categories=all_categories)
+
+
+def harmonize(df, tables):
+    """
+    Harmonize column names and categories of a DataFrame in one pass: rename
+    the columns through the alias map, coalesce columns that now share a name
+    (first non-null value per row) and recode the categorical columns.
+
+    Parameters:
+    df (pandas.DataFrame): The DataFrame to harmonize (left unchanged).
+    tables (dict): Lookup tables, see compile_harmonization().
+
+    Returns:
+    pandas.DataFrame: The harmonized DataFrame. Columns with harmonized
+        categories have the pandas 'category' dtype, with the harmonized
+        categories first.
+    """
+    column_aliases = tables['column_aliases']
+    df = df.set_axis([column_aliases.get(column, column) for column in df.columns], axis=1)
+    df = coalesce_duplicate_columns(df)
+
+    for column, category_codes in tables['category_codes'].items():
+        if column in df.columns:
+            df[column] = _harmonize_categories(df[column], tables['categories'][column], category_codes)
+
+    return df
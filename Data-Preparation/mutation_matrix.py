@@ -0,0 +1,116 @@
+#!/usr/bin/env python3
+# Build a sample x gene mutation matrix from cBioPortal MAF (data_mutations.txt) tables.
+#
+# The matrix is built with a single group-by/pivot pass keyed on
+# Tumor_Sample_Barcode and Hugo_Symbol, so the cost grows linearly with the
+# number of MAF rows instead of (samples x mutations).
+
+import pandas as pd
+
+
+# MAF column names (cBioPortal):
+SAMPLE_COLUMN = 'Tumor_Sample_Barcode'
+GENE_COLUMN = 'Hugo_Symbol'
+CONSEQUENCE_COLUMN = 'Consequence'
+
+# Fall back to this column when a study MAF has no 'Consequence' column
+# (e.g. luad_mskcc_2020).
+FALLBACK_CONSEQUENCE_COLUMN = 'Variant_Classification'
+
+# Label given to samples without a mutation in a gene.
+WILD_TYPE = 'WT'
+
+# Separator used when a sample has several different consequences in one gene.
+CONSEQUENCE_SEPARATOR = ';'
+
+VALUE_TYPES = ('consequence', 'count', 'binary')
+
+
+def _consequence_column(mutations_df):
+    if CONSEQUENCE_COLUMN not in mutations_df.columns:
+        return mutations_df[FALLBACK_CONSEQUENCE_COLUMN]
+    if FALLBACK_CONSEQUENCE_COLUMN not in mutations_df.columns:
+        return mutations_df[CONSEQUENCE_COLUMN]
+    # Concatenated MAFs from several studies: fill rows from studies lacking
+    # 'Consequence' with their variant classification.
+    return mutations_df[CONSEQUENCE_COLUMN].fillna(mutations_df[FALLBACK_CONSEQUENCE_COLUMN])
+
+
+def build_mutation_matrix(mutations_df, genes, sample_ids=None, value='consequence'):
+    """
+    Turn a (concatenated) MAF table into a sample x gene mutation matrix.
+
+    Parameters:
+    mutations_df (pandas.DataFrame): MAF rows, must contain Tumor_Sample_Barcode,
+        Hugo_Symbol and (for value='consequence') Consequence or Variant_Classification.
+    genes (list): Genes to include as columns, e.g. the lines of mutations.txt.
+    sample_ids (iterable, optional): Samples to include as rows. Samples without
+        any mutation in the listed genes are reported as wild type. Defaults to
+        every sample present in the MAF.
+    value (str): What each cell holds:
+        'consequence' - 'WT' or the ';'-joined unique consequences of the sample's
+                        mutations in the gene.
+        'count'       - number of MAF rows (mutations) of the sample in the gene.
+        'binary'      - 1 if the gene is mutated in the sample, else 0.
+
+    Returns:
+    pandas.DataFrame: Matrix indexed by sample id (named SAMPLE_ID) with one column
+        per gene, in the order given by `genes`.
+    """
+    if value not in VALUE_TYPES:
+        raise ValueError(f"Unknown value type '{value}', expected one of {VALUE_TYPES}")
+
+    genes = list(dict.fromkeys(genes))
+
+    # Keep only the rows (and columns) needed for the genes of interest.
+    mask = mutations_df[GENE_COLUMN].isin(genes)
+    long_df = mutations_df.loc[mask, [SAMPLE_COLUMN, GENE_COLUMN]]
+    keys = [SAMPLE_COLUMN, GENE_COLUMN]
+
+    # Single group-by pass over (sample, gene).
+    if value == 'consequence':
+        long_df = long_df.assign(**{CONSEQUENCE_COLUMN: _consequence_column(mutations_df).loc[mask]})
+        long_df = long_df.dropna(subset=[CONSEQUENCE_COLUMN]).drop_duplicates()
+        long_df = long_df.sort_values(keys + [CONSEQUENCE_COLUMN])
+        # Most (sample, gene) pairs carry a single consequence and are taken as is,
+        # only the pairs with several consequences need their strings joined.
+        several = long_df.duplicated(keys, keep=False)
+        single = long_df.loc[~several].set_index(keys)[CONSEQUENCE_COLUMN]
+        joined = long_df.loc[several].groupby(keys, sort=False)[CONSEQUENCE_COLUMN].agg(CONSEQUENCE_SEPARATOR.join)
+        cells = pd.concat([single, joined])
+        fill_value = WILD_TYPE
+    else:
+        cells = long_df.groupby(keys, sort=False).size()
+        if value == 'binary':
+            cells = (cells > 0).astype('int8')
+        fill_value = 0
+
+    # Pivot the long (sample, gene) table into the wide matrix.
+    matrix = cells.unstack(level=GENE_COLUMN, fill_value=fill_value)
+    if sample_ids is None:
+        sample_ids = matrix.index
+    matrix = matrix.reindex(index=pd.Index(sample_ids), columns=genes, fill_value=fill_value)
+
+    if value != 'consequence':
+        matrix = matrix.astype('int8' if value == 'binary' else 'int32')
+    matrix.index.name = 'SAMPLE_ID'
+    matrix.columns.name = None
+    return matrix
+
+
+def add_mutation_columns(sample_df, mutations_df, genes, sample_column='SAMPLE_ID', value='consequence'):
+    """
+    Add one column per gene of interest to a patient-sample table.
+
+    Parameters:
+    sample_df (pandas.DataFrame): Patient-sample data with a sample id column.
+    mutations_df (pandas.DataFrame): MAF rows, see build_mutation_matrix().
+    genes (list): Genes to add as columns.
+    sample_column (str): Name of the sample id column in sample_df.
+    value (str): Cell type, see build_mutation_matrix().
+
+    Returns:
+    pandas.DataFrame: sample_df with the gene columns appended.
+    """
+    matrix = build_mutation_matrix(mutations_df, genes, sample_ids=sample_df[sample_column].unique(), value=value)
+    return sample_df.merge(matrix, how='left', left_on=sample_column, right_index=True)
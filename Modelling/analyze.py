@@ -9,6 +9,7 @@ def main(
     analysis_config: Path,
     experiment_dir: Path,
     data_path: Optional[Path] = None,
+    n_workers: int = 1,
 ) -> None:
     model_config_path = experiment_dir / "config/model_config.yml"
     output_path = experiment_dir / "analysis"
@@ -20,7 +21,7 @@ def main(
         model_path=model_path,
         data_path=data_path,
     )
-    analyser.analyse()
+    analyser.analyse(n_workers)
 
 
 if __name__ == "__main__":
@@ -50,6 +51,13 @@ if __name__ == "__main__":
         type=Path,
         help="Path to the data on which to run the analysis.",
     )
+    parser.add_argument(
+        "-w",
+        "--n_workers",
+        type=int,
+        default=1,
+        help="Number of worker processes rendering the figures.",
+    )
     args = vars(parser.parse_args())
 
     main(**args)
@@ -0,0 +1,102 @@
+import argparse
+import time
+from pathlib import Path
+
+from preprocess.davids_preprocess import GENETIC_COLS_TO_REMOVE
+from src.association import association_scan, load_gene_data
+from src.comutation import co_mutation_scan
+from src.mutation_matrix import read_gene_panel
+from src.utils import check_git_status, prepare_save_folder, read_config
+
+OUTPUT_FOLDER = Path("output/associations")
+
+
+def main(config_path: Path, n_workers: int) -> None:
+    check_git_status()
+    config = read_config(config_path)
+    if config.get("genes"):
+        genes = config["genes"]
+    elif config.get("gene_panel_path"):
+        genes = read_gene_panel(config["gene_panel_path"])
+    else:
+        genes = GENETIC_COLS_TO_REMOVE
+
+    print("Loading data..")
+    mutations, genes, responders, strata = load_gene_data(
+        Path(config["data_path"]),
+        genes,
+        config["outcome_column"],
+        config["responder_value"],
+        config.get("strata_column"),
+    )
+    print(
+        f"Testing {len(genes)} genes on {len(responders)} samples "
+        f"({responders.sum()} responders).."
+    )
+    start = time.perf_counter()
+    result = association_scan(
+        mutations,
+        genes,
+        responders,
+        strata,
+        config.get("test", "fisher"),
+        config.get("min_mutated", 1),
+    )
+    print(f"Tested in {time.perf_counter() - start:.3f} s.")
+
+    output_dir = prepare_save_folder(
+        OUTPUT_FOLDER, config["output_name"], ["config"], {"association_config": config}
+    )
+    result.to_csv(output_dir / "association_scan.csv", index=False)
+    print(result.head(10).to_string(index=False))
+
+    co_mutation_config = config.get("co_mutation")
+    if co_mutation_config:
+        max_order = co_mutation_config.get("max_order", 2)
+        print(f"\nScanning co-mutations of up to {max_order} genes..")
+        start = time.perf_counter()
+        co_mutations = co_mutation_scan(
+            mutations,
+            genes,
+            responders,
+            max_order,
+            co_mutation_config.get("min_co_mutated", 5),
+            config.get("test", "fisher"),
+            n_workers,
+        )
+        print(
+            f"Tested {len(co_mutations)} co-mutations in "
+            f"{time.perf_counter() - start:.3f} s."
+        )
+        co_mutations.to_csv(output_dir / "co_mutation_scan.csv", index=False)
+        print(co_mutations.head(10).to_string(index=False))
+    print(f"Saved the association scan to {output_dir}")
+
+
+if __name__ == "__main__":
+    # Parse command line arguments.
+    parser = argparse.ArgumentParser(
+        description="Script to test the association of every gene with the "
+        "treatment outcome (Fisher exact or chi-square, and Cochran-Mantel-Haenszel "
+        "stratified by study), and optionally of every co-mutated gene pair or "
+        "triple, with Benjamini-Hochberg FDR. Results are saved to "
+        "`output/associations`.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "-c",
+        "--config_path",
+        type=Path,
+        default=Path("configs/association/association_config.yml"),
+        help="Path to association config file.",
+    )
+    parser.add_argument(
+        "-w",
+        "--n_workers",
+        type=int,
+        default=1,
+        help="Number of worker processes scanning the co-mutations.",
+    )
+    args = vars(parser.parse_args())
+
+    main(**args)
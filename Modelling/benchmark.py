@@ -0,0 +1,82 @@
+import argparse
+import subprocess
+import sys
+import time
+from pathlib import Path
+from typing import List
+
+# The entry points whose startup time is measured.
+ENTRY_POINTS = ["preprocess.py", "train.py", "infer.py", "analyze.py"]
+
+# Heavy modules reported when an entry point loads them at import time.
+HEAVY_MODULES = ["tensorflow", "xgboost", "eli5", "sklearn", "matplotlib", "seaborn"]
+
+
+def startup_time(entry_point: str, repeats: int) -> float:
+    """Measure the startup time of an entry point, i.e. the time to run it with
+    `--help` (all imports, but no work). Returns the best of the repeats.
+
+    Arguments:
+        entry_point -- The entry point file.
+        repeats -- Number of times to start the entry point.
+    """
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        subprocess.run(
+            [sys.executable, entry_point, "--help"],
+            check=True,
+            stdout=subprocess.DEVNULL,
+        )
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def loaded_heavy_modules(entry_point: str) -> List[str]:
+    """Returns the heavy modules (see HEAVY_MODULES) loaded by importing an entry point.
+
+    Arguments:
+        entry_point -- The entry point file.
+    """
+    code = (
+        f"import sys; import {Path(entry_point).stem}; "
+        f"print(' '.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], check=True, capture_output=True, text=True
+    )
+    return result.stdout.split()
+
+
+def main(entry_points: List[str], repeats: int) -> None:
+    print(f"{'entry point':<15} {'startup (s)':>12}  heavy modules loaded at import")
+    for entry_point in entry_points:
+        seconds = startup_time(entry_point, repeats)
+        modules = loaded_heavy_modules(entry_point)
+        print(f"{entry_point:<15} {seconds:>12.2f}  {', '.join(modules) or '-'}")
+
+
+if __name__ == "__main__":
+    # Parse command line arguments.
+    parser = argparse.ArgumentParser(
+        description="Script to benchmark the startup time of the entry points "
+        "(the time spent on imports before any work is done).",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "-e",
+        "--entry_points",
+        nargs="+",
+        default=ENTRY_POINTS,
+        help="The entry points to benchmark.",
+    )
+    parser.add_argument(
+        "-r",
+        "--repeats",
+        type=int,
+        default=5,
+        help="Number of runs per entry point, the fastest run is reported.",
+    )
+    args = vars(parser.parse_args())
+
+    main(**args)
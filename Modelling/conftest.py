@@ -0,0 +1,93 @@
+# Makes the entry points and `src` importable in the tests (pytest adds the folder
+# of this file to the import path).
+from pathlib import Path
+from typing import Callable, Tuple
+
+import numpy as np
+import oyaml
+import pandas as pd
+import pytest
+
+from src import trainer
+from src.mutation_matrix import MutationMatrix, mutations_path_for
+from src.schema import SCHEMA_FILE_NAME, DatasetSchema
+
+GT_COLUMN = "Treatment_Outcome"
+
+# The genes of the data with sparse mutations.
+GENES = ["KRAS", "STK11", "TP53"]
+
+
+def mutation_data(n_rows: int, seed: int) -> pd.DataFrame:
+    """Data with mostly unmutated gene columns."""
+    rng = np.random.default_rng(seed)
+    data = pd.DataFrame(
+        {
+            GT_COLUMN: rng.integers(0, 2, n_rows),
+            "Histology": rng.choice(["Adenocarcinoma", "Squamous"], n_rows),
+            "TMB": rng.uniform(0, 20, n_rows),
+        }
+    )
+    for gene in GENES:
+        data[gene] = (rng.random(n_rows) < 0.3).astype(float)
+    return data
+
+
+def save_with_mutations(data: pd.DataFrame, data_path: Path) -> None:
+    """Save data like the preprocessing does with `sparse_mutations`: the genes as
+    a sparse mutation matrix next to the other columns."""
+    data.drop(columns=GENES).to_csv(data_path, index=False)
+    MutationMatrix.from_dataframe(data, GENES).save(mutations_path_for(data_path))
+
+
+@pytest.fixture
+def train_xgboost(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> Callable[[Path], Path]:
+    """Returns a function training a small XGBoost model on the given training data
+    and returning its experiment folder."""
+    monkeypatch.setattr(trainer, "MODEL_OUTPUT_FOLDER", tmp_path / "models")
+
+    def train(data_path: Path, training_name: str = "xgboost_model") -> Path:
+        config = {
+            "training_name": training_name,
+            "random_seed": 42,
+            "model": "xgboost",
+            "args": {
+                "tree_method": "hist",
+                "enable_categorical": True,
+                "n_estimators": 5,
+            },
+            "preprocessed_data_path": str(data_path),
+            "gt_column": GT_COLUMN,
+        }
+        config_path = Path(data_path).parent / f"{training_name}_config.yml"
+        config_path.write_text(oyaml.dump(config))
+
+        model_trainer = trainer.Trainer(config_path)
+        model_trainer.train()
+        return model_trainer.output_dir
+
+    return train
+
+
+@pytest.fixture
+def sparse_experiment(tmp_path: Path, train_xgboost: Callable[[Path], Path]) -> Path:
+    """Train a small XGBoost model on data with sparse mutations."""
+    data_folder = tmp_path / "sparse_training_data"
+    data_folder.mkdir()
+    training_data = mutation_data(80, seed=0)
+    save_with_mutations(training_data, data_folder / "train_data.csv")
+    DatasetSchema.from_data(training_data.drop(columns=GENES)).save(
+        data_folder / SCHEMA_FILE_NAME
+    )
+    return train_xgboost(data_folder / "train_data.csv")
+
+
+@pytest.fixture
+def sparse_new_data(tmp_path: Path) -> Tuple[pd.DataFrame, Path]:
+    """New data to predict on, and the path it is saved to with sparse mutations."""
+    data = mutation_data(20, seed=1)
+    data_path = tmp_path / "sparse_data.csv"
+    save_with_mutations(data, data_path)
+    return data, data_path
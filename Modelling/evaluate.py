@@ -0,0 +1,81 @@
+import argparse
+from pathlib import Path
+from typing import List, Optional
+
+from src.evaluation import GroupEvaluation
+from src.utils import (check_git_status, read_config,
+                       resolve_preprocessed_data_path)
+
+
+def main(
+    config_path: Path,
+    data_paths: Optional[List[Path]],
+    group_column: str,
+    n_splits: Optional[int],
+    n_workers: int,
+    n_jobs: Optional[int],
+    keep_group_column: bool,
+) -> None:
+    check_git_status()
+    config = resolve_preprocessed_data_path(read_config(config_path))
+    if not data_paths:
+        # Evaluate on both the training and the test data of the preprocessed data.
+        train_path = Path(config["preprocessed_data_path"])
+        data_paths = [train_path, train_path.with_name(f"test_data{train_path.suffix}")]
+
+    evaluation = GroupEvaluation(config, data_paths, group_column)
+    evaluation.run(n_splits, n_workers, n_jobs, keep_group_column)
+
+
+if __name__ == "__main__":
+    # Parse command line arguments.
+    parser = argparse.ArgumentParser(
+        description="Script to evaluate a model config on held-out studies: "
+        "leave-one-study-out, or grouped K-fold with --n_splits. One model is "
+        "trained per fold. Results are saved to `output/evaluations`.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "-c",
+        "--config_path",
+        required=True,
+        type=Path,
+        help="Path to model config file.",
+    )
+    parser.add_argument(
+        "-d",
+        "--data_paths",
+        type=Path,
+        nargs="+",
+        help="Preprocessed data files to evaluate on. Defaults to the training "
+        "and test data of the `preprocessed_data_path` in the config.",
+    )
+    parser.add_argument(
+        "-g",
+        "--group_column",
+        default="Study_ID",
+        help="The column holding the studies (groups) to hold out.",
+    )
+    parser.add_argument(
+        "-k",
+        "--n_splits",
+        type=int,
+        help="Number of grouped K-fold splits. Leave-one-study-out if not given.",
+    )
+    parser.add_argument(
+        "-w", "--n_workers", type=int, default=1, help="Number of worker processes."
+    )
+    parser.add_argument(
+        "-j",
+        "--n_jobs",
+        type=int,
+        help="Total number of threads, shared by the workers. Defaults to n_workers.",
+    )
+    parser.add_argument(
+        "--keep_group_column",
+        action="store_true",
+        help="Use the group column as a predictor.",
+    )
+    args = vars(parser.parse_args())
+
+    main(**args)
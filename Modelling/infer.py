@@ -2,15 +2,37 @@ import argparse
 from pathlib import Path
 from typing import Optional
 
+from src.data_format import DATA_FORMATS
 from src.trainer import Trainer
 
 
-def main(experiment_folder: Path, data_path: Path, output_file: Path) -> None:
-    assert output_file.suffix == ".csv", "ERROR: Output file does not have `.csv` extension! Exiting."
+def main(
+    experiment_folder: Path,
+    data_path: Path,
+    output_file: Path,
+    chunk_size: Optional[int],
+    batch_size: Optional[int],
+) -> None:
+    suffixes = DATA_FORMATS.values()
+    assert output_file.suffix in suffixes, (
+        "ERROR: Output file does not have one of the extensions "
+        f"{', '.join(suffixes)}! Exiting."
+    )
+    assert not chunk_size or output_file.suffix == ".csv", (
+        "ERROR: Streaming (--chunk_size) appends to a `.csv` output file! Exiting."
+    )
     model_config_path = experiment_folder / "config/model_config.yml"
     model_path = experiment_folder / "model"
-    trainer = Trainer(model_config_path, resume_model=model_path, data_path=data_path)
-    trainer.predict(output_file)
+    trainer = Trainer(
+        model_config_path,
+        resume_model=model_path,
+        data_path=data_path,
+        load_data=not chunk_size,
+    )
+    if chunk_size:
+        trainer.predict_streaming(output_file, chunk_size, batch_size)
+    else:
+        trainer.predict(output_file, batch_size)
 
 
 if __name__ == "__main__":
@@ -31,7 +53,8 @@ if __name__ == "__main__":
         "-d",
         "--data_path",
         type=Path,
-        help="Path to the data (.csv file) on which to run prediction.",
+        help="Path to the data (.csv, .parquet or .feather file) on which to run "
+        "prediction.",
     )
     parser.add_argument(
         "-o",
@@ -39,7 +62,20 @@ if __name__ == "__main__":
         type=Path,
         required=True,
         help="Path to file where to save the output data with predictions. "
-        "Must end with `.csv`.",
+        "Must end with `.csv`, `.parquet` or `.feather`.",
+    )
+    parser.add_argument(
+        "-cs",
+        "--chunk_size",
+        type=int,
+        help="Stream the data: read, predict and save this many rows at a time, "
+        "keeping memory bounded for large data sets.",
+    )
+    parser.add_argument(
+        "-bs",
+        "--batch_size",
+        type=int,
+        help="Number of rows per prediction batch (Keras models).",
     )
     args = vars(parser.parse_args())
 
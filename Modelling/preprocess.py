@@ -5,10 +5,10 @@ from preprocess.preprocessor import Preprocessor
 from src.utils import check_git_status
 
 
-def main(config_path: Path) -> None:
+def main(config_path: Path, force: bool) -> None:
     check_git_status()
     preorcessor = Preprocessor(config_path)
-    preorcessor.process()
+    preorcessor.process(force)
 
 
 if __name__ == "__main__":
@@ -25,6 +25,13 @@ if __name__ == "__main__":
         default=Path("config/preprocess/preprocess_config.yml"),
         help="Path to preprocess config file.",
     )
+    parser.add_argument(
+        "-f",
+        "--force",
+        action="store_true",
+        help="Preprocess even if the data was preprocessed before with the same "
+        "input data, config and code (same fingerprint).",
+    )
     args = vars(parser.parse_args())
 
     main(**args)
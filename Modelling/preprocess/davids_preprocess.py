@@ -1,7 +1,6 @@
-from typing import Tuple
+from typing import Any, Dict, List
 
-import pandas as pd
-from sklearn.model_selection import train_test_split
+from preprocess.steps import register_preprocessor
 
 GENERAL_COLS_TO_REMOVE = [
     "Patient_ID",
@@ -77,50 +76,51 @@ GENETIC_COLS_TO_REMOVE = [
 ]
 
 
-def process(config: dict, df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
-    """Apply 'Davids preprocess' to the original data.
+# The ground truth labels, replaced with 0 and 1.
+LABELS = {"Non-Responder": 0, "Responder": 1}
 
-    (This preprocess is based on PREPROCESSING in feature_engineering_preprocessing.R
-    in David Lords original repository https://github.com/davidlord/Biomarkers-immuno-lungcancer.)
+
+def davids_steps(
+    config: dict, general_cols_to_remove: List[str] = GENERAL_COLS_TO_REMOVE
+) -> List[Dict[str, Any]]:
+    """Returns the steps of Davids column and study selection.
 
     Arguments:
         config -- The preprocess configuration.
-        df -- The original data.
 
-    Returns:
-        A tuple with the training and test data sets as pandas data frames.
+    Keyword Arguments:
+        general_cols_to_remove -- The non-genetic columns to remove.
+            (default: {GENERAL_COLS_TO_REMOVE})
     """
+    return [
+        {
+            "step": "filter_rows",
+            "column": "Study_ID",
+            "exclude": config["studies_to_exclude"],
+        },
+        {"step": "drop_columns", "columns": general_cols_to_remove},
+        {"step": "drop_columns", "columns": GENETIC_COLS_TO_REMOVE},
+        # Drop PD-L1_Expression info.
+        {"step": "drop_columns", "columns": ["PD-L1_Expression"]},
+    ]
 
-    exclude = config["studies_to_exclude"]
-    print(f"Exluding studies: {exclude}")
-    df = df.loc[~df["Study_ID"].isin(exclude)]
-
-    # Davids column selection.
-    print("Selecting columns..")
-    df = df.drop(columns=GENERAL_COLS_TO_REMOVE, axis=1, inplace=False)
-    df = df.drop(columns=GENETIC_COLS_TO_REMOVE, axis=1, inplace=False)
 
-    # Drop PD-L1_Expression info
-    df.drop(columns=["PD-L1_Expression"], axis=1, inplace=True)
+def label_steps() -> List[Dict[str, Any]]:
+    """Returns the steps replacing the ground truth labels with 0 and 1."""
+    return [{"step": "map_values", "column": "Treatment_Outcome", "values": LABELS}]
 
-    return split_data(df, config)
 
+@register_preprocessor("davids_preprocessor")
+def steps(config: dict) -> List[Dict[str, Any]]:
+    """Returns the steps of 'Davids preprocess'.
 
-def split_data(data: pd.DataFrame, config: dict) -> Tuple[pd.DataFrame, pd.DataFrame]:
-    test_set_size = config["test_set_size"]
+    (This preprocess is based on PREPROCESSING in feature_engineering_preprocessing.R
+    in David Lords original repository https://github.com/davidlord/Biomarkers-immuno-lungcancer.)
 
-    print(
-        f"Splitting the data {int((1-test_set_size)*100)}/{int(test_set_size*100)} for training/test set. "
-    )
-    train, test = train_test_split(
-        data, test_size=test_set_size, random_state=config["random_seed"]
-    )
-    train["Treatment_Outcome"].replace(
-        {"Non-Responder": 0, "Responder": 1}, inplace=True
-    )
-    test["Treatment_Outcome"].replace(
-        {"Non-Responder": 0, "Responder": 1}, inplace=True
-    )
+    Arguments:
+        config -- The preprocess configuration.
 
-    # Reset any indices before return.
-    return train.reset_index(drop=True), test.reset_index(drop=True)
+    Returns:
+        The step configs, see `preprocess.steps`.
+    """
+    return davids_steps(config) + label_steps()
@@ -1,23 +1,52 @@
+import hashlib
+import json
 from pathlib import Path
-from typing import Tuple
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
-from src.utils import prepare_save_folder, read_config
+from src import data_format, encoding, mutation_matrix, schema
+from src.data_format import DATA_FORMATS, write_data
+from src.encoding import ENCODER_FILE_NAME, OneHotEncoder
+from src.mutation_matrix import MutationMatrix, mutations_path_for, read_gene_panel
+from src.schema import SCHEMA_FILE_NAME, DatasetSchema
+from src.utils import (FINGERPRINT_FILE_NAME, PREPROCESSED_DATA_FOLDER,
+                       file_sha1, find_preprocessed_data, prepare_save_folder,
+                       read_config)
 
-from preprocess import davids_non_null_one_hotted, davids_preprocess
+# Imported to register their preprocessors.
+from preprocess import davids_non_null_one_hotted, davids_preprocess  # noqa: F401
+from preprocess.steps import Pipeline, preprocessor_steps
 
-DATA_FOLDER = Path("data/preprocessed")
+DATA_FOLDER = PREPROCESSED_DATA_FOLDER
+
+# The code that determines the preprocessed data: a change to any of these files
+# changes the fingerprint.
+SOURCE_FILES = sorted(Path(__file__).parent.glob("*.py")) + [
+    Path(module.__file__) for module in [data_format, encoding, mutation_matrix, schema]
+]
+
+# Config entries that do not change the preprocessed data.
+NON_DATA_CONFIG_KEYS = ["output_name"]
+
+# Temporary column used to track which original rows end up in the training and
+# test sets when the gene columns are kept in a sparse mutation matrix.
+ROW_ID_COLUMN = "_row_id"
 
 
 class Preprocessor:
     """Preprocess the data to be used with the models.
 
     Public methods:
+    fingerprint -- Returns the fingerprint of the input data, config and code.
     process -- Loads the data from file, processes it, and saves the results.
 
     Instance variables:
     config -- The preprocess config
     preprocessor_type -- The name of the preprocessor to use.
+    mutations -- The gene columns as a sparse mutation matrix, if configured
+        with `sparse_mutations`.
+    encoder -- The one hot encoder fitted by the preprocessor, if any.
     """
 
     def __init__(self, config_path: Path) -> None:
@@ -28,17 +57,70 @@ class Preprocessor:
         """
         self.config = read_config(config_path)
         self.preprocessor_type = self.config["preprocessor_name"]
+        self.mutations: Optional[MutationMatrix] = None
+        self.encoder: Optional[OneHotEncoder] = None
+
+    def _gene_columns(self) -> List[str]:
+        """Return the data columns that are genes of the configured gene panel."""
+        panel = read_gene_panel(self.config["sparse_mutations"]["gene_panel_path"])
+        header = pd.read_csv(self.config["data_path"], sep="\t", nrows=0).columns
+        return [gene for gene in panel if gene in header]
 
     def _load_data(self) -> pd.DataFrame:
-        """Load orignal data from disk."""
-        return pd.read_csv(self.config["data_path"], sep="\t", header=0)
+        """Load orignal data from disk.
+
+        If `sparse_mutations` is configured, the gene columns are read chunk by chunk
+        into a sparse mutation matrix (self.mutations) and left out of the returned
+        data frame.
+        """
+        data_path = self.config["data_path"]
+        sparse_config = self.config.get("sparse_mutations")
+        if not sparse_config:
+            return pd.read_csv(data_path, sep="\t", header=0)
+
+        genes = self._gene_columns()
+        print(f"Reading {len(genes)} gene columns as a sparse mutation matrix..")
+        self.mutations = MutationMatrix.read_csv(
+            data_path, genes, sep="\t", chunksize=sparse_config.get("chunksize", 10000)
+        )
+        data = pd.read_csv(
+            data_path, sep="\t", header=0, usecols=lambda column: column not in genes
+        )
+        data[ROW_ID_COLUMN] = np.arange(len(data))
+        return data
 
-    def _save(self, train_data: pd.DataFrame, test_data: pd.DataFrame) -> None:
+    def _split_mutations(self, data: pd.DataFrame) -> MutationMatrix:
+        """Remove the row id column from the processed data and return the rows of the
+        mutation matrix that belong to it.
+
+        Arguments:
+            data -- A processed data set.
+        """
+        rows = data.pop(ROW_ID_COLUMN)
+        return self.mutations.take_samples(rows)
+
+    def _save(
+        self,
+        train_data: pd.DataFrame,
+        test_data: pd.DataFrame,
+        train_mutations: Optional[MutationMatrix] = None,
+        test_mutations: Optional[MutationMatrix] = None,
+        fingerprint: Optional[Dict[str, str]] = None,
+    ) -> Path:
         """Save the preprocessed data to disk as a training and test sets.
 
         Arguments:
             train_data -- The training data set.
             test_data -- The test data set.
+
+        Keyword Arguments:
+            train_mutations -- The sparse mutations of the training set. (default: {None})
+            test_mutations -- The sparse mutations of the test set. (default: {None})
+            fingerprint -- The fingerprint of the data, see `fingerprint`.
+                (default: {None})
+
+        Returns:
+            The path to the output folder.
         """
         # Prepare save folder.
         output_dir = prepare_save_folder(
@@ -48,13 +130,38 @@ class Preprocessor:
             {"preprocess_config": self.config},
         )
 
-        # Save data.
-        train_data.to_csv(output_dir / "data/train_data.csv", index=False)
-        test_data.to_csv(output_dir / "data/test_data.csv", index=False)
+        # Save data in the configured format (csv, parquet or feather).
+        output_format = self.config.get("output_format", "csv")
+        assert output_format in DATA_FORMATS, (
+            f"ERROR: Unknown output_format '{output_format}'! "
+            f"Use one of {', '.join(DATA_FORMATS)}."
+        )
+        train_path = output_dir / f"data/train_data{DATA_FORMATS[output_format]}"
+        test_path = output_dir / f"data/test_data{DATA_FORMATS[output_format]}"
+
+        # The column types of both sets, read by the DataLoader.
+        schema = DatasetSchema.from_data(pd.concat([train_data, test_data]))
+        schema.save(output_dir / "data" / SCHEMA_FILE_NAME)
+        write_data(train_data, train_path, schema.storage_dtypes())
+        write_data(test_data, test_path, schema.storage_dtypes())
+        if self.encoder:
+            # Encoded data gets the column order of the training data.
+            self.encoder.columns = train_data.columns.tolist()
+            self.encoder.save(output_dir / "data" / ENCODER_FILE_NAME)
+        if train_mutations is not None:
+            train_mutations.save(mutations_path_for(train_path))
+            test_mutations.save(mutations_path_for(test_path))
+
+        # Written last, so only complete folders are found by their fingerprint.
+        if fingerprint:
+            with open(output_dir / FINGERPRINT_FILE_NAME, "w") as f:
+                json.dump(fingerprint, f, indent=2)
         print(f"Saved processed data to {output_dir}")
+        return output_dir
 
     def _preprocess(self, data) -> Tuple[pd.DataFrame, pd.DataFrame]:
-        """Apply the preprocessor specified in the configuration to the data.
+        """Run the steps of the preprocessor specified in the configuration on the
+        data and split it into training and test sets.
 
         Arguments:
             data -- The data to preprocess.
@@ -62,23 +169,89 @@ class Preprocessor:
         Returns:
             A tuple with the training and test data sets.
         """
-        if self.preprocessor_type == "davids_preprocessor":
-            train_dataset, test_dataset = davids_preprocess.process(self.config, data)
-        elif self.preprocessor_type == "davids_non_null_one_hotted":
-            train_dataset, test_dataset = davids_non_null_one_hotted.process(
-                self.config, data
-            )
-        else:
-            assert False, "No preprocessor found!"
-        return train_dataset, test_dataset
-
-    def process(self) -> None:
-        """Load the data from file, process it, and save the results."""
+        pipeline = Pipeline.from_config(
+            preprocessor_steps(self.config),
+            self.config["test_set_size"],
+            self.config["random_seed"],
+        )
+        genes = self.mutations.genes if self.mutations is not None else None
+        train_data, test_data = pipeline.run(data, genes)
+        self.encoder = pipeline.encoder()
+        if self.mutations is not None:
+            # The genes dropped by the steps are dropped from the mutation matrix too,
+            # so the features are the same as without `sparse_mutations`.
+            self.mutations = self.mutations.select_genes(pipeline.sparse_columns())
+            print(f"Kept {len(self.mutations.genes)} of {len(genes)} sparse genes.")
+        return train_data, test_data
+
+    def fingerprint(self) -> Dict[str, str]:
+        """Returns the fingerprint of the preprocessed data: a hash of the input
+        data (and gene panel), the preprocess config and the preprocessing code.
+        Preprocessing with the same fingerprint gives the same data.
+
+        Returns:
+            A dict with the fingerprint and the hashes it is made of.
+        """
+        input_files = [self.config["data_path"]]
+        if self.config.get("sparse_mutations"):
+            input_files.append(self.config["sparse_mutations"]["gene_panel_path"])
+        config = {
+            key: value
+            for key, value in self.config.items()
+            if key not in NON_DATA_CONFIG_KEYS
+        }
+
+        source_sha = hashlib.sha1()
+        for source_file in SOURCE_FILES:
+            source_sha.update(source_file.read_bytes())
+
+        parts = {
+            "input_sha1": "-".join(file_sha1(path) for path in input_files),
+            "config_sha1": hashlib.sha1(
+                json.dumps(config, sort_keys=True, default=str).encode()
+            ).hexdigest(),
+            "source_sha1": source_sha.hexdigest(),
+        }
+        fingerprint = hashlib.sha1(json.dumps(parts, sort_keys=True).encode())
+        return {"fingerprint": fingerprint.hexdigest(), **parts}
+
+    def process(self, force: bool = False) -> Path:
+        """Load the data from file, process it, and save the results. If data with
+        the same fingerprint was preprocessed before, its folder is reused.
+
+        Keyword Arguments:
+            force -- Preprocess even if data with the same fingerprint exists. The
+                new folder replaces the old one as the data with the fingerprint
+                (the old folder is kept, without its fingerprint file).
+                (default: {False})
+
+        Returns:
+            The path to the preprocessed data folder.
+        """
+        fingerprint = self.fingerprint()
+        print(f"Fingerprint of the preprocessed data: {fingerprint['fingerprint']}")
+        existing = find_preprocessed_data(fingerprint["fingerprint"], DATA_FOLDER)
+        if existing and not force:
+            print(f"Reusing the preprocessed data in {existing} (same fingerprint).")
+            return existing
+
         print("Loading original data set..")
         data = self._load_data()
 
         print("Processing..")
         train_data, test_data = self._preprocess(data)
 
+        train_mutations, test_mutations = None, None
+        if self.mutations is not None:
+            train_mutations = self._split_mutations(train_data)
+            test_mutations = self._split_mutations(test_data)
+
         print("Saving processed data..")
-        self._save(train_data, test_data)
+        output_dir = self._save(
+            train_data, test_data, train_mutations, test_mutations, fingerprint
+        )
+        if existing and existing != output_dir:
+            # Only one folder may have the fingerprint, see `find_preprocessed_data`.
+            (existing / FINGERPRINT_FILE_NAME).unlink()
+            print(f"Removed the fingerprint of the replaced data in {existing}.")
+        return output_dir
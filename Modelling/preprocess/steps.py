@@ -0,0 +1,485 @@
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Tuple, Type
+
+import numpy as np
+import pandas as pd
+from src.encoding import OneHotEncoder
+
+# Maps the `step` name used in a preprocess config to its step class.
+STEP_REGISTRY: Dict[str, Type["PreprocessStep"]] = {}
+
+# A function returning the step configs of a preprocessor, given the preprocess
+# config.
+StepsFunction = Callable[[dict], List[Dict[str, Any]]]
+
+# Maps the `preprocessor_name` of a preprocess config to its steps function.
+PREPROCESSOR_REGISTRY: Dict[str, StepsFunction] = {}
+
+# The preprocessor running the `steps` listed in the preprocess config.
+PIPELINE_PREPROCESSOR_NAME = "pipeline"
+
+
+def register_step(
+    name: str,
+) -> Callable[[Type["PreprocessStep"]], Type["PreprocessStep"]]:
+    """Class decorator adding a preprocessing step to the step registry.
+
+    Arguments:
+        name -- The step name used in the `step` field of a pipeline step config.
+    """
+
+    def register(step_class: Type["PreprocessStep"]) -> Type["PreprocessStep"]:
+        assert name not in STEP_REGISTRY, f"ERROR: Step '{name}' registered twice."
+        step_class.name = name
+        STEP_REGISTRY[name] = step_class
+        return step_class
+
+    return register
+
+
+def register_preprocessor(name: str) -> Callable[[StepsFunction], StepsFunction]:
+    """Function decorator adding a preprocessor to the preprocessor registry. The
+    function returns the step configs of the preprocessor, given the preprocess
+    config.
+
+    Arguments:
+        name -- The preprocessor name used in `preprocessor_name` of the config.
+    """
+
+    def register(steps: StepsFunction) -> StepsFunction:
+        assert (
+            name not in PREPROCESSOR_REGISTRY
+        ), f"ERROR: Preprocessor '{name}' registered twice."
+        PREPROCESSOR_REGISTRY[name] = steps
+        return steps
+
+    return register
+
+
+@register_preprocessor(PIPELINE_PREPROCESSOR_NAME)
+def config_steps(config: dict) -> List[Dict[str, Any]]:
+    """Returns the `steps` listed in the preprocess config."""
+    assert config.get("steps"), (
+        f"ERROR: The '{PIPELINE_PREPROCESSOR_NAME}' preprocessor needs `steps` in the "
+        "preprocess config!"
+    )
+    return config["steps"]
+
+
+def preprocessor_steps(config: dict) -> List[Dict[str, Any]]:
+    """Returns the step configs of the preprocessor of a preprocess config.
+
+    Arguments:
+        config -- The preprocess config.
+    """
+    name = config["preprocessor_name"]
+    assert name in PREPROCESSOR_REGISTRY, (
+        f"ERROR: No preprocessor '{name}' found (available: "
+        f"{', '.join(PREPROCESSOR_REGISTRY)})! Check spelling in the preprocess config?"
+    )
+    return PREPROCESSOR_REGISTRY[name](config)
+
+
+class PreprocessStep(ABC):
+    """Base class of the preprocessing steps of a `Pipeline`.
+
+    A step declares the columns it reads (`input_columns`) and the columns of the
+    data after the step (`output_columns`), so a pipeline is checked against the
+    columns of the data before anything is run.
+
+    Public methods:
+    input_columns -- The columns the step reads.
+    output_columns -- The columns after the step, given the columns before it.
+    apply -- Apply the step to the data.
+
+    Instance variables:
+    name -- The registered name of the step.
+    """
+
+    name = ""
+
+    def input_columns(self) -> List[str]:
+        """Returns the columns the step reads, which must be in the data."""
+        return []
+
+    def output_columns(self, columns: List[str]) -> List[str]:
+        """Returns the columns after the step.
+
+        Arguments:
+            columns -- The columns before the step.
+        """
+        return columns
+
+    @abstractmethod
+    def apply(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Apply the step to the data.
+
+        Arguments:
+            data -- The data.
+
+        Returns:
+            The processed data.
+        """
+
+
+class RowFilter(PreprocessStep):
+    """A step that only removes rows. Consecutive row filters and column drops are
+    fused by the `Pipeline` into a single selection of the data frame."""
+
+    @abstractmethod
+    def mask(self, data: pd.DataFrame, columns: List[str]) -> np.ndarray:
+        """Returns a boolean array, True for the rows to keep.
+
+        Arguments:
+            data -- The data (possibly with columns already dropped by a fused step).
+            columns -- The columns of the data at this step.
+        """
+
+    def apply(self, data: pd.DataFrame) -> pd.DataFrame:
+        return data.loc[self.mask(data, data.columns.tolist())]
+
+
+@register_step("filter_rows")
+class FilterRows(RowFilter):
+    """Keep (or exclude) the rows with the given values in a column, e.g. to exclude
+    studies."""
+
+    def __init__(
+        self,
+        column: str,
+        include: Optional[List[Any]] = None,
+        exclude: Optional[List[Any]] = None,
+    ) -> None:
+        """Create the step.
+
+        Arguments:
+            column -- The column to filter on.
+
+        Keyword Arguments:
+            include -- Only keep the rows with these values. (default: {None})
+            exclude -- Remove the rows with these values. (default: {None})
+        """
+        assert (include is None) != (exclude is None), (
+            "ERROR: Give either `include` or `exclude` to the filter_rows step!"
+        )
+        self.column = column
+        self.include = include
+        self.exclude = exclude
+
+    def input_columns(self) -> List[str]:
+        return [self.column]
+
+    def mask(self, data: pd.DataFrame, columns: List[str]) -> np.ndarray:
+        if self.include is not None:
+            return data[self.column].isin(self.include).to_numpy()
+        print(f"Excluding {self.column}: {self.exclude}")
+        return ~data[self.column].isin(self.exclude).to_numpy()
+
+
+@register_step("dropna")
+class DropNA(RowFilter):
+    """Remove the rows with a missing value (in any of the given columns)."""
+
+    def __init__(self, subset: Optional[List[str]] = None) -> None:
+        """Create the step.
+
+        Keyword Arguments:
+            subset -- Only look for missing values in these columns. All columns if
+                not given. (default: {None})
+        """
+        self.subset = subset
+
+    def input_columns(self) -> List[str]:
+        return self.subset or []
+
+    def mask(self, data: pd.DataFrame, columns: List[str]) -> np.ndarray:
+        return data[self.subset or columns].notna().all(axis=1).to_numpy()
+
+
+@register_step("drop_columns")
+class DropColumns(PreprocessStep):
+    """Remove columns from the data."""
+
+    def __init__(self, columns: List[str], missing_ok: bool = False) -> None:
+        """Create the step.
+
+        Arguments:
+            columns -- The columns to remove.
+
+        Keyword Arguments:
+            missing_ok -- Skip columns that are not in the data instead of failing.
+                (default: {False})
+        """
+        self.columns = columns
+        self.missing_ok = missing_ok
+
+    def input_columns(self) -> List[str]:
+        return [] if self.missing_ok else self.columns
+
+    def output_columns(self, columns: List[str]) -> List[str]:
+        dropped = set(self.columns)
+        return [column for column in columns if column not in dropped]
+
+    def apply(self, data: pd.DataFrame) -> pd.DataFrame:
+        return data[self.output_columns(data.columns.tolist())]
+
+
+@register_step("one_hot")
+class OneHot(PreprocessStep):
+    """Replace categorical columns with dummy (one hot encoded) columns. The fitted
+    encoder is saved with the data, so new data can be encoded the same way."""
+
+    def __init__(
+        self,
+        columns: List[str],
+        prefix: Optional[List[str]] = None,
+        drop_first: bool = False,
+    ) -> None:
+        """Create the step.
+
+        Arguments:
+            columns -- The categorical columns to encode.
+
+        Keyword Arguments:
+            prefix -- The prefix of the dummy columns of every column. The column
+                names if not given. (default: {None})
+            drop_first -- Leave out the dummy column of the first level.
+                (default: {False})
+        """
+        self.columns = columns
+        self.prefix = prefix or columns
+        self.drop_first = drop_first
+        self.encoder: Optional[OneHotEncoder] = None
+
+    def input_columns(self) -> List[str]:
+        return self.columns
+
+    def output_columns(self, columns: List[str]) -> List[str]:
+        # (The dummy columns depend on the levels in the data and are not declared.)
+        encoded = set(self.columns)
+        return [column for column in columns if column not in encoded]
+
+    def apply(self, data: pd.DataFrame) -> pd.DataFrame:
+        self.encoder = OneHotEncoder.fit(data, self.columns, self.prefix, self.drop_first)
+        data = self.encoder.transform(data)
+        print(f"One hot encoded {', '.join(self.columns)} ({data.shape[1]} columns).")
+        return data
+
+
+@register_step("map_values")
+class MapValues(PreprocessStep):
+    """Replace values of a column, e.g. the ground truth labels with 0 and 1."""
+
+    def __init__(self, column: str, values: Dict[Any, Any]) -> None:
+        """Create the step.
+
+        Arguments:
+            column -- The column.
+            values -- Maps the old values to the new values.
+        """
+        self.column = column
+        self.values = values
+
+    def input_columns(self) -> List[str]:
+        return [self.column]
+
+    def apply(self, data: pd.DataFrame) -> pd.DataFrame:
+        data = data.copy()
+        data[self.column] = data[self.column].replace(self.values)
+        return data
+
+
+class Selection(PreprocessStep):
+    """Consecutive row filters and column drops, applied as one selection of the
+    data frame: the row masks are combined and the rows and columns are taken in a
+    single `.loc`, instead of copying the data frame once per step."""
+
+    def __init__(self, steps: List[PreprocessStep]) -> None:
+        """Create the fused step.
+
+        Arguments:
+            steps -- The row filters and column drops, in pipeline order.
+        """
+        self.steps = steps
+        self.name = "+".join(step.name for step in steps)
+
+    def output_columns(self, columns: List[str]) -> List[str]:
+        for step in self.steps:
+            columns = step.output_columns(columns)
+        return columns
+
+    def apply(self, data: pd.DataFrame) -> pd.DataFrame:
+        # Filters only remove rows, so every mask can be evaluated on the input
+        # data, with the columns left at the position of the filter.
+        keep = np.ones(len(data), dtype=bool)
+        columns = data.columns.tolist()
+        for step in self.steps:
+            if isinstance(step, RowFilter):
+                keep &= step.mask(data, columns)
+            columns = step.output_columns(columns)
+        return data.loc[keep, columns]
+
+
+def _fusable(step: PreprocessStep) -> bool:
+    """Returns True if the step can be part of a fused `Selection`."""
+    return isinstance(step, (RowFilter, DropColumns))
+
+
+class Pipeline:
+    """A sequence of preprocessing steps, built from the `steps` of a preprocess
+    config, followed by the split into training and test sets.
+
+    Columns kept outside the data frame (the genes of a sparse mutation matrix) are
+    passed as sparse columns: the column drops apply to them as well, and the other
+    steps cannot read them.
+
+    Public methods:
+    from_config -- Build the pipeline from step configs.
+    validate -- Check that every step finds its input columns.
+    run -- Run the steps and split the data.
+    encoder -- The encoder fitted by the one hot steps of the last run, if any.
+    sparse_columns -- The sparse columns left after the column drops of the last run.
+
+    Instance variables:
+    steps -- The steps, with consecutive row filters and column drops fused.
+    test_set_size -- Part of the data used as test set.
+    random_seed -- The seed of the training/test split.
+    """
+
+    def __init__(
+        self,
+        steps: List[PreprocessStep],
+        test_set_size: float,
+        random_seed: int,
+        fuse: bool = True,
+    ) -> None:
+        """Create the pipeline.
+
+        Arguments:
+            steps -- The preprocessing steps, in order.
+            test_set_size -- Part of the data used as test set.
+            random_seed -- The seed of the training/test split.
+
+        Keyword Arguments:
+            fuse -- Fuse consecutive row filters and column drops. (default: {True})
+        """
+        self.steps = self._fuse(steps) if fuse else steps
+        self.test_set_size = test_set_size
+        self.random_seed = random_seed
+        self._sparse_columns: List[str] = []
+
+    @classmethod
+    def from_config(
+        cls, step_configs: List[Dict[str, Any]], test_set_size: float, random_seed: int
+    ) -> "Pipeline":
+        """Build the pipeline from step configs: dicts with the registered `step`
+        name and the arguments of the step.
+
+        Arguments:
+            step_configs -- The step configs, in order.
+            test_set_size -- Part of the data used as test set.
+            random_seed -- The seed of the training/test split.
+        """
+        steps = []
+        for step_config in step_configs:
+            step_config = dict(step_config)
+            name = step_config.pop("step")
+            assert name in STEP_REGISTRY, (
+                f"ERROR: No preprocessing step '{name}' found (available: "
+                f"{', '.join(STEP_REGISTRY)})! Check spelling in the preprocess config?"
+            )
+            steps.append(STEP_REGISTRY[name](**step_config))
+        return cls(steps, test_set_size, random_seed)
+
+    @staticmethod
+    def _fuse(steps: List[PreprocessStep]) -> List[PreprocessStep]:
+        """Replace every run of consecutive row filters and column drops with a
+        single `Selection`."""
+        fused: List[PreprocessStep] = []
+        run: List[PreprocessStep] = []
+        for step in steps + [None]:
+            if step is not None and _fusable(step):
+                run.append(step)
+                continue
+            if len(run) > 1:
+                fused.append(Selection(run))
+            else:
+                fused.extend(run)
+            run = []
+            if step is not None:
+                fused.append(step)
+        return fused
+
+    def validate(
+        self, columns: List[str], sparse_columns: Optional[List[str]] = None
+    ) -> List[str]:
+        """Check that every step finds its input columns, given the columns of the
+        data the pipeline is run on.
+
+        Arguments:
+            columns -- The columns of the data.
+
+        Keyword Arguments:
+            sparse_columns -- The columns kept outside the data frame, which only the
+                column drops can remove. (default: {None})
+
+        Returns:
+            The sparse columns left after the column drops.
+        """
+        sparse_columns = list(sparse_columns or [])
+        for step in self.steps:
+            for inner_step in getattr(step, "steps", [step]):
+                is_drop = isinstance(inner_step, DropColumns)
+                available = set(columns + sparse_columns if is_drop else columns)
+                missing = [c for c in inner_step.input_columns() if c not in available]
+                assert not missing, (
+                    f"ERROR: Column(s) {', '.join(missing)} of preprocessing step "
+                    f"'{inner_step.name}' not in the data!"
+                )
+                columns = inner_step.output_columns(columns)
+                if is_drop:
+                    sparse_columns = inner_step.output_columns(sparse_columns)
+        return sparse_columns
+
+    def run(
+        self, data: pd.DataFrame, sparse_columns: Optional[List[str]] = None
+    ) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Run the steps and split the data into training and test sets.
+
+        Arguments:
+            data -- The original data.
+
+        Keyword Arguments:
+            sparse_columns -- The columns kept outside the data frame, see
+                `sparse_columns`. (default: {None})
+
+        Returns:
+            A tuple with the training and test data sets, with reset indices.
+        """
+        from sklearn.model_selection import train_test_split
+
+        self._sparse_columns = self.validate(data.columns.tolist(), sparse_columns)
+        for step in self.steps:
+            print(f"Running step {step.name}..")
+            data = step.apply(data)
+        print(f"Processed data: {data.shape[0]} rows, {data.shape[1]} columns.")
+
+        print(
+            f"Splitting the data {int((1-self.test_set_size)*100)}/"
+            f"{int(self.test_set_size*100)} for training/test set. "
+        )
+        train, test = train_test_split(
+            data, test_size=self.test_set_size, random_state=self.random_seed
+        )
+        return train.reset_index(drop=True), test.reset_index(drop=True)
+
+    def encoder(self) -> Optional[OneHotEncoder]:
+        """Returns the encoder fitted by the one hot steps of the last run (all one
+        hot steps combined, in order), None if the pipeline has no one hot steps."""
+        encoders = [step.encoder for step in self.steps if isinstance(step, OneHot)]
+        return OneHotEncoder.combine(encoders) if encoders else None
+
+    def sparse_columns(self) -> List[str]:
+        """Returns the sparse columns of the last run left after the column drops,
+        to be kept in the matrix outside the data frame."""
+        return self._sparse_columns
@@ -0,0 +1,62 @@
+import argparse
+
+from src.server import create_server
+
+
+def main(
+    host: str, port: int, cache_size: int, max_batch_rows: int, max_wait_ms: float
+) -> None:
+    server = create_server(host, port, cache_size, max_batch_rows, max_wait_ms)
+    print(f"Serving predictions on http://{host}:{server.server_address[1]} (Ctrl+C to stop).")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    # Parse command line arguments.
+    parser = argparse.ArgumentParser(
+        description="Script to run a local prediction server, keeping trained models "
+        "loaded between requests.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument(
+        "--host",
+        type=str,
+        default="127.0.0.1",
+        help="Host to listen on.",
+    )
+    parser.add_argument(
+        "-p",
+        "--port",
+        type=int,
+        default=8080,
+        help="Port to listen on.",
+    )
+    parser.add_argument(
+        "-cs",
+        "--cache_size",
+        type=int,
+        default=4,
+        help="Maximum number of experiment folders (models) kept loaded.",
+    )
+    parser.add_argument(
+        "-mb",
+        "--max_batch_rows",
+        type=int,
+        default=256,
+        help="Maximum number of rows predicted in one model inference call.",
+    )
+    parser.add_argument(
+        "-mw",
+        "--max_wait_ms",
+        type=float,
+        default=5.0,
+        help="Maximum time (in milliseconds) a batch waits for concurrent requests.",
+    )
+    args = vars(parser.parse_args())
+
+    main(**args)
@@ -1,22 +1,186 @@
 import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
-from typing import Any, Dict, List, Optional
+from typing import Any, Callable, Dict, List, Optional, Tuple
 
-import matplotlib.pyplot as plt
+import numpy as np
 import pandas as pd
-from sklearn.metrics import accuracy_score, precision_recall_fscore_support
 
 from src.dataloader import DataLoader
-from src.models import (KERAS_MODEL_NAME, XGBOOST_MODEL_NAME, KerasFeedForward,
-                        XGBoost)
-from src.plots import (confusion_matrix, histogram, scatter_plot,
-                       scatter_tsne_2d)
+from src.embedding import EMBEDDING_CACHE_FOLDER_NAME
+from src.metrics import (bootstrap_metrics, calibration_table, class_scores,
+                         classification_metrics, probability_metrics,
+                         threshold_sweep)
+from src.models import get_model_class
+from src.plots import (calibration_curve, confusion_matrix, figure_axes,
+                       histogram, metrics_vs_threshold, precision_recall_curve,
+                       roc_curve, scatter_plot, scatter_tsne_2d)
+from src.schema import schema_path_for
 from src.utils import prepare_save_folder, read_config
 
+# Column of the inference output holding the probabilities of the class labelled 1.
+PROBABILITY_COLUMN = "probability"
+
+# Keys of the analysis config entries naming the data columns they use.
+COLUMN_KEYS = [
+    "ground_truth_col",
+    "prediction_col",
+    "probability_col",
+    "column",
+    "x_column",
+    "y_column",
+    "color_column",
+    "columns",
+    "groupby",
+]
+
+# The analysis config keys of the figures (and tables), in plan order. Every entry
+# of these keys is one artifact of the execution plan.
+ARTIFACT_KEYS = [
+    "confusion_matrix",
+    "histogram",
+    "scatter_plot",
+    "tsne_2d",
+    "threshold_sweep",
+    "roc_curve",
+    "precision_recall_curve",
+    "calibration",
+]
+
+TIMINGS_FILE_NAME = "timings.json"
+
+# A planned artifact: the analysis config key, the output name, the render function
+# and its inputs.
+Artifact = Tuple[str, str, Callable[..., None], Dict[str, Any]]
+
+
+# NOTE! The render functions below run in worker processes. They get the data they
+# plot as arguments (computed once by the Analyzer), draw on their own Agg figure
+# (no pyplot state) and save the result to `output_stem` + the file suffix.
+
+
+def _render_confusion_matrix(
+    output_stem: Path,
+    ground_truth: pd.Series,
+    predicted: pd.Series,
+    plotargs: Dict[str, Any],
+) -> None:
+    fig, ax = figure_axes(facecolor="w", edgecolor="k")
+    confusion_matrix(
+        ground_truth_labels=ground_truth,
+        predicted_labels=predicted,
+        class_labels=["Non-Responder", "Responder"],
+        ax=ax,
+        imshow_kwargs=plotargs,
+    )
+    fig.subplots_adjust(left=0.1, right=0.9, bottom=0.3, top=0.9)
+    fig.savefig(f"{output_stem}.png")
+
+
+def _render_histogram(
+    output_stem: Path, values: pd.Series, type: str, plotargs: Dict[str, Any]
+) -> None:
+    fig, ax = figure_axes()
+    histogram(values, type, plotargs, ax=ax)
+    fig.savefig(f"{output_stem}.png", bbox_inches="tight")
+
+
+def _render_scatter_plot(
+    output_stem: Path,
+    data: pd.DataFrame,
+    x_column: str,
+    y_column: str,
+    color_column: str,
+    plotargs: Dict[str, Any],
+) -> None:
+    fig, ax = figure_axes(facecolor="w", edgecolor="k")
+    scatter_plot(data, x_column, y_column, color_column, plotargs, ax=ax)
+    fig.savefig(f"{output_stem}.png", bbox_inches="tight")
+
+
+def _render_tsne_2d(
+    output_stem: Path,
+    data: pd.DataFrame,
+    columns: List[str],
+    groupby: str,
+    plotargs: Dict[str, Any],
+    cache_dir: Path,
+) -> None:
+    fig, ax = figure_axes()
+    scatter_tsne_2d(data, columns, groupby, plotargs, ax=ax, cache_dir=cache_dir)
+    fig.savefig(f"{output_stem}.png", bbox_inches="tight")
+
+
+def _render_threshold_sweep(
+    output_stem: Path, sweep: pd.DataFrame, plotargs: Dict[str, Any]
+) -> None:
+    sweep.to_csv(f"{output_stem}.csv", index=False)
+    fig, ax = figure_axes(facecolor="w", edgecolor="k")
+    metrics_vs_threshold(sweep, plotargs, ax=ax)
+    fig.savefig(f"{output_stem}.png", bbox_inches="tight")
+
+
+def _render_roc_curve(
+    output_stem: Path,
+    ground_truth: np.ndarray,
+    scores: np.ndarray,
+    pos_label: int,
+    plotargs: Dict[str, Any],
+) -> None:
+    fig, ax = figure_axes(facecolor="w", edgecolor="k")
+    roc_curve(ground_truth, scores, pos_label, plotargs, ax=ax)
+    fig.savefig(f"{output_stem}.png", bbox_inches="tight")
+
+
+def _render_precision_recall_curve(
+    output_stem: Path,
+    ground_truth: np.ndarray,
+    scores: np.ndarray,
+    pos_label: int,
+    plotargs: Dict[str, Any],
+) -> None:
+    fig, ax = figure_axes(facecolor="w", edgecolor="k")
+    precision_recall_curve(ground_truth, scores, pos_label, plotargs, ax=ax)
+    fig.savefig(f"{output_stem}.png", bbox_inches="tight")
+
+
+def _render_calibration(
+    output_stem: Path, calibration: pd.DataFrame, plotargs: Dict[str, Any]
+) -> None:
+    calibration.to_csv(f"{output_stem}.csv", index=False)
+    fig, ax = figure_axes(facecolor="w", edgecolor="k")
+    calibration_curve(calibration, plotargs, ax=ax)
+    fig.savefig(f"{output_stem}.png", bbox_inches="tight")
+
+
+def render_artifact(
+    render: Callable[..., None], output_stem: Path, inputs: Dict[str, Any]
+) -> float:
+    """Render and save one artifact of the analysis (run in a worker process).
+
+    Arguments:
+        render -- The render function of the artifact.
+        output_stem -- The output path, without file suffix.
+        inputs -- The arguments of the render function.
+
+    Returns:
+        The render time in seconds.
+    """
+    start = time.perf_counter()
+    render(output_stem, **inputs)
+    return time.perf_counter() - start
+
 
 class Analyzer:
     """Handles the interaction with the different metric and plot functionality.
 
+    The analysis config is turned into an execution plan: the data (and, if
+    needed, the model) is loaded once, the inputs of every figure are computed once
+    in this process (shared between figures, e.g. the probabilities and scores),
+    and the figures are rendered by worker processes.
+
     Public methods:
     analyse -- Do the analysis specified in the config tile and save the results
             in the output directory.
@@ -28,6 +192,7 @@ class Analyzer:
     dataloader -- The configured data loader.
     model_path -- The path to a stored model.
     model_type -- The type of machine learning model to load.
+    timings -- The load, prepare and render times of the analysis, in seconds.
     """
 
     def __init__(
@@ -61,23 +226,66 @@ class Analyzer:
             data_path = Path(self.analysis_config["prediction_data_path"])
         self.analysis_config["prediction_data_path"] = str(data_path)
 
-        self.dataloader = DataLoader(data_path, self.model_config["gt_column"])
-        self.dataloader.load_data()
+        start = time.perf_counter()
+        self.dataloader = DataLoader(
+            data_path,
+            self.model_config["gt_column"],
+            schema_path_for(self.model_config["preprocessed_data_path"]),
+        )
+        self.dataloader.load_data(self._used_columns())
+        self.timings: Dict[str, Any] = {"load_data": time.perf_counter() - start}
+
+        # Results shared between the artifacts, computed on first use.
+        self._data: Optional[pd.DataFrame] = None
+        self._shared_results: Dict[Tuple, Any] = {}
+        self._model = None
+
+    def _used_columns(self) -> List[str]:
+        """Returns the data columns used by the configured analyses, so only these
+        columns are loaded."""
+        columns = ["predicted", PROBABILITY_COLUMN]
+        for entries in self.analysis_config.values():
+            if not isinstance(entries, list):
+                continue
+            for entry in entries:
+                for key in COLUMN_KEYS:
+                    value = entry.get(key, [])
+                    columns.extend(value if isinstance(value, list) else [value])
+        return columns
+
+    def _complete_data(self) -> pd.DataFrame:
+        """Returns the analysed data (including any sparse mutations), assembled
+        once."""
+        if self._data is None:
+            self._data = self.dataloader.get_complete_data()
+        return self._data
+
+    def _shared(self, key: Tuple, compute: Callable[[], Any]) -> Any:
+        """Returns a result shared between artifacts, computed on first use.
+
+        Arguments:
+            key -- The key of the result.
+            compute -- Computes the result.
+        """
+        if key not in self._shared_results:
+            self._shared_results[key] = compute()
+        return self._shared_results[key]
 
     def _init_model(self, model_path: Optional[Path] = None):
-        """Initialise the model.
+        """Initialise the model, once.
 
         Keyword Arguments:
             model_path -- The path for loading an existing model. (default: {None})
         """
-        print("Initiating the model...")
-        if self.model_type == XGBOOST_MODEL_NAME:
-            return XGBoost(self.model_config, model_path)
-        elif self.model_type == KERAS_MODEL_NAME:
-            number_of_columns = len(self.dataloader.get_data().columns)
-            return KerasFeedForward(self.model_config, number_of_columns, model_path)
-        else:
-            assert False, "No model found!"
+        if self._model is None:
+            print("Initiating the model...")
+            start = time.perf_counter()
+            model_class = get_model_class(self.model_type)
+            self._model = model_class.from_config(
+                self.model_config, self.dataloader, model_path
+            )
+            self.timings["load_model"] = time.perf_counter() - start
+        return self._model
 
     def _eli5_model_weights(self, save_path: Path) -> None:
         """Create an eli5 explanation of the model and save the result.
@@ -87,56 +295,43 @@ class Analyzer:
         """
         model = self._init_model(self.model_path)
         assert model.explain_weights, "Missing model weight explanation function."
-        model.explain_weights()
+        explanation = model.explain_weights()
         with open(save_path / "analysis/model_weights_eli5.txt", "w") as f:
             print("Saving eli5 info.")
-            f.write(model.explain_weights())
+            f.write(explanation)
 
-    def _plot_confusion_matrix(
+    def _plan_confusion_matrix(
         self,
-        save_path: Path,
-        output_name: str,
         ground_truth_col: str,
         prediction_col: str,
         plotargs: Dict[str, Any] = {},
-    ) -> None:
-        """Plot a confusion matrix and save the plot.
+    ) -> Tuple[Callable[..., None], Dict[str, Any]]:
+        """Plan a confusion matrix plot.
 
         Arguments:
-            save_path -- The path where to save the plot.
-            output_name -- The desired name of the resulting confusion matrix image.
             ground_truth_col -- The name of the ground truth column.
             prediction_col -- The name of the prediction column,
 
         Keyword Arguments:
             plotargs -- Any additional arguments for the plot function.
         """
-        data = self.dataloader.get_complete_data()
-
-        confusion_matrix(
-            ground_truth_labels=data[ground_truth_col],
-            predicted_labels=data[prediction_col],
-            class_labels=["Non-Responder", "Responder"],
-            imshow_kwargs=plotargs,
-        )
-        print(f"Saving '{output_name}.png' confusion_matrix plot.")
-        plt.subplots_adjust(left=0.1, right=0.9, bottom=0.3, top=0.9)
-        plt.savefig(save_path / f"analysis/{output_name}.png")
+        data = self._complete_data()
+        return _render_confusion_matrix, {
+            "ground_truth": data[ground_truth_col],
+            "predicted": data[prediction_col],
+            "plotargs": plotargs,
+        }
 
-    def _plot_scatter_plot(
+    def _plan_scatter_plot(
         self,
-        save_path: Path,
-        output_name: str,
         x_column: str,
         y_column: str,
         color_column: str,
         plotargs: Dict[str, Any] = {},
-    ) -> None:
-        """Create a scatter plot of two specified columns and save the result.
+    ) -> Tuple[Callable[..., None], Dict[str, Any]]:
+        """Plan a scatter plot of two specified columns.
 
         Arguments:
-            save_path -- The path where to save the result.
-            output_name -- The desired name of the resulting scatter plot image.
             x_column -- The name of the column used for the x-values.
             y_column -- The name of the column used for the y-values.
             color_column -- A color specification.
@@ -144,65 +339,216 @@ class Analyzer:
         Keyword Arguments:
             plotargs -- Any additional arguments for the plot function.
         """
-        data = self.dataloader.get_complete_data()
-        df = data[[x_column, y_column, color_column]]
-
-        scatter_plot(df.dropna(), x_column, y_column, color_column, plotargs)
+        data = self._complete_data()[[x_column, y_column, color_column]]
+        return _render_scatter_plot, {
+            "data": data.dropna(),
+            "x_column": x_column,
+            "y_column": y_column,
+            "color_column": color_column,
+            "plotargs": plotargs,
+        }
 
-        print(f"Saving '{output_name}.png' scatter plot.")
-        plt.savefig(save_path / f"analysis/{output_name}.png", bbox_inches="tight")
-
-    def _plot_histogram(
-        self,
-        save_path: Path,
-        output_name: str,
-        column: str,
-        type: str,
-        plotargs: Dict[str, Any] = {},
-    ) -> None:
-        """Create a histogram plot of a given column and save the result.
+    def _plan_histogram(
+        self, column: str, type: str, plotargs: Dict[str, Any] = {}
+    ) -> Tuple[Callable[..., None], Dict[str, Any]]:
+        """Plan a histogram plot of a given column.
 
         Arguments:
-            save_path -- The path where to save the result.
-            output_name -- The desired name of the resulting plot image.
             column -- The name of the data column to use for the histogram.
             type -- The type of histogram.
 
         Keyword Arguments:
             plotargs -- Any additional kwargs to the plot function.
         """
-        data = self.dataloader.get_complete_data()
+        return _render_histogram, {
+            "values": self._complete_data()[column].dropna(),
+            "type": type,
+            "plotargs": plotargs,
+        }
 
-        histogram(data[column].dropna(), type, plotargs)
+    def _plan_tsne_2d(
+        self, columns: List[str], groupby: str, plotargs: Dict[str, Any] = {}
+    ) -> Tuple[Callable[..., None], Dict[str, Any]]:
+        """Plan a tsne 2d plot. The embeddings are cached in the analysis folder of
+        the experiment, so they are only computed again for other data or
+        parameters.
+
+        Arguments:
+            columns -- Which columns to use in the TSNE decomposition.
+            groupby -- How to group the data (a.k.a. the colors of the data points).
+
+        Keyword Arguments:
+            plotargs -- Any additional kwargs to the plot function, e.g. the
+                embedding `method`, `pca_components` and `max_samples`.
+        """
+        return _render_tsne_2d, {
+            "data": self._complete_data()[list(dict.fromkeys(columns + [groupby]))],
+            "columns": columns,
+            "groupby": groupby,
+            "plotargs": plotargs,
+            "cache_dir": Path(self.output_path) / EMBEDDING_CACHE_FOLDER_NAME,
+        }
 
-        print(f"Saving '{output_name}.png' histogram.")
-        plt.savefig(save_path / f"analysis/{output_name}.png", bbox_inches="tight")
+    def _probabilities(self, probability_col: str) -> pd.DataFrame:
+        """Returns the ground truth and the stored probabilities of the rows."""
+
+        def compute() -> pd.DataFrame:
+            data = self._complete_data()
+            assert probability_col in data.columns, (
+                f"ERROR: No '{probability_col}' column in the analysed data! Create "
+                "the data with infer.py, which stores the predicted probabilities."
+            )
+            return data[[self.model_config["gt_column"], probability_col]].dropna()
+
+        return self._shared(("probabilities", probability_col), compute)
+
+    def _scores(self, probability_col: str, pos_label: int) -> np.ndarray:
+        """Returns the scores of the `pos_label` class of the rows."""
+        return self._shared(
+            ("scores", probability_col, pos_label),
+            lambda: class_scores(
+                self._probabilities(probability_col)[probability_col], pos_label
+            ),
+        )
 
-    def _tsne_2d(
+    def _plan_threshold_sweep(
         self,
-        save_path: Path,
-        output_name: str,
-        columns: List[str],
-        groupby: str,
+        n_thresholds: int = 101,
+        pos_label: int = 0,
+        probability_col: str = PROBABILITY_COLUMN,
         plotargs: Dict[str, Any] = {},
-    ) -> None:
-        """Create a tsne 2d plot and saves the result.
+    ) -> Tuple[Callable[..., None], Dict[str, Any]]:
+        """Calculate the metrics for a range of decision thresholds from the stored
+        probabilities, saved as a table and a plot.
 
-        Arguments:
-            save_path -- The path where to save the result.
-            output_name -- The desired name of the resulting plot image.
-            columns -- Which columns to use in the TSNE decomposition.
-            groupby -- How to group the data (a.k.a. the colors of the data points).
+        Keyword Arguments:
+            n_thresholds -- The number of thresholds between 0 and 1. (default: {101})
+            pos_label -- The class of the precision, recall and F-score. (default: {0})
+            probability_col -- The name of the probability column.
+            plotargs -- Any additional arguments for the plot function.
+        """
+        data = self._probabilities(probability_col)
+        gt = data[self.model_config["gt_column"]]
+        thresholds = np.linspace(0, 1, n_thresholds).round(10)
+        sweep = threshold_sweep(gt, data[probability_col], thresholds, pos_label)
+        return _render_threshold_sweep, {"sweep": sweep, "plotargs": plotargs}
+
+    def _plan_roc_curve(
+        self,
+        pos_label: int = 0,
+        probability_col: str = PROBABILITY_COLUMN,
+        plotargs: Dict[str, Any] = {},
+    ) -> Tuple[Callable[..., None], Dict[str, Any]]:
+        """Plan the ROC curve of the stored probabilities.
 
         Keyword Arguments:
-            plotargs -- Any additional kwargs to the plot function.
+            pos_label -- The class the curve is plotted for. (default: {0})
+            probability_col -- The name of the probability column.
+            plotargs -- Any additional arguments for the plot function.
+        """
+        data = self._probabilities(probability_col)
+        return _render_roc_curve, {
+            "ground_truth": data[self.model_config["gt_column"]].to_numpy(),
+            "scores": self._scores(probability_col, pos_label),
+            "pos_label": pos_label,
+            "plotargs": plotargs,
+        }
+
+    def _plan_precision_recall_curve(
+        self,
+        pos_label: int = 0,
+        probability_col: str = PROBABILITY_COLUMN,
+        plotargs: Dict[str, Any] = {},
+    ) -> Tuple[Callable[..., None], Dict[str, Any]]:
+        """Plan the precision-recall curve of the stored probabilities.
+
+        Keyword Arguments:
+            pos_label -- The class the curve is plotted for. (default: {0})
+            probability_col -- The name of the probability column.
+            plotargs -- Any additional arguments for the plot function.
+        """
+        data = self._probabilities(probability_col)
+        return _render_precision_recall_curve, {
+            "ground_truth": data[self.model_config["gt_column"]].to_numpy(),
+            "scores": self._scores(probability_col, pos_label),
+            "pos_label": pos_label,
+            "plotargs": plotargs,
+        }
+
+    def _plan_calibration(
+        self,
+        n_bins: int = 10,
+        probability_col: str = PROBABILITY_COLUMN,
+        plotargs: Dict[str, Any] = {},
+    ) -> Tuple[Callable[..., None], Dict[str, Any]]:
+        """Compare the stored probabilities with the observed rates of the class
+        labelled 1, saved as a table and a reliability diagram.
+
+        Keyword Arguments:
+            n_bins -- The number of probability bins. (default: {10})
+            probability_col -- The name of the probability column.
+            plotargs -- Any additional arguments for the plot function.
+        """
+        data = self._probabilities(probability_col)
+        calibration = calibration_table(
+            data[self.model_config["gt_column"]], data[probability_col], n_bins
+        )
+        return _render_calibration, {"calibration": calibration, "plotargs": plotargs}
+
+    def _plan(self) -> List[Artifact]:
+        """Build the execution plan of the configured figures: compute the inputs of
+        every figure (once, shared results are reused) and time it.
+
+        Returns:
+            The planned artifacts.
         """
-        data = self.dataloader.get_complete_data()
+        plan = []
+        for key in ARTIFACT_KEYS:
+            for entry in self.analysis_config.get(key) or []:
+                entry = dict(entry)
+                output_name = entry.pop("output_name")
+                start = time.perf_counter()
+                render, inputs = getattr(self, f"_plan_{key}")(**entry)
+                self.timings.setdefault("prepare", {})[output_name] = (
+                    time.perf_counter() - start
+                )
+                plan.append((key, output_name, render, inputs))
+        return plan
+
+    def _render(self, plan: List[Artifact], save_path: Path, n_workers: int) -> None:
+        """Render the planned artifacts, in worker processes if `n_workers` > 1.
 
-        scatter_tsne_2d(data, columns, groupby, plotargs)
+        Arguments:
+            plan -- The planned artifacts.
+            save_path -- The output folder.
+            n_workers -- Number of worker processes.
+        """
+        print(f"\n-----Rendering {len(plan)} figure(s) with {n_workers} worker(s).----")
+        start = time.perf_counter()
+        if n_workers > 1 and len(plan) > 1:
+            # Spawn (not fork) the workers, the model backend may use threads.
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(
+                min(n_workers, len(plan)), mp_context=context
+            ) as executor:
+                futures = [
+                    executor.submit(
+                        render_artifact, render, save_path / f"analysis/{name}", inputs
+                    )
+                    for _, name, render, inputs in plan
+                ]
+                seconds = [future.result() for future in futures]
+        else:
+            seconds = [
+                render_artifact(render, save_path / f"analysis/{name}", inputs)
+                for _, name, render, inputs in plan
+            ]
+        self.timings["render_wall"] = time.perf_counter() - start
 
-        print(f"Saving '{output_name}' tnse 2d plot...")
-        plt.savefig(save_path / f"analysis/{output_name}.png", bbox_inches="tight")
+        self.timings["render"] = {}
+        for (key, name, _, _), render_seconds in zip(plan, seconds):
+            print(f"Saved '{name}' {key.replace('_', ' ')} ({render_seconds:.2f} s).")
+            self.timings["render"][name] = render_seconds
 
     def _prepare_save_folder(self) -> Path:
         """Prepares a folder to store the metrics and plots in."""
@@ -221,65 +567,72 @@ class Analyzer:
         Arguments:
             save_path -- the path to where to save the resulting metrics
         """
-        data = self.dataloader.get_complete_data()
+        data = self._complete_data()
         gt = data[self.model_config["gt_column"]]
         pred = data["predicted"]
 
         # Calculate the metrics
-        result = {}
-        result["accuracy"] = accuracy_score(gt, pred)
-        precision, recall, fscore, _ = precision_recall_fscore_support(
-            gt, pred, pos_label=0, average="binary"
-        )
-        result["precision"] = precision
-        result["recall"] = recall
-        result["fscore"] = fscore
+        result = classification_metrics(gt, pred)
+        if PROBABILITY_COLUMN in data.columns:
+            result.update(probability_metrics(gt, data[PROBABILITY_COLUMN]))
 
         # Save the result.
         with open(save_path / "analysis/metrics.txt", "w") as f:
             print("Saving metrics.")
             f.write(f"Metrics: {json.dumps(result, indent=0)}")
 
-    def analyse(self) -> None:
+        # Bootstrap confidence intervals of the metrics.
+        bootstrap_config = self.analysis_config.get("bootstrap")
+        if bootstrap_config:
+            bootstrap_start = time.perf_counter()
+            intervals = bootstrap_metrics(
+                gt,
+                pred,
+                data.get(PROBABILITY_COLUMN),
+                n_boot=bootstrap_config.get("n_boot", 10000),
+                confidence=bootstrap_config.get("confidence", 0.95),
+                random_seed=bootstrap_config.get("random_seed", 0),
+            )
+            self.timings["bootstrap"] = time.perf_counter() - bootstrap_start
+            print(intervals.to_string(index=False))
+            intervals.to_csv(save_path / "analysis/metrics_bootstrap.csv", index=False)
+
+    def analyse(self, n_workers: int = 1) -> None:
         """Perfom the analysis according to the config file and save the
-        results in the spacified output location."""
+        results in the spacified output location.
+
+        Keyword Arguments:
+            n_workers -- Number of worker processes rendering the figures.
+                (default: {1})
+        """
+        start = time.perf_counter()
         # Prepare save folder
         output_dir = self._prepare_save_folder()
-        config_keys = self.analysis_config.keys()
 
         # Calculate metrics.
         if self.analysis_config.get("metrics", False):
             print("\n-----Calculating metrics.----")
+            metrics_start = time.perf_counter()
             self._save_metrics(output_dir)
+            self.timings["metrics"] = time.perf_counter() - metrics_start
 
         # Explain model with eli5.
         if self.analysis_config.get("explain_model_weights_eli5", False):
             assert self.model_path, "No model path given."
             print("\n----Performing eli5 analysis.----")
+            eli5_start = time.perf_counter()
             self._eli5_model_weights(output_dir)
-
-        # Create confusion matrices.
-        if "confusion_matrix" in config_keys:
-            print("\n-----Plotting confusion matrices.----")
-            for matrix_conf in self.analysis_config["confusion_matrix"]:
-                self._plot_confusion_matrix(output_dir, **matrix_conf)
-
-        # Create histograms.
-        if "histogram" in config_keys:
-            print("\n-----Plotting histograms.----")
-            for hist in self.analysis_config["histogram"]:
-                self._plot_histogram(output_dir, **hist)
-
-        # Create scatterplots.
-        if "scatter_plot" in config_keys:
-            print("\n-----Plotting scatter plots.----")
-            for plot in self.analysis_config["scatter_plot"]:
-                self._plot_scatter_plot(output_dir, **plot)
-
-        # Create TNSE 2D plot (only numerical data).
-        if "tsne_2d" in config_keys:
-            print("\n-----Plotting TSNE_2D plots.----")
-            for tsne_conf in self.analysis_config["tsne_2d"]:
-                self._tsne_2d(output_dir, **tsne_conf)
+            self.timings["explain_model_weights_eli5"] = time.perf_counter() - eli5_start
+
+        # Compute the inputs of all figures (TSNE only works with numerical data), then
+        # render them.
+        print("\n-----Planning figures.----")
+        plan = self._plan()
+        self._render(plan, output_dir, n_workers)
+
+        self.timings["n_workers"] = n_workers
+        self.timings["total"] = time.perf_counter() - start
+        with open(output_dir / "analysis" / TIMINGS_FILE_NAME, "w") as f:
+            json.dump(self.timings, f, indent=2)
 
         print(f"\nResults saved to {output_dir}")
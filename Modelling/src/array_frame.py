@@ -0,0 +1,126 @@
+import json
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from src.mutation_matrix import MutationMatrix
+
+# Name of the file describing the columns of a saved frame.
+FRAME_META_FILE_NAME = "frame.json"
+
+
+def _is_nullable(column: pd.Series) -> bool:
+    """Returns True for the pandas nullable boolean and integer columns."""
+    return pd.api.types.is_extension_array_dtype(column) and (
+        pd.api.types.is_bool_dtype(column) or pd.api.types.is_integer_dtype(column)
+    )
+
+
+def save_frame(
+    df: pd.DataFrame, folder: Path, mutations: Optional[MutationMatrix] = None
+) -> None:
+    """Save a data frame (and optionally a mutation matrix) as one .npy file per
+    column, so other processes can memory-map the data instead of receiving a
+    pickled copy. Categorical columns are stored as their category codes, the
+    categories are stored in the json meta data file. Nullable (boolean, Int8, ..)
+    columns are stored as their values and a mask of the missing values.
+
+    Arguments:
+        df -- The data frame to save.
+        folder -- The folder to save the arrays in.
+
+    Keyword Arguments:
+        mutations -- A sparse mutation matrix belonging to the rows of the data
+            frame. (default: {None})
+    """
+    folder = Path(folder)
+    folder.mkdir(exist_ok=True, parents=True)
+
+    columns = []
+    for i, (name, column) in enumerate(df.items()):
+        meta = {"name": name, "file": f"column_{i}.npy"}
+        if pd.api.types.is_categorical_dtype(column):
+            meta["categories"] = column.cat.categories.tolist()
+            values = column.cat.codes.to_numpy()
+        elif _is_nullable(column):
+            meta["dtype"] = str(column.dtype)
+            meta["mask"] = f"mask_{i}.npy"
+            np.save(folder / meta["mask"], column.isna().to_numpy())
+            values = column.to_numpy(dtype=column.dtype.numpy_dtype, na_value=0)
+        else:
+            values = column.to_numpy()
+            assert values.dtype != object, f"ERROR: Column '{name}' is not numerical."
+        np.save(folder / meta["file"], values)
+        columns.append(meta)
+
+    has_mutations = mutations is not None
+    if has_mutations:
+        for part in ["data", "indices", "indptr"]:
+            np.save(folder / f"mutations_{part}.npy", getattr(mutations.matrix, part))
+
+    with open(folder / FRAME_META_FILE_NAME, "w") as f:
+        json.dump(
+            {
+                "columns": columns,
+                "index": df.index.tolist(),
+                "mutations": {
+                    "shape": list(mutations.shape),
+                    "samples": mutations.samples,
+                    "genes": mutations.genes,
+                }
+                if has_mutations
+                else None,
+            },
+            f,
+        )
+
+
+def load_frame(folder: Path) -> Tuple[pd.DataFrame, Optional[MutationMatrix]]:
+    """Load a data frame saved with `save_frame`. The numerical columns and the
+    mutation matrix arrays are memory-mapped (read only), so processes loading the
+    same frame share the pages of the operating system file cache.
+
+    Arguments:
+        folder -- The folder the frame was saved in.
+
+    Returns:
+        A tuple with the data frame and the mutation matrix (None if not saved).
+    """
+    folder = Path(folder)
+    with open(folder / FRAME_META_FILE_NAME) as f:
+        meta = json.load(f)
+
+    columns = {}
+    for column in meta["columns"]:
+        values = np.load(folder / column["file"], mmap_mode="r")
+        if "categories" in column:
+            columns[column["name"]] = pd.Categorical.from_codes(
+                values, categories=column["categories"]
+            )
+        elif "mask" in column:
+            mask = np.load(folder / column["mask"], mmap_mode="r")
+            array_type = (
+                pd.arrays.BooleanArray
+                if column["dtype"] == "boolean"
+                else pd.arrays.IntegerArray
+            )
+            columns[column["name"]] = pd.Series(array_type(values, mask), copy=False)
+        else:
+            columns[column["name"]] = pd.Series(values, copy=False)
+    df = pd.DataFrame(columns, copy=False)
+    df.index = meta["index"]
+
+    mutations = None
+    if meta["mutations"]:
+        parts = [
+            np.load(folder / f"mutations_{part}.npy", mmap_mode="r")
+            for part in ["data", "indices", "indptr"]
+        ]
+        matrix = sparse.csr_matrix(tuple(parts), shape=tuple(meta["mutations"]["shape"]))
+        mutations = MutationMatrix(
+            matrix, meta["mutations"]["samples"], meta["mutations"]["genes"]
+        )
+    return df, mutations
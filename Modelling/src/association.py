@@ -0,0 +1,365 @@
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from src.data_format import read_data
+from src.mutation_matrix import MutationMatrix, mutations_path_for
+
+# The association tests of every gene in the whole cohort.
+ASSOCIATION_TESTS = ["fisher", "chi2"]
+
+# Relative tolerance used to find the tables as extreme as the observed one in the
+# two-sided Fisher exact test (the tolerance of `scipy.stats.fisher_exact`).
+FISHER_TOLERANCE = 1 + 1e-7
+
+# The cells [[a, b], [c, d]] of the 2x2 table of a gene, see `contingency_tables`.
+TABLE_CELLS = [
+    "mutated_responders",
+    "mutated_non_responders",
+    "wildtype_responders",
+    "wildtype_non_responders",
+]
+
+Matrix = Union[np.ndarray, pd.DataFrame, sparse.spmatrix]
+
+
+def binary_matrix(mutations: Matrix) -> Union[np.ndarray, sparse.csr_matrix]:
+    """Returns a sample by gene matrix as a float32 0/1 matrix: 1 where the value is
+    larger than zero (mutated), 0 otherwise (including missing values). Sparse
+    matrices stay sparse.
+
+    Arguments:
+        mutations -- The sample by gene matrix (dense, data frame or scipy sparse).
+    """
+    if sparse.issparse(mutations):
+        return sparse.csr_matrix(mutations > 0, dtype=np.float32)
+    values = mutations.to_numpy() if isinstance(mutations, pd.DataFrame) else mutations
+    with np.errstate(invalid="ignore"):
+        return (np.asarray(values, dtype=float) > 0).astype(np.float32)
+
+
+def load_gene_data(
+    data_path: Path,
+    genes: List[str],
+    outcome_column: str,
+    responder_value: Any,
+    strata_column: Optional[str] = None,
+) -> Tuple[Matrix, List[str], np.ndarray, Optional[np.ndarray]]:
+    """Load the gene matrix, the outcome and the strata of the samples with a known
+    outcome. The data is a tab separated file (`.tsv`, like the original data) or a
+    data file in any of the supported formats; if the data has a sparse mutation
+    matrix (see `src.mutation_matrix`), its genes are used.
+
+    Arguments:
+        data_path -- The path to the data file.
+        genes -- The gene columns. Genes not in the data are ignored.
+        outcome_column -- The column holding the outcome.
+        responder_value -- The outcome value of the responders.
+
+    Keyword Arguments:
+        strata_column -- The column holding the strata (e.g. `Study_ID`). No strata
+            if not given. (default: {None})
+
+    Returns:
+        A tuple with the sample by gene matrix, its genes, the responder indicator
+        and the strata (or None).
+    """
+    columns = [outcome_column] + ([strata_column] if strata_column else [])
+    mutations_path = mutations_path_for(data_path)
+    if Path(data_path).suffix == ".tsv":
+        data = pd.read_csv(data_path, sep="\t", header=0)
+    elif mutations_path.is_file():
+        data = read_data(data_path, columns)
+    else:
+        data = read_data(data_path, columns + genes)
+
+    if mutations_path.is_file():
+        mutation_matrix = MutationMatrix.load(mutations_path).select_genes(genes)
+        genes, matrix = mutation_matrix.genes, mutation_matrix.matrix
+    else:
+        genes = [gene for gene in genes if gene in data.columns]
+        matrix = data[genes]
+    assert genes, f"ERROR: None of the genes are in {data_path}!"
+
+    known = data[outcome_column].notna().to_numpy()
+    if not known.all():
+        print(f"Leaving out {(~known).sum()} samples without {outcome_column}.")
+    responders = (data[outcome_column] == responder_value).to_numpy()[known]
+    strata = data[strata_column].to_numpy()[known] if strata_column else None
+    if isinstance(matrix, pd.DataFrame):
+        matrix = matrix[known]
+    else:
+        matrix = matrix[np.flatnonzero(known)]
+    return matrix, genes, responders, strata
+
+
+def contingency_tables(
+    mutations: Matrix, responders: np.ndarray, strata: Optional[np.ndarray] = None
+) -> Dict[str, np.ndarray]:
+    """Count the 2x2 tables (mutated or not x responder or not) of every gene and
+    stratum with a single matrix multiply: the gene matrix times a matrix with a
+    responder and an all-samples indicator column per stratum.
+
+    Arguments:
+        mutations -- The sample by gene matrix, see `binary_matrix`.
+        responders -- True for the responders, one per sample.
+
+    Keyword Arguments:
+        strata -- The stratum (e.g. study) of every sample. One stratum if not
+            given. (default: {None})
+
+    Returns:
+        A dict with the counts of every cell of TABLE_CELLS, each shape
+        [n_strata, n_genes], and the `strata` labels.
+    """
+    mutations = binary_matrix(mutations)
+    responders = np.asarray(responders, dtype=bool)
+    assert mutations.shape[0] == len(responders), (
+        "ERROR: The gene matrix and the outcome have different numbers of samples!"
+    )
+    if strata is None:
+        labels, codes = np.array([None]), np.zeros(len(responders), dtype=int)
+    else:
+        labels, codes = np.unique(np.asarray(strata), return_inverse=True)
+
+    n_strata = len(labels)
+    design = np.zeros((len(responders), 2 * n_strata), dtype=np.float32)
+    design[np.flatnonzero(responders), codes[responders]] = 1
+    design[np.arange(len(responders)), n_strata + codes] = 1
+
+    # [n_genes, 2 * n_strata]: mutated responders, then mutated samples per stratum.
+    counts = np.rint(mutations.T @ design).astype(np.int64).T
+    n_responders = design[:, :n_strata].sum(axis=0).astype(np.int64)[:, np.newaxis]
+    n_samples = design[:, n_strata:].sum(axis=0).astype(np.int64)[:, np.newaxis]
+
+    a, mutated = counts[:n_strata], counts[n_strata:]
+    return {
+        "mutated_responders": a,
+        "mutated_non_responders": mutated - a,
+        "wildtype_responders": n_responders - a,
+        "wildtype_non_responders": n_samples - n_responders - mutated + a,
+        "strata": labels,
+    }
+
+
+def odds_ratio(
+    a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray
+) -> np.ndarray:
+    """The sample odds ratio a*d / (b*c) of 2x2 tables [[a, b], [c, d]] (inf or nan
+    for empty cells, like `scipy.stats.fisher_exact`)."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return (a * d).astype(float) / (b * c)
+
+
+def fisher_exact(
+    a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray
+) -> np.ndarray:
+    """The two-sided Fisher exact test p-values of 2x2 tables [[a, b], [c, d]].
+
+    The null distribution of `a` (hypergeometric) only depends on the margins of a
+    table, so it is computed once per distinct margins: the p-values of all tables
+    with the same margins are looked up in the cumulative sum of its sorted
+    probabilities.
+
+    Arguments:
+        a, b, c, d -- The cells of the tables, 1D arrays.
+
+    Returns:
+        The p-values, one per table.
+    """
+    from scipy.stats import hypergeom
+
+    a, b, c, d = (np.asarray(x, dtype=np.int64) for x in (a, b, c, d))
+    if not len(a):
+        return np.empty(0)
+    rows, columns, totals = a + b, a + c, a + b + c + d
+    if (columns == columns[0]).all() and (totals == totals[0]).all():
+        # The same responders and samples in every table (e.g. the tables of one
+        # cohort), only the row margins differ.
+        unique_rows, inverse = np.unique(rows, return_inverse=True)
+        unique_margins = np.column_stack(
+            [
+                unique_rows,
+                np.full(len(unique_rows), columns[0]),
+                np.full(len(unique_rows), totals[0]),
+            ]
+        )
+    else:
+        unique_margins, inverse = np.unique(
+            np.column_stack([rows, columns, totals]), axis=0, return_inverse=True
+        )
+    inverse = inverse.ravel()
+
+    # The tables grouped by their margins.
+    order = np.argsort(inverse, kind="stable")
+    ends = np.cumsum(np.bincount(inverse, minlength=len(unique_margins)))
+
+    p_values = np.empty(len(a))
+    for i, (row, column, total) in enumerate(unique_margins):
+        tables = order[ends[i - 1] if i else 0 : ends[i]]
+        low, high = max(0, row + column - total), min(row, column)
+        pmf = np.exp(hypergeom.logpmf(np.arange(low, high + 1), total, column, row))
+        observed = pmf[a[tables] - low] * FISHER_TOLERANCE
+        pmf.sort()
+        cumulative = np.cumsum(pmf)
+        n_as_extreme = np.searchsorted(pmf, observed, side="right")
+        p_values[tables] = cumulative[n_as_extreme - 1]
+    return np.minimum(p_values, 1.0)
+
+
+def chi2_test(
+    a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray, correction: bool = True
+) -> np.ndarray:
+    """The Pearson chi-square test p-values of 2x2 tables [[a, b], [c, d]], like
+    `scipy.stats.chi2_contingency` (nan for tables with an empty margin).
+
+    Arguments:
+        a, b, c, d -- The cells of the tables, 1D arrays.
+
+    Keyword Arguments:
+        correction -- Apply Yates' continuity correction. (default: {True})
+    """
+    from scipy.stats import chi2
+
+    a, b, c, d = (np.asarray(x, dtype=float) for x in (a, b, c, d))
+    n = a + b + c + d
+    margins = (a + b) * (c + d) * (a + c) * (b + d)
+    deviation = np.abs(a * d - b * c) / np.where(n > 0, n, np.nan)
+    if correction:
+        deviation -= np.minimum(0.5, deviation)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        statistic = np.where(margins > 0, deviation**2 * n**3 / margins, np.nan)
+    return chi2.sf(statistic, 1)
+
+
+def cochran_mantel_haenszel(
+    a: np.ndarray, b: np.ndarray, c: np.ndarray, d: np.ndarray, correction: bool = True
+) -> Dict[str, np.ndarray]:
+    """The Cochran-Mantel-Haenszel test of stratified 2x2 tables [[a, b], [c, d]]:
+    the association within the strata (e.g. studies), so differences in the
+    response rate and the mutation rate between strata do not show up as an
+    association.
+
+    Arguments:
+        a, b, c, d -- The cells of the tables, shape [n_strata, n_tests].
+
+    Keyword Arguments:
+        correction -- Apply the continuity correction. (default: {True})
+
+    Returns:
+        A dict with the Mantel-Haenszel common `odds_ratio` and the `p_value` of
+        every test (nan if no stratum has both mutated and wildtype samples of both
+        outcomes).
+    """
+    from scipy.stats import chi2
+
+    a, b, c, d = (np.asarray(x, dtype=float) for x in (a, b, c, d))
+    n = a + b + c + d
+    # Strata with fewer than two samples carry no information.
+    with np.errstate(divide="ignore", invalid="ignore"):
+        n = np.where(n > 1, n, np.nan)
+        expected = (a + b) * (a + c) / n
+        variance = (a + b) * (c + d) * (a + c) * (b + d) / (n**2 * (n - 1))
+        deviation = np.abs(np.nansum(a - expected, axis=0))
+        if correction:
+            deviation -= np.minimum(0.5, deviation)
+        total_variance = np.nansum(variance, axis=0)
+        statistic = np.where(
+            total_variance > 0, deviation**2 / total_variance, np.nan
+        )
+        common_odds_ratio = np.nansum(a * d / n, axis=0) / np.nansum(b * c / n, axis=0)
+    return {"odds_ratio": common_odds_ratio, "p_value": chi2.sf(statistic, 1)}
+
+
+def benjamini_hochberg(p_values: np.ndarray) -> np.ndarray:
+    """Benjamini-Hochberg adjusted p-values (q-values) controlling the false
+    discovery rate. Missing p-values (nan) are not counted as tests and stay nan.
+
+    Arguments:
+        p_values -- The p-values.
+    """
+    p_values = np.asarray(p_values, dtype=float)
+    q_values = np.full(len(p_values), np.nan)
+    tested = np.flatnonzero(~np.isnan(p_values))
+    order = tested[np.argsort(p_values[tested], kind="mergesort")]
+    ranked = p_values[order] * len(order) / np.arange(1, len(order) + 1)
+    # The smallest adjusted p-value of all larger p-values.
+    q_values[order] = np.minimum(np.minimum.accumulate(ranked[::-1])[::-1], 1.0)
+    return q_values
+
+
+def association_scan(
+    mutations: Matrix,
+    genes: List[str],
+    responders: np.ndarray,
+    strata: Optional[np.ndarray] = None,
+    test: str = "fisher",
+    min_mutated: int = 1,
+) -> pd.DataFrame:
+    """Test the association of every gene with response at once: the contingency
+    tables of all genes come from one matrix multiply (see `contingency_tables`),
+    and the tests and the false discovery rate are computed on arrays of tables.
+
+    Arguments:
+        mutations -- The sample by gene matrix, see `binary_matrix`.
+        genes -- The gene names, one per column.
+        responders -- True for the responders, one per sample.
+
+    Keyword Arguments:
+        strata -- The stratum (e.g. study) of every sample. Adds the stratified
+            Cochran-Mantel-Haenszel test. (default: {None})
+        test -- The test in the whole cohort, one of ASSOCIATION_TESTS.
+            (default: {"fisher"})
+        min_mutated -- Genes mutated in fewer samples are not tested (and not
+            counted in the false discovery rate). (default: {1})
+
+    Returns:
+        A data frame with the counts, response rates, odds ratio, p-value and
+        Benjamini-Hochberg q-value (and the stratified ones) of every gene, sorted
+        by p-value. An odds ratio above 1 means the mutated samples respond more.
+    """
+    assert test in ASSOCIATION_TESTS, (
+        f"ERROR: Unknown association test '{test}'! "
+        f"Use one of {', '.join(ASSOCIATION_TESTS)}."
+    )
+    tables = contingency_tables(mutations, responders, strata)
+    a, b, c, d = (tables[cell].sum(axis=0) for cell in TABLE_CELLS)
+    tested = a + b >= min_mutated
+
+    p_values = np.full(len(genes), np.nan)
+    if test == "fisher":
+        p_values[tested] = fisher_exact(a[tested], b[tested], c[tested], d[tested])
+    else:
+        p_values[tested] = chi2_test(a[tested], b[tested], c[tested], d[tested])
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = pd.DataFrame(
+            {
+                "gene": genes,
+                "n_mutated": a + b,
+                "mutated_responders": a,
+                "mutated_non_responders": b,
+                "wildtype_responders": c,
+                "wildtype_non_responders": d,
+                "response_rate_mutated": a / (a + b),
+                "response_rate_wildtype": c / (c + d),
+                "odds_ratio": odds_ratio(a, b, c, d),
+                "p_value": p_values,
+                "q_value": benjamini_hochberg(p_values),
+            }
+        )
+
+    if strata is not None:
+        stratified = cochran_mantel_haenszel(
+            *(tables[cell][:, tested] for cell in TABLE_CELLS)
+        )
+        result["n_strata"] = len(tables["strata"])
+        for key in ["odds_ratio", "p_value"]:
+            result[f"cmh_{key}"] = np.nan
+            result.loc[tested, f"cmh_{key}"] = stratified[key]
+        result["cmh_q_value"] = benjamini_hochberg(result["cmh_p_value"])
+
+    return result.sort_values("p_value", kind="mergesort").reset_index(drop=True)
@@ -0,0 +1,241 @@
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from src.association import (ASSOCIATION_TESTS, Matrix, benjamini_hochberg,
+                             binary_matrix, chi2_test, fisher_exact, odds_ratio)
+
+# Masks of the SWAR popcount of 64 bit words (numpy < 2.0 has no
+# `np.bitwise_count`): the bits are summed in pairs, nibbles and bytes, and the
+# multiply adds up the bytes in the top byte.
+_M1 = np.uint64(0x5555555555555555)
+_M2 = np.uint64(0x3333333333333333)
+_M4 = np.uint64(0x0F0F0F0F0F0F0F0F)
+_H01 = np.uint64(0x0101010101010101)
+
+# The largest number of genes combined, the scan is of gene pairs or triples.
+MAX_ORDER = 3
+
+# Genes packed at once, so a sparse gene matrix is never densified as a whole.
+PACK_BLOCK_SIZE = 1024
+
+# Triples counted at once (small enough for the bitsets to stay in the CPU cache).
+TRIPLE_BLOCK_SIZE = 512
+
+
+def pack_columns(matrix: Matrix) -> np.ndarray:
+    """Pack the columns of a sample by gene matrix into bitsets: bit s of the words
+    of gene g is set if sample s is mutated in gene g (see `binary_matrix`).
+
+    Arguments:
+        matrix -- The sample by gene matrix (dense, data frame or scipy sparse), or
+            a 1D indicator vector (packed as a single column).
+
+    Returns:
+        The packed bits, shape [n_genes, n_words] (uint64, the last word padded with
+        zeros), or [n_words] for a vector.
+    """
+    if getattr(matrix, "ndim", 2) == 1:
+        return pack_columns(np.asarray(matrix).reshape(-1, 1))[0]
+    matrix = binary_matrix(matrix)
+    n_samples, n_genes = matrix.shape
+    n_words = max(1, -(-n_samples // 64))
+
+    packed = np.zeros((n_genes, n_words * 8), dtype=np.uint8)
+    for start in range(0, n_genes, PACK_BLOCK_SIZE):
+        block = matrix[:, start : start + PACK_BLOCK_SIZE]
+        block = block.toarray() if hasattr(block, "toarray") else block
+        bits = np.packbits(block.T > 0, axis=1, bitorder="little")
+        packed[start : start + len(bits), : bits.shape[1]] = bits
+    return packed.view(np.uint64)
+
+
+def popcount(words: np.ndarray) -> np.ndarray:
+    """Count the set bits of packed bitsets (summed over the last axis).
+
+    Arguments:
+        words -- The packed bits (uint64), shape [..., n_words].
+    """
+    if hasattr(np, "bitwise_count"):
+        return np.bitwise_count(words).sum(axis=-1, dtype=np.int64)
+    words = words - ((words >> np.uint64(1)) & _M1)
+    words = (words & _M2) + ((words >> np.uint64(2)) & _M2)
+    words = (words + (words >> np.uint64(4))) & _M4
+    return ((words * _H01) >> np.uint64(56)).sum(axis=-1, dtype=np.int64)
+
+
+def _scan_shard(
+    bits: np.ndarray,
+    responder_bits: np.ndarray,
+    frequent_pairs: np.ndarray,
+    first_genes: List[int],
+    max_order: int,
+    min_co_mutated: int,
+) -> Dict[str, np.ndarray]:
+    """Count the co-mutated samples and responders of the gene pairs (and triples)
+    starting with the given genes, see `co_mutation_scan`. `frequent_pairs` is
+    True for the gene pairs co-mutated in at least `min_co_mutated` samples.
+
+    Returns:
+        A dict with the `genes` (indices, shape [n_combinations, max_order], -1 for
+        the third gene of a pair), `n_co_mutated` and `co_mutated_responders`.
+    """
+    genes, n_co_mutated, co_mutated_responders = [], [], []
+
+    def add(combinations: np.ndarray, co_mutated: np.ndarray) -> None:
+        counts = popcount(co_mutated)
+        keep = counts >= min_co_mutated
+        padded = np.full((keep.sum(), max_order), -1)
+        padded[:, : combinations.shape[1]] = combinations[keep]
+        genes.append(padded)
+        n_co_mutated.append(counts[keep])
+        co_mutated_responders.append(popcount(co_mutated[keep] & responder_bits))
+
+    for i in first_genes:
+        partners = np.flatnonzero(frequent_pairs[i, i + 1 :]) + i + 1
+        pairs = bits[i] & bits[partners]
+        add(np.column_stack([np.full(len(partners), i), partners]), pairs)
+        if max_order < 3:
+            continue
+        # A triple has at most as many co-mutated samples as each of its pairs, so
+        # only the triples of frequent pairs are counted: all triples of the first
+        # gene at once, in blocks to bound the memory.
+        frequent = frequent_pairs[np.ix_(partners, partners)]
+        second, third = np.nonzero(np.triu(frequent, 1))
+        for start in range(0, len(second), TRIPLE_BLOCK_SIZE):
+            j = second[start : start + TRIPLE_BLOCK_SIZE]
+            k = third[start : start + TRIPLE_BLOCK_SIZE]
+            triples = np.column_stack([np.full(len(j), i), partners[j], partners[k]])
+            add(triples, pairs[j] & bits[partners[k]])
+
+    return {
+        "genes": np.concatenate(genes or [np.empty((0, max_order), dtype=int)]),
+        "n_co_mutated": np.concatenate(n_co_mutated or [np.empty(0, dtype=int)]),
+        "co_mutated_responders": np.concatenate(
+            co_mutated_responders or [np.empty(0, dtype=int)]
+        ),
+    }
+
+
+def co_mutation_scan(
+    mutations: Matrix,
+    genes: List[str],
+    responders: np.ndarray,
+    max_order: int = 2,
+    min_co_mutated: int = 5,
+    test: str = "fisher",
+    n_workers: int = 1,
+) -> pd.DataFrame:
+    """Test the association of every co-mutation (gene pair, and optionally triple)
+    with response.
+
+    The mutation status of every gene is packed into bitsets of the samples (64
+    samples per word), so the co-mutated samples of a combination are the AND of
+    its bitsets and their number (and the number of responders) a popcount. The
+    combinations are sharded over worker processes by their first gene.
+
+    Arguments:
+        mutations -- The sample by gene matrix, see `binary_matrix`.
+        genes -- The gene names, one per column.
+        responders -- True for the responders, one per sample.
+
+    Keyword Arguments:
+        max_order -- Scan gene pairs (2) or pairs and triples (3). (default: {2})
+        min_co_mutated -- Combinations co-mutated in fewer samples are not tested
+            (and triples are only searched among the pairs that are).
+            (default: {5})
+        test -- The test, one of ASSOCIATION_TESTS. (default: {"fisher"})
+        n_workers -- Number of worker processes. (default: {1})
+
+    Returns:
+        A data frame with the genes, the counts, response rates, odds ratio, p-value
+        and Benjamini-Hochberg q-value of every tested combination, sorted by
+        p-value. The co-occurrence ratio is the number of co-mutated samples over
+        the number expected if the genes were mutated independently.
+    """
+    assert 2 <= max_order <= MAX_ORDER, (
+        f"ERROR: max_order must be between 2 and {MAX_ORDER}, got {max_order}!"
+    )
+    assert test in ASSOCIATION_TESTS, (
+        f"ERROR: Unknown association test '{test}'! "
+        f"Use one of {', '.join(ASSOCIATION_TESTS)}."
+    )
+    responders = np.asarray(responders, dtype=bool)
+    binary = binary_matrix(mutations)
+    bits = pack_columns(binary)
+    responder_bits = pack_columns(responders)
+    assert len(bits) == len(genes), "ERROR: The gene names do not match the matrix!"
+
+    # The number of co-mutated samples of all gene pairs, from one matrix multiply,
+    # to leave out the combinations that cannot be frequent.
+    pair_counts = binary.T @ binary
+    if sparse.issparse(pair_counts):
+        pair_counts = pair_counts.toarray()
+    frequent_pairs = np.rint(pair_counts) >= min_co_mutated
+
+    # Interleaved, so every shard gets first genes with many and few partners.
+    n_shards = max(1, min(n_workers, len(genes)))
+    shards = [list(range(shard, len(genes), n_shards)) for shard in range(n_shards)]
+    arguments = (bits, responder_bits, frequent_pairs)
+    if n_shards == 1:
+        results = [_scan_shard(*arguments, shards[0], max_order, min_co_mutated)]
+    else:
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(n_shards, mp_context=context) as executor:
+            futures = [
+                executor.submit(
+                    _scan_shard, *arguments, shard, max_order, min_co_mutated
+                )
+                for shard in shards
+            ]
+            results = [future.result() for future in futures]
+    found = {key: np.concatenate([r[key] for r in results]) for key in results[0]}
+
+    n_samples, n_responders = len(responders), int(responders.sum())
+    a = found["co_mutated_responders"]
+    b = found["n_co_mutated"] - a
+    c = n_responders - a
+    d = n_samples - n_responders - b
+    test_function = fisher_exact if test == "fisher" else chi2_test
+    p_values = test_function(a, b, c, d) if len(a) else np.empty(0)
+
+    # Expected co-mutated samples if the genes were mutated independently.
+    mutation_rates = popcount(bits) / n_samples
+    indices = found["genes"]
+    rates = np.where(indices >= 0, mutation_rates[indices], 1.0)
+    expected = n_samples * rates.prod(axis=1)
+
+    # The labels joined a gene column at a time, not a combination at a time.
+    names = np.asarray(genes, dtype=object)
+    labels = names[indices[:, 0]]
+    for k in range(1, max_order):
+        has_gene = indices[:, k] >= 0
+        labels[has_gene] = labels[has_gene] + "+" + names[indices[has_gene, k]]
+
+    names = np.append(names, "")
+    with np.errstate(divide="ignore", invalid="ignore"):
+        result = pd.DataFrame(
+            {
+                "genes": labels,
+                "order": (indices >= 0).sum(axis=1),
+                **{
+                    f"gene_{k + 1}": names[indices[:, k]] for k in range(max_order)
+                },
+                "n_co_mutated": a + b,
+                "co_occurrence_ratio": (a + b) / expected,
+                "co_mutated_responders": a,
+                "co_mutated_non_responders": b,
+                "other_responders": c,
+                "other_non_responders": d,
+                "response_rate_co_mutated": a / (a + b),
+                "response_rate_other": c / (c + d),
+                "odds_ratio": odds_ratio(a, b, c, d),
+                "p_value": p_values,
+                "q_value": benjamini_hochberg(p_values),
+            }
+        )
+    return result.sort_values("p_value", kind="mergesort").reset_index(drop=True)
@@ -0,0 +1,197 @@
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from src.metrics import classification_metrics
+from src.models import BaseModel
+
+# Name of the file (in the cross-validation folder) storing the fold of each row.
+FOLD_PLAN_FILE_NAME = "fold_plan.csv"
+
+
+def make_fold_plan(
+    y: pd.Series,
+    n_splits: int = 5,
+    random_seed: int = 42,
+    stratify: bool = False,
+    groups: Optional[pd.Series] = None,
+) -> np.ndarray:
+    """Build a fold plan: the test fold of every row. The plan is built once and
+    reused for all folds (and can be saved), so every run with the same seed and
+    data evaluates on the same folds.
+
+    Arguments:
+        y -- The ground truth, used for stratification.
+
+    Keyword Arguments:
+        n_splits -- The number of folds. (default: {5})
+        random_seed -- Seed for shuffling the rows before splitting. (default: {42})
+        stratify -- Keep the class balance of `y` in every fold. (default: {False})
+        groups -- Group of every row (e.g. the Study_ID column). If given, the rows
+            of a group are never split over several folds. (default: {None})
+
+    Returns:
+        An integer array with the fold number of every row.
+    """
+    from sklearn.model_selection import (GroupKFold, KFold, StratifiedGroupKFold,
+                                         StratifiedKFold)
+
+    if groups is not None and stratify:
+        splitter = StratifiedGroupKFold(n_splits, shuffle=True, random_state=random_seed)
+    elif groups is not None:
+        # NOTE! GroupKFold does not shuffle, it balances the fold sizes instead.
+        splitter = GroupKFold(n_splits)
+    elif stratify:
+        splitter = StratifiedKFold(n_splits, shuffle=True, random_state=random_seed)
+    else:
+        splitter = KFold(n_splits, shuffle=True, random_state=random_seed)
+
+    fold_plan = np.full(len(y), -1, dtype=int)
+    for fold, (_, test_rows) in enumerate(splitter.split(np.zeros(len(y)), y, groups)):
+        fold_plan[test_rows] = fold
+    return fold_plan
+
+
+def iterate_folds(fold_plan: np.ndarray) -> Iterator[Tuple[int, np.ndarray, np.ndarray]]:
+    """Iterate over the folds of a fold plan.
+
+    Arguments:
+        fold_plan -- The fold number of every row, see `make_fold_plan`.
+
+    Returns:
+        Tuples of (fold number, training rows, test rows).
+    """
+    for fold in np.unique(fold_plan):
+        yield fold, np.flatnonzero(fold_plan != fold), np.flatnonzero(fold_plan == fold)
+
+
+def thread_budget(n_jobs: int, n_folds: int, threaded_model: bool) -> Tuple[int, int]:
+    """Split a thread budget between parallel folds and the threads of each model,
+    so that (folds in parallel) x (threads per model) <= n_jobs.
+
+    Arguments:
+        n_jobs -- The total number of threads to use.
+        n_folds -- The number of folds.
+        threaded_model -- If the number of threads of the model can be set.
+
+    Returns:
+        A tuple with the number of folds run in parallel and the number of
+        threads per model.
+    """
+    if not threaded_model:
+        # The model threads can not be bounded, so run one fold at a time.
+        return 1, n_jobs
+    n_parallel = max(1, min(n_jobs, n_folds))
+    return n_parallel, max(1, n_jobs // n_parallel)
+
+
+def _take_rows(data: Any, rows: np.ndarray) -> Any:
+    """Select rows by position from a data frame, series or sparse matrix."""
+    if sparse.issparse(data):
+        return data[rows]
+    return data.iloc[rows]
+
+
+def cross_validate(
+    make_model: Callable[[int], BaseModel],
+    x: Any,
+    y: pd.Series,
+    fold_plan: np.ndarray,
+    n_jobs: int = 1,
+    threaded_model: bool = True,
+    feature_names: Optional[List[str]] = None,
+) -> pd.DataFrame:
+    """Train and evaluate one model per fold, running folds in parallel threads.
+
+    Arguments:
+        make_model -- Creates a new (untrained) model, given its number of threads.
+        x -- The predictors (a data frame or a scipy sparse matrix).
+        y -- The ground truth.
+        fold_plan -- The fold number of every row, see `make_fold_plan`.
+
+    Keyword Arguments:
+        n_jobs -- The total thread budget, shared by the parallel folds and the
+            threads of each model. (default: {1})
+        threaded_model -- If the number of threads of the model can be set,
+            otherwise the folds are run one at a time. (default: {True})
+        feature_names -- The column names when training on a sparse matrix.
+            (default: {None})
+
+    Returns:
+        A data frame with one row per fold holding the fold sizes, the metrics
+        and the training and inference times (in seconds).
+    """
+    folds = list(iterate_folds(fold_plan))
+    n_parallel, n_threads = thread_budget(n_jobs, len(folds), threaded_model)
+    print(
+        f"Cross-validating {len(folds)} folds, {n_parallel} in parallel with "
+        f"{n_threads} thread(s) per model."
+    )
+    train_kwargs = {} if feature_names is None else {"feature_names": feature_names}
+
+    def run_fold(fold: Tuple[int, np.ndarray, np.ndarray]) -> Dict[str, Any]:
+        fold_number, train_rows, test_rows = fold
+        model = make_model(n_threads)
+
+        start = time.perf_counter()
+        model.train(_take_rows(x, train_rows), _take_rows(y, train_rows), **train_kwargs)
+        train_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        y_pred = np.ravel(model.inference(_take_rows(x, test_rows)))
+        inference_seconds = time.perf_counter() - start
+
+        return {
+            "fold": fold_number,
+            "n_train": len(train_rows),
+            "n_test": len(test_rows),
+            **classification_metrics(_take_rows(y, test_rows), y_pred),
+            "train_seconds": train_seconds,
+            "inference_seconds": inference_seconds,
+        }
+
+    with ThreadPoolExecutor(max_workers=n_parallel) as executor:
+        results = list(executor.map(run_fold, folds))
+    return pd.DataFrame(results)
+
+
+def save_cross_validation(
+    results: pd.DataFrame,
+    fold_plan: np.ndarray,
+    output_dir: Path,
+    wall_seconds: float,
+) -> None:
+    """Save the per fold results, a summary and the fold plan.
+
+    Arguments:
+        results -- The per fold results, see `cross_validate`.
+        fold_plan -- The fold number of every row.
+        output_dir -- The folder to save the results in.
+        wall_seconds -- The total (wall clock) time of the cross-validation.
+    """
+    output_dir = Path(output_dir)
+    output_dir.mkdir(exist_ok=True, parents=True)
+
+    results.to_csv(output_dir / "folds.csv", index=False)
+    pd.DataFrame({"row": np.arange(len(fold_plan)), "fold": fold_plan}).to_csv(
+        output_dir / FOLD_PLAN_FILE_NAME, index=False
+    )
+
+    metric_columns = results.columns.drop(["fold", "n_train", "n_test"])
+    summary = {
+        "n_folds": len(results),
+        "mean": results[metric_columns].mean().to_dict(),
+        "std": results[metric_columns].std().to_dict(),
+        "wall_seconds": wall_seconds,
+    }
+    with open(output_dir / "summary.json", "w") as f:
+        json.dump(summary, f, indent=2)
+
+    print(f"\nCross-validation results:\n{results.to_string(index=False)}")
+    print(f"Saved the cross-validation results to {output_dir}")
@@ -0,0 +1,151 @@
+from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional
+
+import pandas as pd
+
+# The supported data file formats and their file suffixes. Parquet and feather
+# (Arrow IPC) files are columnar and typed: reading a subset of the columns only
+# reads those columns, and no text is parsed.
+DATA_FORMATS = {"csv": ".csv", "parquet": ".parquet", "feather": ".feather"}
+
+# NOTE! pyarrow (parquet and feather) is imported inside the functions, so reading
+# and writing csv files does not need it.
+
+
+def data_format_of(data_path: Path) -> str:
+    """Returns the format of a data file, derived from its suffix."""
+    suffix = Path(data_path).suffix
+    for data_format, format_suffix in DATA_FORMATS.items():
+        if suffix == format_suffix:
+            return data_format
+    assert False, (
+        f"ERROR: Unknown data file format '{suffix}' of {data_path}! "
+        f"Use one of {', '.join(DATA_FORMATS.values())}."
+    )
+
+
+def _cast(df: pd.DataFrame, dtypes: Optional[Dict[str, Any]]) -> pd.DataFrame:
+    """Cast the columns of a data frame that have a type in `dtypes`."""
+    if not dtypes:
+        return df
+    return df.astype({c: t for c, t in dtypes.items() if c in df.columns})
+
+
+def densify(df: pd.DataFrame) -> pd.DataFrame:
+    """Returns the data frame with its pandas sparse columns (e.g. the genes of a
+    sparse mutation matrix) as dense columns, to write it."""
+    sparse_columns = [c for c, t in df.dtypes.items() if isinstance(t, pd.SparseDtype)]
+    if not sparse_columns:
+        return df
+    return df.assign(
+        **{column: df[column].sparse.to_dense() for column in sparse_columns}
+    )
+
+
+def write_data(
+    df: pd.DataFrame, data_path: Path, dtypes: Optional[Dict[str, Any]] = None
+) -> None:
+    """Write a data frame (without its index) in the format given by the suffix of
+    the path.
+
+    Arguments:
+        df -- The data frame to write.
+        data_path -- The path to the data file.
+
+    Keyword Arguments:
+        dtypes -- Column types (see `src.schema`) the columns are stored with in
+            the typed formats (parquet and feather). (default: {None})
+    """
+    data_format = data_format_of(data_path)
+    df = densify(df)
+    if data_format == "csv":
+        df.to_csv(data_path, index=False)
+    elif data_format == "parquet":
+        _cast(df, dtypes).to_parquet(data_path, index=False)
+    else:
+        # Uncompressed, so the file can be memory-mapped when it is read.
+        _cast(df, dtypes).reset_index(drop=True).to_feather(
+            data_path, compression="uncompressed"
+        )
+
+
+def data_columns(data_path: Path) -> List[str]:
+    """Returns the column names of a data file, without reading the data."""
+    data_format = data_format_of(data_path)
+    if data_format == "csv":
+        return pd.read_csv(data_path, nrows=0).columns.tolist()
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    if data_format == "parquet":
+        return pq.read_schema(data_path).names
+    with pa.memory_map(str(data_path)) as source:
+        return pa.ipc.open_file(source).schema.names
+
+
+def read_data(
+    data_path: Path,
+    columns: Optional[List[str]] = None,
+    dtypes: Optional[Dict[str, Any]] = None,
+) -> pd.DataFrame:
+    """Read a data file in any of the supported formats.
+
+    Arguments:
+        data_path -- The path to the data file.
+
+    Keyword Arguments:
+        columns -- Only read these columns (columns missing from the file are
+            ignored). All columns if not given. (default: {None})
+        dtypes -- Column types to read the columns with. (default: {None})
+
+    Returns:
+        The data, the columns in file order.
+    """
+    if columns is not None:
+        requested = set(columns)
+        columns = [column for column in data_columns(data_path) if column in requested]
+
+    data_format = data_format_of(data_path)
+    if data_format == "csv":
+        return pd.read_csv(data_path, usecols=columns, dtype=dtypes)
+    if data_format == "parquet":
+        return _cast(pd.read_parquet(data_path, columns=columns), dtypes)
+
+    import pyarrow.feather as feather
+
+    # Memory-map the file, only the pages of the read columns are loaded.
+    table = feather.read_table(data_path, columns=columns, memory_map=True)
+    return _cast(table.to_pandas(), dtypes)
+
+
+def iter_data(
+    data_path: Path, chunk_size: int, dtypes: Optional[Dict[str, Any]] = None
+) -> Iterator[pd.DataFrame]:
+    """Read a data file in chunks of rows.
+
+    Arguments:
+        data_path -- The path to the data file.
+        chunk_size -- Number of rows per chunk.
+
+    Keyword Arguments:
+        dtypes -- Column types to read the columns with. (default: {None})
+
+    Returns:
+        The data frames of the chunks.
+    """
+    data_format = data_format_of(data_path)
+    if data_format == "csv":
+        yield from pd.read_csv(data_path, chunksize=chunk_size, dtype=dtypes)
+        return
+
+    if data_format == "parquet":
+        import pyarrow.parquet as pq
+
+        batches = pq.ParquetFile(data_path).iter_batches(batch_size=chunk_size)
+    else:
+        import pyarrow.feather as feather
+
+        table = feather.read_table(data_path, memory_map=True)
+        batches = table.to_batches(max_chunksize=chunk_size)
+    for batch in batches:
+        yield _cast(batch.to_pandas(), dtypes)
@@ -1,6 +1,13 @@
 from pathlib import Path
+from typing import Any, Dict, Iterator, List, Optional, Tuple
 
 import pandas as pd
+from scipy import sparse
+
+from src.data_format import iter_data, read_data
+from src.encoding import OneHotEncoder, encoder_path_for
+from src.mutation_matrix import MutationMatrix, mutations_path_for
+from src.schema import DatasetSchema, schema_path_for
 
 
 class DataLoader:
@@ -8,43 +15,249 @@ class DataLoader:
 
     Public methods:
     load_data -- Loads the data from the path given at initalization.
+    from_frame -- Create a data loader holding already loaded data.
+    iter_chunks -- Read the data in chunks of rows, as one data loader per chunk.
     get_data -- Return predictor columns as a Pandas dataframe.
     get_ground_truth -- Return the ground truth column as a Pandas dataframe.
     get_complete_data -- Return the entire data set as a Pandas dataframe.
+    get_sparse_data -- Return predictor columns and mutations as a sparse matrix.
+    has_mutations -- If a sparse mutation matrix was loaded with the data.
+    categories -- Returns the categories of the categorical columns.
 
     Instance variables:
     data_path -- Path to the data on disk.
     gt_column -- Name of the ground truth column.
     data -- The loaded data.
+    mutations -- The sparse mutation matrix stored next to the data, if any.
+    schema -- The column types the data is read with, if any.
+    encoder -- The one hot encoder applied to data that is not encoded, if any.
+    mutation_genes -- The gene columns moved into a sparse mutation matrix when
+        the data has no mutation matrix file, if any.
     """
 
-    def __init__(self, data_path: Path, gt_column: str) -> None:
+    def __init__(
+        self,
+        data_path: Path,
+        gt_column: str,
+        schema_path: Optional[Path] = None,
+        encoder_path: Optional[Path] = None,
+        mutation_genes: Optional[List[str]] = None,
+    ) -> None:
         """Create data loader.
 
         Keyword arguments:
         data_path -- Path to the data on disk.
         gt_column -- Name of the ground truth column.
+        schema_path -- Path to the schema of the data (see `src.schema`), e.g. the
+            schema of the training data when predicting on other data. Defaults to
+            the schema saved next to the data, if any.
+        encoder_path -- Path to the one hot encoder (see `src.encoding`) of the
+            data, e.g. the encoder saved with a model. Data that has the categorical
+            columns of the encoder is encoded when it is loaded. Defaults to the
+            encoder saved next to the data, if any.
+        mutation_genes -- The genes of the sparse mutation matrix of the training
+            data. Data without a mutation matrix file gets one from these gene
+            columns when it is loaded (e.g. new data a model trained on sparse
+            mutations predicts on), see `src.models.BaseModel.SUPPORTS_SPARSE`.
         """
         self.data_path = data_path
         self.gt_column = gt_column
+        self.mutation_genes = mutation_genes
+
+        # Use the given schema, or else the schema saved next to the data (if any).
+        self.schema: Optional[DatasetSchema] = None
+        if not (schema_path and Path(schema_path).is_file()) and data_path:
+            schema_path = schema_path_for(data_path)
+        if schema_path and Path(schema_path).is_file():
+            self.schema = DatasetSchema.load(schema_path)
+
+        # Use the given encoder, or else the encoder saved next to the data (if any).
+        self.encoder: Optional[OneHotEncoder] = None
+        if not (encoder_path and Path(encoder_path).is_file()) and data_path:
+            encoder_path = encoder_path_for(data_path)
+        if encoder_path and Path(encoder_path).is_file():
+            self.encoder = OneHotEncoder.load(encoder_path)
+
+    @classmethod
+    def from_frame(
+        cls,
+        data: pd.DataFrame,
+        gt_column: str,
+        mutations: Optional[MutationMatrix] = None,
+        data_path: Optional[Path] = None,
+    ) -> "DataLoader":
+        """Create a data loader holding already loaded data (e.g. memory-mapped
+        data shared between processes), without reading it from disk.
+
+        Arguments:
+            data -- The data, including the ground truth column.
+            gt_column -- Name of the ground truth column.
+
+        Keyword Arguments:
+            mutations -- A sparse mutation matrix for the rows of the data.
+                (default: {None})
+            data_path -- Path to the data on disk, if any. (default: {None})
+        """
+        dataloader = cls(data_path, gt_column)
+        dataloader.data = data
+        dataloader.mutations = mutations
+        return dataloader
 
-    def load_data(self) -> None:
-        """Load data from the given data path provided at initalization."""
+    def load_data(self, columns: Optional[List[str]] = None) -> None:
+        """Load data from the given data path provided at initalization. The format
+        (csv, parquet or feather) is detected from the file suffix.
+
+        Keyword Arguments:
+            columns -- Only load these columns (and the ground truth column), e.g.
+                the columns used by an analysis. Parquet and feather files only read
+                the requested columns from disk. All columns if not given.
+                (default: {None})
+        """
         print("Loading data..")
+        if columns is not None:
+            columns = [self.gt_column] + list(columns)
+            if self.encoder:
+                columns += self.encoder.source_columns()
 
         # Internal function to convert the column types of categorical data to the
-        # pandas type "category". Currently, any columns with the type "object" will
-        # be transformed.
+        # pandas type "category". Without a schema, any columns with the type
+        # "object" will be transformed.
         def convert_types(df: pd.DataFrame) -> pd.DataFrame:
             object_columns = df.columns[df.dtypes == "object"].tolist()
             df[object_columns] = df[object_columns].astype("category")
             return df
 
-        self.data = convert_types(pd.read_csv(self.data_path))
+        self.data = convert_types(
+            self._encode(read_data(self.data_path, columns, self._dtypes()))
+        )
+        print(
+            f"Loaded {len(self.data)} rows "
+            f"({self.data.memory_usage(deep=True).sum() / 1e6:.2f} MB in memory)."
+        )
+
+        # Load the gene columns stored as a sparse mutation matrix (if any).
+        self.mutations: Optional[MutationMatrix] = None
+        mutations_path = mutations_path_for(self.data_path)
+        if mutations_path.is_file():
+            print(f"Loading sparse mutations from {mutations_path}")
+            self.mutations = MutationMatrix.load(mutations_path)
+            assert self.mutations.shape[0] == len(
+                self.data
+            ), f"ERROR: {mutations_path} does not match the rows of {self.data_path}"
+        elif self.mutation_genes:
+            self.data, self.mutations = self._split_mutations(self.data)
+
+    def _split_mutations(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, MutationMatrix]:
+        """Move the gene columns of `mutation_genes` into a sparse mutation matrix.
+        The other columns are ordered like the schema, i.e. like the columns the
+        sparse matrix of the training data was stacked from."""
+        missing = [gene for gene in self.mutation_genes if gene not in df.columns]
+        assert not missing, (
+            f"ERROR: Gene column(s) {', '.join(missing)} of the sparse mutations of "
+            f"the training data not in {self.data_path}!"
+        )
+        mutations = MutationMatrix.from_dataframe(df, self.mutation_genes)
+        df = df.drop(columns=self.mutation_genes)
+        if self.schema:
+            order = [c["name"] for c in self.schema.columns if c["name"] in df.columns]
+            known = set(order)
+            df = df[order + [c for c in df.columns if c not in known]]
+        return df, mutations
+
+    def _encode(self, df: pd.DataFrame) -> pd.DataFrame:
+        """One hot encode data that is not encoded, with the dummy columns typed
+        like the schema."""
+        if not (self.encoder and self.encoder.applies_to(df)):
+            return df
+        df = self.encoder.transform(df)
+        dtypes = self._dtypes() or {}
+        dummy_columns = self.encoder.dummy_columns()
+        return df.astype({c: dtypes[c] for c in dummy_columns if c in dtypes})
+
+    def _dtypes(self) -> Optional[Dict[str, Any]]:
+        """Returns the column types of the schema, to read the data with. The ground
+        truth column is read with its own type, as new data may have no (or
+        missing) labels."""
+        if not self.schema:
+            return None
+        dtypes = self.schema.dtypes()
+        dtypes.pop(self.gt_column, None)
+        return dtypes
+
+    def categories(self, chunk_size: int = 100000) -> Dict[str, List[str]]:
+        """Returns the categories of the categorical columns: the levels of the
+        schema, or else read the data in chunks of rows and collect the categories of
+        the text ("object" or "category") columns, sorted like `load_data` sorts them.
+
+        Keyword Arguments:
+            chunk_size -- Number of rows to read at a time (without a schema).
+                (default: {100000})
+        """
+        if self.schema:
+            return self.schema.categories()
+        categories: Dict[str, set] = {}
+        for chunk in iter_data(self.data_path, chunk_size):
+            text_columns = [c for c, t in chunk.dtypes.items() if t in ["object", "category"]]
+            for column in text_columns:
+                categories.setdefault(column, set()).update(chunk[column].dropna())
+        return {column: sorted(values) for column, values in categories.items()}
+
+    def iter_chunks(self, chunk_size: int) -> Iterator["DataLoader"]:
+        """Read the data in chunks of rows, keeping at most one chunk in memory.
+
+        The categorical columns are scanned in a first pass, so every chunk has the
+        categories (and category codes) `load_data` gives the complete data set.
+
+        Arguments:
+            chunk_size -- Number of rows per chunk.
+
+        Returns:
+            One data loader per chunk, holding the rows (and sparse mutations) of
+            the chunk.
+        """
+        categories = self.categories(chunk_size)
+
+        mutations = None
+        mutations_path = mutations_path_for(self.data_path)
+        if mutations_path.is_file():
+            mutations = MutationMatrix.load(mutations_path)
+
+        start = 0
+        dtypes = self._dtypes() or {column: str for column in categories}
+        for chunk in iter_data(self.data_path, chunk_size, dtypes):
+            end = start + len(chunk)
+            chunk = self._encode(chunk)
+            for column, column_categories in categories.items():
+                if column in chunk.columns:
+                    chunk[column] = pd.Categorical(
+                        chunk[column], categories=column_categories
+                    )
+            chunk_mutations = None
+            if mutations is not None:
+                chunk_mutations = mutations.take_samples(range(start, end))
+            elif self.mutation_genes:
+                chunk, chunk_mutations = self._split_mutations(chunk)
+            yield DataLoader.from_frame(chunk, self.gt_column, chunk_mutations, self.data_path)
+            start = end
+
+    def has_mutations(self) -> bool:
+        """Returns true if a sparse mutation matrix was loaded with the data."""
+        return self.mutations is not None
 
     def get_data(self) -> pd.DataFrame:
-        """Return predictor columns as a Pandas dataframe."""
-        return self.data.drop(columns=[self.gt_column])
+        """Return predictor columns as a Pandas dataframe. Any sparse mutations are
+        appended as pandas sparse columns (they are not densified)."""
+        data = self.data.drop(columns=[self.gt_column])
+        if self.has_mutations():
+            data = pd.concat([data, self.mutations.to_dataframe(index=data.index)], axis=1)
+        return data
+
+    def get_sparse_data(self) -> Tuple[sparse.csr_matrix, List[str]]:
+        """Return the predictor columns and the sparse mutations as a single sparse
+        (CSR) matrix, together with the names of its columns. Categorical columns
+        are represented by their category codes."""
+        assert self.has_mutations(), "ERROR: No sparse mutations loaded."
+        return self.mutations.hstack(self.data.drop(columns=[self.gt_column]))
 
     def get_ground_truth(self) -> pd.DataFrame:
         """Return the ground truth column as a Pandas dataframe."""
@@ -53,4 +266,8 @@ class DataLoader:
     def get_complete_data(self) -> pd.DataFrame:
         """Return the entire data set (both predictor and ground truth)
         as a Pandas dataframe."""
+        if self.has_mutations():
+            return pd.concat(
+                [self.data, self.mutations.to_dataframe(index=self.data.index)], axis=1
+            )
         return self.data
@@ -0,0 +1,148 @@
+import hashlib
+import json
+import os
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+# The 2D embedding methods: TSNE (Barnes-Hut), or the much faster linear PCA and
+# Gaussian random projection (e.g. for a first look at large cohorts).
+EMBEDDING_METHODS = ["tsne", "pca", "random_projection"]
+
+# Name of the embedding cache folder, in the analysis folder of an experiment.
+EMBEDDING_CACHE_FOLDER_NAME = "embeddings"
+
+# Default TSNE arguments: the Barnes-Hut approximation (O(n log n)), initialised
+# with PCA and with a learning rate scaled to the number of samples.
+TSNE_DEFAULTS = {
+    "method": "barnes_hut",
+    "angle": 0.5,
+    "init": "pca",
+    "learning_rate": "auto",
+}
+
+
+def embedding_key(
+    x: np.ndarray,
+    method: str,
+    params: Dict[str, Any],
+    feature_names: Optional[List[str]] = None,
+) -> str:
+    """Returns the cache key of an embedding: a hash of the data, the feature names,
+    the method and its parameters.
+
+    Arguments:
+        x -- The data to embed, shape [n_samples, n_features].
+        method -- The embedding method.
+        params -- The parameters of the method.
+
+    Keyword Arguments:
+        feature_names -- The names of the features (columns). (default: {None})
+    """
+    import sklearn
+
+    sha = hashlib.sha1(np.ascontiguousarray(x, dtype=np.float64).tobytes())
+    sha.update(str(x.shape).encode())
+    description = {
+        "method": method,
+        "params": params,
+        "feature_names": feature_names,
+        # Another sklearn version may give another embedding.
+        "sklearn": sklearn.__version__,
+    }
+    sha.update(json.dumps(description, sort_keys=True, default=str).encode())
+    return sha.hexdigest()
+
+
+def _embed(
+    x: np.ndarray,
+    method: str,
+    pca_components: Optional[int],
+    random_seed: int,
+    method_kwargs: Dict[str, Any],
+) -> np.ndarray:
+    """Compute a 2D embedding, see `embed_2d`."""
+    from sklearn.decomposition import PCA
+
+    if pca_components and x.shape[1] > pca_components:
+        x = PCA(min(pca_components, len(x)), random_state=random_seed).fit_transform(x)
+
+    if method == "pca":
+        return PCA(2, random_state=random_seed, **method_kwargs).fit_transform(x)
+    if method == "random_projection":
+        from sklearn.random_projection import GaussianRandomProjection
+
+        projection = GaussianRandomProjection(
+            2, random_state=random_seed, **method_kwargs
+        )
+        return projection.fit_transform(x)
+
+    from sklearn.manifold import TSNE
+
+    # The perplexity must be smaller than the number of samples.
+    tsne_kwargs = {**TSNE_DEFAULTS, "perplexity": min(30.0, (len(x) - 1) / 3)}
+    tsne_kwargs.update(method_kwargs)
+    return TSNE(n_components=2, random_state=random_seed, **tsne_kwargs).fit_transform(x)
+
+
+def embed_2d(
+    x: np.ndarray,
+    method: str = "tsne",
+    pca_components: Optional[int] = None,
+    random_seed: int = 0,
+    method_kwargs: Dict[str, Any] = {},
+    feature_names: Optional[List[str]] = None,
+    cache_dir: Optional[Path] = None,
+) -> np.ndarray:
+    """Embed data in 2D, e.g. to scatter it. With a cache folder, the embedding is
+    saved there and reused for the same data, features, method and parameters.
+
+    NOTE: scikit-learn recommends using PCA to reduce the number of dimensions to
+        less than 50 if it is higher than that before transforming with TSNE.
+
+    Arguments:
+        x -- The data, shape [n_samples, n_features].
+
+    Keyword Arguments:
+        method -- One of EMBEDDING_METHODS. (default: {"tsne"})
+        pca_components -- Reduce the data to this many dimensions with PCA first (if
+            it has more). (default: {None})
+        random_seed -- The seed of the method. (default: {0})
+        method_kwargs -- Any additional arguments for the method, e.g. `perplexity`
+            or `angle` of TSNE. (default: {{}})
+        feature_names -- The names of the features, part of the cache key.
+            (default: {None})
+        cache_dir -- The cache folder. No caching if not given. (default: {None})
+
+    Returns:
+        The embedding, shape [n_samples, 2].
+    """
+    assert method in EMBEDDING_METHODS, (
+        f"ERROR: Unknown embedding method '{method}'! "
+        f"Use one of {', '.join(EMBEDDING_METHODS)}."
+    )
+    x = np.asarray(x, dtype=float)
+    if cache_dir is None:
+        return _embed(x, method, pca_components, random_seed, method_kwargs)
+
+    params = {
+        "pca_components": pca_components,
+        "random_seed": random_seed,
+        "method_kwargs": method_kwargs,
+    }
+    cache_path = Path(cache_dir) / (
+        f"{method}_{embedding_key(x, method, params, feature_names)}.npy"
+    )
+    if cache_path.is_file():
+        print(f"Using the cached {method} embedding {cache_path}")
+        return np.load(cache_path)
+
+    embedding = _embed(x, method, pca_components, random_seed, method_kwargs)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    # Write to a temporary file first, so a worker never reads a partial file.
+    temp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+    with open(temp_path, "wb") as f:
+        np.save(f, embedding)
+    os.replace(temp_path, cache_path)
+    return embedding
@@ -0,0 +1,220 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+# Name of the encoder file, saved in the data folder next to the data files it
+# encoded, and in the experiment folder of every model trained on the data.
+ENCODER_FILE_NAME = "encoder.json"
+
+PREFIX_SEPARATOR = "_"
+
+
+def encoder_path_for(data_path: Path) -> Path:
+    """Returns the path of the encoder file belonging to a data file."""
+    return Path(data_path).with_name(ENCODER_FILE_NAME)
+
+
+def model_encoder_path(experiment_folder: Path, training_data_path: Path) -> Path:
+    """Returns the path of the encoder of a trained model: the encoder saved in its
+    experiment folder, or else (older experiments) the one next to its training
+    data."""
+    path = Path(experiment_folder) / ENCODER_FILE_NAME
+    return path if path.is_file() else encoder_path_for(training_data_path)
+
+
+class OneHotEncoder:
+    """A fitted one hot (dummy) encoding of categorical columns: the levels of every
+    column and the column order of the encoded data. New data is encoded with the
+    levels found when fitting, so it gets the dummy columns (and column order) the
+    model was trained with, whatever levels the new rows have. Unknown levels and
+    missing values are encoded as all zeros, or with `drop_first` (where all zeros
+    is the first level) as missing (nan) dummies.
+
+    The dummy columns are the ones `pd.get_dummies` creates for the fitted data.
+
+    Public methods:
+    fit -- Fit the encoding of categorical columns to data.
+    combine -- Combine encoders applied one after the other into one encoder.
+    load -- Load an encoder saved with `save`.
+    save -- Save the encoder to a json file.
+    source_columns -- The categorical columns the encoder replaces.
+    dummy_columns -- The dummy columns the encoder creates.
+    applies_to -- If data has any of the categorical columns to encode.
+    transform -- Encode data.
+
+    Instance variables:
+    encodings -- The column, dummy column prefix, levels and `drop_first` of every
+        encoded column, in encoding order.
+    columns -- The columns of the encoded data, in order (None if not known).
+    """
+
+    def __init__(
+        self, encodings: List[Dict[str, Any]], columns: Optional[List[str]] = None
+    ) -> None:
+        """Create an encoder.
+
+        Arguments:
+            encodings -- Dicts with the `column`, `prefix`, `categories` and
+                `drop_first` of every encoded column.
+
+        Keyword Arguments:
+            columns -- The columns of the encoded data, in order. (default: {None})
+        """
+        self.encodings = encodings
+        self.columns = columns
+
+    @classmethod
+    def fit(
+        cls,
+        data: pd.DataFrame,
+        columns: List[str],
+        prefix: Optional[List[str]] = None,
+        drop_first: bool = False,
+    ) -> "OneHotEncoder":
+        """Fit the encoding of categorical columns to data: the levels are the
+        (sorted) values of every column, or the categories of a categorical column.
+
+        Arguments:
+            data -- The data.
+            columns -- The categorical columns to encode.
+
+        Keyword Arguments:
+            prefix -- The prefix of the dummy columns of every column. The column
+                names if not given. (default: {None})
+            drop_first -- Leave out the dummy column of the first level.
+                (default: {False})
+        """
+        encodings = []
+        for column, column_prefix in zip(columns, prefix or columns):
+            values = data[column]
+            if isinstance(values.dtype, pd.CategoricalDtype):
+                categories = values.cat.categories.tolist()
+            else:
+                categories = sorted(values.dropna().unique().tolist())
+            encodings.append(
+                {
+                    "column": column,
+                    "prefix": column_prefix,
+                    "categories": categories,
+                    "drop_first": drop_first,
+                }
+            )
+        return cls(encodings)
+
+    @classmethod
+    def combine(cls, encoders: List["OneHotEncoder"]) -> "OneHotEncoder":
+        """Combine encoders that are applied one after the other into one encoder.
+
+        Arguments:
+            encoders -- The encoders, in the order they are applied.
+        """
+        return cls([encoding for encoder in encoders for encoding in encoder.encodings])
+
+    @classmethod
+    def load(cls, path: Path) -> "OneHotEncoder":
+        """Load an encoder saved with `save`.
+
+        Arguments:
+            path -- The path to the json file.
+        """
+        with open(path) as f:
+            encoder = json.load(f)
+        return cls(encoder["encodings"], encoder.get("columns"))
+
+    def save(self, path: Path) -> None:
+        """Save the encoder to a json file.
+
+        Arguments:
+            path -- The path to the json file.
+        """
+        with open(path, "w") as f:
+            json.dump({"encodings": self.encodings, "columns": self.columns}, f, indent=2)
+
+    def source_columns(self) -> List[str]:
+        """Returns the categorical columns the encoder replaces."""
+        return [encoding["column"] for encoding in self.encodings]
+
+    @staticmethod
+    def _dummy_columns(encoding: Dict[str, Any]) -> List[str]:
+        """Returns the dummy columns of one encoded column."""
+        categories = encoding["categories"][1 if encoding["drop_first"] else 0 :]
+        prefix = encoding["prefix"]
+        return [f"{prefix}{PREFIX_SEPARATOR}{level}" for level in categories]
+
+    def dummy_columns(self) -> List[str]:
+        """Returns the dummy columns the encoder creates, in order."""
+        return [
+            column
+            for encoding in self.encodings
+            for column in self._dummy_columns(encoding)
+        ]
+
+    def applies_to(self, data: pd.DataFrame) -> bool:
+        """Returns True if the data has any of the categorical columns to encode
+        (i.e. it is not encoded already).
+
+        Arguments:
+            data -- The data.
+        """
+        return any(column in data.columns for column in self.source_columns())
+
+    def transform(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Encode data: replace the categorical columns with their dummy columns and
+        order the columns like the encoded training data.
+
+        The values of every column are looked up in its levels at once, and the
+        dummy columns are set from the level codes, without `pd.get_dummies`.
+
+        Arguments:
+            data -- The data, with all categorical columns to encode.
+
+        Returns:
+            The encoded data (the dummy columns are uint8 like `pd.get_dummies`, or
+            float32 with `drop_first` and unknown or missing values).
+        """
+        missing = [c for c in self.source_columns() if c not in data.columns]
+        assert not missing, f"ERROR: Columns to encode not in the data: {missing}!"
+
+        rows = np.arange(len(data))
+        blocks = []
+        for encoding in self.encodings:
+            categories = encoding["categories"]
+            # -1 for missing values and levels not seen when fitting.
+            codes = pd.Categorical(data[encoding["column"]], categories=categories).codes
+            n_unknown = int((codes < 0).sum() - data[encoding["column"]].isna().sum())
+            if n_unknown:
+                encoded_as = "missing" if encoding["drop_first"] else "all zeros"
+                print(
+                    f"WARNING: {n_unknown} values of {encoding['column']} are not one "
+                    f"of the fitted levels and are encoded as {encoded_as}."
+                )
+
+            dummies = np.zeros((len(data), len(categories)), dtype=np.uint8)
+            known = codes >= 0
+            dummies[rows[known], codes[known]] = 1
+            if encoding["drop_first"]:
+                dummies = dummies[:, 1:]
+                if not known.all():
+                    # All zeros is the dropped first level, not an unknown level.
+                    dummies = dummies.astype(np.float32)
+                    dummies[~known] = np.nan
+            blocks.append(
+                pd.DataFrame(
+                    dummies, columns=self._dummy_columns(encoding), index=data.index
+                )
+            )
+
+        encoded = pd.concat(
+            [data.drop(columns=self.source_columns())] + blocks, axis=1
+        )
+        if self.columns is None:
+            return encoded
+        # The columns of the encoded training data first (e.g. the ground truth is
+        # not in all data), then any other columns.
+        known_columns = set(self.columns)
+        order = [column for column in self.columns if column in encoded.columns]
+        order += [column for column in encoded.columns if column not in known_columns]
+        return encoded[order]
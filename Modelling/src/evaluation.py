@@ -0,0 +1,313 @@
+import copy
+import hashlib
+import json
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from src.array_frame import FRAME_META_FILE_NAME, load_frame, save_frame
+from src.cross_validation import make_fold_plan
+from src.dataloader import DataLoader
+from src.metrics import classification_metrics
+from src.models import get_model_class
+from src.mutation_matrix import MutationMatrix
+from src.utils import prepare_save_folder
+
+EVALUATION_OUTPUT_FOLDER = Path("output/evaluations")
+
+# Folder (next to the evaluated data) caching the per group (study) frames.
+GROUP_CACHE_FOLDER_NAME = "group_frames"
+
+
+def _group_key(data: pd.DataFrame, group: Any) -> str:
+    """Returns a hash identifying the rows of one group, its columns and the
+    categories of its categorical columns (a new category changes the codes)."""
+    sha = hashlib.sha1()
+    sha.update(pd.util.hash_pandas_object(data, index=False).to_numpy().tobytes())
+    for name, column in data.items():
+        sha.update(str(name).encode())
+        if pd.api.types.is_categorical_dtype(column):
+            sha.update(json.dumps(column.cat.categories.tolist(), default=str).encode())
+    return f"{group}_{sha.hexdigest()[:16]}"
+
+
+def cache_group_frames(
+    dataloader: DataLoader, group_column: str, cache_dir: Path
+) -> Dict[Any, str]:
+    """Save the rows of every group (e.g. study) as a memory-mappable frame, see
+    `src.array_frame`. Groups whose rows did not change since a previous run are
+    taken from the cache, so adding a study only saves the new study.
+
+    Arguments:
+        dataloader -- The data loader holding the data.
+        group_column -- The column holding the groups.
+        cache_dir -- The cache folder.
+
+    Returns:
+        A dict mapping every group to the folder of its frame.
+    """
+    frames = {}
+    groups = dataloader.data[group_column]
+    for group in groups.dropna().unique():
+        rows = np.flatnonzero((groups == group).to_numpy())
+        data = dataloader.data.iloc[rows].reset_index(drop=True)
+        frame_dir = Path(cache_dir) / _group_key(data, group)
+        if not (frame_dir / FRAME_META_FILE_NAME).is_file():
+            mutations = None
+            if dataloader.has_mutations():
+                mutations = dataloader.mutations.take_samples(rows)
+            save_frame(data, frame_dir, mutations)
+        frames[group] = str(frame_dir)
+    return frames
+
+
+def _concat_frames(frame_dirs: List[str], gt_column: str) -> DataLoader:
+    """Load and concatenate group frames into one data loader."""
+    frames = [load_frame(Path(frame_dir)) for frame_dir in frame_dirs]
+    data = pd.concat([data for data, _ in frames], ignore_index=True)
+    mutations = None
+    if frames[0][1] is not None:
+        mutations = MutationMatrix(
+            sparse.vstack([m.matrix for _, m in frames], format="csr"),
+            [s for _, m in frames for s in m.samples],
+            frames[0][1].genes,
+        )
+    return DataLoader.from_frame(data, gt_column, mutations)
+
+
+def evaluate_fold(
+    config: dict,
+    train_frames: List[str],
+    test_frames: List[str],
+    drop_columns: List[str],
+    n_threads: int,
+) -> Dict[str, Any]:
+    """Train a model on the training groups and evaluate it on the held-out
+    groups (runs in a worker process).
+
+    Arguments:
+        config -- The model config.
+        train_frames -- The frame folders of the training groups.
+        test_frames -- The frame folders of the held-out groups.
+        drop_columns -- Columns not used as predictors (e.g. the group column).
+        n_threads -- The number of threads of the model.
+
+    Returns:
+        A dict with the fold metrics, timings and the test set predictions.
+    """
+    gt_column = config["gt_column"]
+    model_class = get_model_class(config["model"])
+    config = copy.deepcopy(config)
+    if model_class.N_JOBS_ARG:
+        config["args"][model_class.N_JOBS_ARG] = n_threads
+
+    start = time.perf_counter()
+    train = _concat_frames(train_frames, gt_column)
+    test = _concat_frames(test_frames, gt_column)
+    for dataloader in [train, test]:
+        dataloader.data = dataloader.data.drop(columns=drop_columns)
+    load_seconds = time.perf_counter() - start
+
+    use_sparse = train.has_mutations() and model_class.SUPPORTS_SPARSE
+    model = model_class.from_config(config, train)
+
+    start = time.perf_counter()
+    if use_sparse:
+        x_train, feature_names = train.get_sparse_data()
+        model.train(x_train, train.get_ground_truth(), feature_names=feature_names)
+    else:
+        model.train(train.get_data(), train.get_ground_truth())
+    train_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    x_test = test.get_sparse_data()[0] if use_sparse else test.get_data()
+    y_pred = np.ravel(model.inference(x_test))
+    inference_seconds = time.perf_counter() - start
+
+    y_true = test.get_ground_truth().to_numpy()
+    return {
+        "n_train": len(train.data),
+        "n_test": len(test.data),
+        **classification_metrics(y_true, y_pred),
+        "load_seconds": load_seconds,
+        "train_seconds": train_seconds,
+        "inference_seconds": inference_seconds,
+        "y_true": y_true.tolist(),
+        "y_pred": y_pred.tolist(),
+    }
+
+
+class GroupEvaluation:
+    """Evaluate a model config on held-out groups of the data: leave-one-group-out
+    (e.g. leave-one-study-out) or grouped K-fold. One model is trained per fold in
+    parallel worker processes. The rows of every group are cached as memory-mapped
+    frames, which the workers concatenate into their training and test sets.
+
+    Public methods:
+    run -- Run the evaluation and save the report.
+
+    Instance variables:
+    config -- The model config.
+    dataloader -- The data loader holding the data to evaluate on.
+    group_column -- The column holding the groups (studies).
+    cache_dir -- The folder caching the group frames.
+    """
+
+    def __init__(
+        self,
+        config: dict,
+        data_paths: List[Path],
+        group_column: str = "Study_ID",
+        cache_dir: Optional[Path] = None,
+    ) -> None:
+        """Initialize the evaluation.
+
+        Arguments:
+            config -- The model config.
+            data_paths -- The preprocessed data files to evaluate on (e.g. the
+                training and test data), they are concatenated.
+
+        Keyword Arguments:
+            group_column -- The column holding the groups. (default: {"Study_ID"})
+            cache_dir -- The folder caching the group frames. Defaults to a
+                `group_frames` folder next to the first data file. (default: {None})
+        """
+        self.config = config
+        self.group_column = group_column
+        self.cache_dir = cache_dir or Path(data_paths[0]).parent / GROUP_CACHE_FOLDER_NAME
+
+        dataloaders = []
+        for data_path in data_paths:
+            dataloaders.append(DataLoader(Path(data_path), config["gt_column"]))
+            dataloaders[-1].load_data()
+        data = pd.concat([d.data for d in dataloaders], ignore_index=True)
+        # Recreate the categories, the files may hold different categories.
+        object_columns = data.columns[data.dtypes == "object"].tolist()
+        data[object_columns] = data[object_columns].astype("category")
+        mutations = None
+        if all(d.has_mutations() for d in dataloaders):
+            mutations = MutationMatrix(
+                sparse.vstack([d.mutations.matrix for d in dataloaders], format="csr"),
+                [s for d in dataloaders for s in d.mutations.samples],
+                dataloaders[0].mutations.genes,
+            )
+        self.dataloader = DataLoader.from_frame(data, config["gt_column"], mutations)
+
+    def _folds(self, n_splits: Optional[int]) -> List[List[Any]]:
+        """Returns the held-out groups of every fold: one group per fold, or the
+        groups of a grouped K-fold plan."""
+        groups = self.dataloader.data[self.group_column]
+        if not n_splits:
+            return [[group] for group in groups.dropna().unique()]
+        fold_plan = make_fold_plan(
+            self.dataloader.get_ground_truth(), n_splits=n_splits, groups=groups
+        )
+        return [groups[fold_plan == fold].unique().tolist() for fold in np.unique(fold_plan)]
+
+    def run(
+        self,
+        n_splits: Optional[int] = None,
+        n_workers: int = 1,
+        n_jobs: Optional[int] = None,
+        keep_group_column: bool = False,
+    ) -> Path:
+        """Run the evaluation and save the per fold metrics, the predictions and a
+        summary (mean over folds and pooled over all held-out rows).
+
+        Keyword Arguments:
+            n_splits -- Number of grouped K-fold splits. Leave-one-group-out if not
+                given. (default: {None})
+            n_workers -- Number of worker processes. (default: {1})
+            n_jobs -- Total threads, shared by the workers. Defaults to n_workers.
+                (default: {None})
+            keep_group_column -- Use the group column as a predictor. The held-out
+                groups are unseen categories, so it is dropped by default.
+                (default: {False})
+
+        Returns:
+            The path to the output folder.
+        """
+        frames = cache_group_frames(self.dataloader, self.group_column, self.cache_dir)
+        folds = self._folds(n_splits)
+        drop_columns = [] if keep_group_column else [self.group_column]
+        n_threads = max(1, (n_jobs or n_workers) // n_workers)
+        mode = f"grouped_{n_splits}_fold" if n_splits else f"leave_one_{self.group_column}_out"
+        print(
+            f"Evaluating {len(folds)} folds ({mode}) with {n_workers} worker(s) "
+            f"and {n_threads} thread(s) per model."
+        )
+
+        start = time.perf_counter()
+        # Spawn (not fork) the workers, forking a process that already uses threads
+        # (xgboost, tensorflow) is not safe.
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(n_workers, mp_context=context) as executor:
+            futures = [
+                executor.submit(
+                    evaluate_fold,
+                    self.config,
+                    [frames[g] for g in frames if g not in held_out],
+                    [frames[g] for g in held_out],
+                    drop_columns,
+                    n_threads,
+                )
+                for held_out in folds
+            ]
+            results = [future.result() for future in futures]
+        wall_seconds = time.perf_counter() - start
+
+        return self._save(mode, folds, results, wall_seconds)
+
+    def _save(
+        self,
+        mode: str,
+        folds: List[List[Any]],
+        results: List[Dict[str, Any]],
+        wall_seconds: float,
+    ) -> Path:
+        """Save the evaluation report."""
+        output_dir = prepare_save_folder(
+            EVALUATION_OUTPUT_FOLDER,
+            f"{self.config['training_name']}_{mode}",
+            ["config", "evaluation"],
+            {"model_config": self.config},
+        )
+
+        fold_rows, predictions = [], []
+        for fold, (held_out, result) in enumerate(zip(folds, results)):
+            y_true, y_pred = result.pop("y_true"), result.pop("y_pred")
+            held_out = ", ".join(map(str, held_out))
+            fold_rows.append({"fold": fold, "held_out": held_out, **result})
+            predictions.append(
+                pd.DataFrame(
+                    {"fold": fold, "held_out": held_out, "y_true": y_true, "y_pred": y_pred}
+                )
+            )
+        folds_df = pd.DataFrame(fold_rows)
+        predictions = pd.concat(predictions, ignore_index=True)
+
+        metric_columns = folds_df.columns.drop(["fold", "held_out", "n_train", "n_test"])
+        summary = {
+            "mode": mode,
+            "n_folds": len(folds_df),
+            "mean": folds_df[metric_columns].mean().to_dict(),
+            "std": folds_df[metric_columns].std().to_dict(),
+            "pooled": classification_metrics(predictions["y_true"], predictions["y_pred"]),
+            "wall_seconds": wall_seconds,
+        }
+
+        folds_df.to_csv(output_dir / "evaluation/folds.csv", index=False)
+        predictions.to_csv(output_dir / "evaluation/predictions.csv", index=False)
+        with open(output_dir / "evaluation/summary.json", "w") as f:
+            json.dump(summary, f, indent=2)
+
+        print(f"\nEvaluation results:\n{folds_df.to_string(index=False)}")
+        print(f"\nPooled metrics: {summary['pooled']}")
+        print(f"Saved the evaluation report to {output_dir}")
+        return output_dir
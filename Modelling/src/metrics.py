@@ -0,0 +1,306 @@
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import accuracy_score, precision_recall_fscore_support
+
+
+def classification_metrics(y_true: pd.Series, y_pred: pd.Series) -> Dict[str, float]:
+    """Calculate the classification metrics reported by the analysis and the
+    cross-validation. Precision, recall and F-score are calculated for the
+    class labelled 0.
+
+    Arguments:
+        y_true -- The ground truth labels.
+        y_pred -- The predicted labels.
+
+    Returns:
+        A dict with the accuracy, precision, recall and fscore.
+    """
+    result = {}
+    result["accuracy"] = accuracy_score(y_true, y_pred)
+    precision, recall, fscore, _ = precision_recall_fscore_support(
+        y_true, y_pred, pos_label=0, average="binary", zero_division=0
+    )
+    result["precision"] = precision
+    result["recall"] = recall
+    result["fscore"] = fscore
+    return result
+
+
+def class_scores(probabilities: np.ndarray, pos_label: int = 0) -> np.ndarray:
+    """Returns the scores of a class from the predicted probabilities of the class
+    labelled 1.
+
+    Arguments:
+        probabilities -- The predicted probabilities of the class labelled 1.
+
+    Keyword Arguments:
+        pos_label -- The class to score. (default: {0})
+    """
+    probabilities = np.asarray(probabilities, dtype=float)
+    return probabilities if pos_label == 1 else 1 - probabilities
+
+
+def probability_metrics(
+    y_true: pd.Series, probabilities: pd.Series, pos_label: int = 0
+) -> Dict[str, float]:
+    """Calculate the threshold free metrics of predicted probabilities.
+
+    Arguments:
+        y_true -- The ground truth labels.
+        probabilities -- The predicted probabilities of the class labelled 1.
+
+    Keyword Arguments:
+        pos_label -- The class the ROC AUC and the average precision are
+            calculated for. (default: {0})
+
+    Returns:
+        A dict with the ROC AUC, the average precision and the Brier score (of the
+        probabilities of the class labelled 1).
+    """
+    from sklearn.metrics import (average_precision_score, brier_score_loss,
+                                 roc_auc_score)
+
+    y_true = np.asarray(y_true)
+    scores = class_scores(probabilities, pos_label)
+    return {
+        "roc_auc": roc_auc_score(y_true == pos_label, scores),
+        "average_precision": average_precision_score(y_true == pos_label, scores),
+        "brier_score": brier_score_loss(y_true, probabilities),
+    }
+
+
+def threshold_sweep(
+    y_true: pd.Series,
+    probabilities: pd.Series,
+    thresholds: np.ndarray,
+    pos_label: int = 0,
+) -> pd.DataFrame:
+    """Calculate the classification metrics (see `classification_metrics`) for
+    every decision threshold, without re-running the model. A row is labelled 1 if
+    its probability is above the threshold.
+
+    The probabilities of each class are sorted once, the number of rows above every
+    threshold is then found with a binary search.
+
+    Arguments:
+        y_true -- The ground truth labels (0 or 1).
+        probabilities -- The predicted probabilities of the class labelled 1.
+        thresholds -- The decision thresholds.
+
+    Keyword Arguments:
+        pos_label -- The class precision, recall and F-score are calculated for.
+            (default: {0})
+
+    Returns:
+        A data frame with the threshold and the metrics, one row per threshold.
+    """
+    y_true = np.asarray(y_true)
+    probabilities = np.asarray(probabilities, dtype=float)
+    thresholds = np.asarray(thresholds, dtype=float)
+
+    ones = np.sort(probabilities[y_true == 1])
+    zeros = np.sort(probabilities[y_true == 0])
+    # Number of rows of each class predicted as 1.
+    ones_above = len(ones) - np.searchsorted(ones, thresholds, side="right")
+    zeros_above = len(zeros) - np.searchsorted(zeros, thresholds, side="right")
+
+    if pos_label == 1:
+        tp, fp, fn = ones_above, zeros_above, len(ones) - ones_above
+    else:
+        tp, fp, fn = len(zeros) - zeros_above, len(ones) - ones_above, zeros_above
+
+    def divide(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        # Zero when dividing by zero, like `zero_division=0` of sklearn.
+        return np.divide(a, b, out=np.zeros(len(a)), where=b > 0)
+
+    precision = divide(tp, tp + fp)
+    recall = divide(tp, tp + fn)
+    return pd.DataFrame(
+        {
+            "threshold": thresholds,
+            "accuracy": (ones_above + len(zeros) - zeros_above) / len(y_true),
+            "precision": precision,
+            "recall": recall,
+            "fscore": divide(2 * precision * recall, precision + recall),
+        }
+    )
+
+
+def calibration_table(
+    y_true: pd.Series, probabilities: pd.Series, n_bins: int = 10
+) -> pd.DataFrame:
+    """Bin the predicted probabilities (of the class labelled 1) into equal width
+    bins and compare the mean probability with the observed rate of the class in
+    every bin.
+
+    Arguments:
+        y_true -- The ground truth labels (0 or 1).
+        probabilities -- The predicted probabilities of the class labelled 1.
+
+    Keyword Arguments:
+        n_bins -- The number of bins. (default: {10})
+
+    Returns:
+        A data frame with the bin edges, the number of rows, the mean predicted
+        probability and the observed rate of every (non empty) bin.
+    """
+    y_true = np.asarray(y_true, dtype=float)
+    probabilities = np.asarray(probabilities, dtype=float)
+    edges = np.linspace(0, 1, n_bins + 1).round(10)
+    bins = np.clip(np.searchsorted(edges, probabilities, side="right") - 1, 0, n_bins - 1)
+
+    counts = np.bincount(bins, minlength=n_bins)
+    table = pd.DataFrame(
+        {
+            "bin_start": edges[:-1],
+            "bin_end": edges[1:],
+            "count": counts,
+            "mean_probability": np.bincount(bins, probabilities, n_bins),
+            "observed_rate": np.bincount(bins, y_true, n_bins),
+        }
+    )
+    table = table[counts > 0].reset_index(drop=True)
+    table[["mean_probability", "observed_rate"]] /= table[["count"]].to_numpy()
+    return table
+
+
+def _resample_counts(
+    rng: np.random.Generator, n_boot: int, n_samples: int
+) -> np.ndarray:
+    """Draw `n_boot` bootstrap resamples of `n_samples` rows as a (n_boot x
+    n_samples) matrix of how many times every row is drawn: the index matrix of all
+    replicates is drawn at once and counted with a single `np.bincount`."""
+    indices = rng.integers(0, n_samples, size=(n_boot, n_samples))
+    indices += np.arange(n_boot)[:, np.newaxis] * n_samples
+    return np.bincount(indices.ravel(), minlength=n_boot * n_samples).reshape(
+        n_boot, n_samples
+    )
+
+
+def _weighted_classification_metrics(
+    counts: np.ndarray, y_true: np.ndarray, y_pred: np.ndarray, pos_label: int
+) -> Dict[str, np.ndarray]:
+    """The metrics of `classification_metrics` for every row of a count matrix, as
+    matrix-vector products."""
+    counts = counts.astype(float)
+    positive, predicted_positive = y_true == pos_label, y_pred == pos_label
+    tp = counts @ (positive & predicted_positive)
+    fp = counts @ (~positive & predicted_positive)
+    fn = counts @ (positive & ~predicted_positive)
+
+    def divide(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+        # Zero when dividing by zero, like `zero_division=0` of sklearn.
+        return np.divide(a, b, out=np.zeros(len(a)), where=b > 0)
+
+    precision = divide(tp, tp + fp)
+    recall = divide(tp, tp + fn)
+    return {
+        "accuracy": (counts @ (y_true == y_pred)) / counts.sum(axis=1),
+        "precision": precision,
+        "recall": recall,
+        "fscore": divide(2 * precision * recall, precision + recall),
+    }
+
+
+def _weighted_roc_auc(
+    counts: np.ndarray, positive: np.ndarray, scores: np.ndarray
+) -> np.ndarray:
+    """The ROC AUC for every row of a count matrix, from the ranks of the scores
+    (Mann-Whitney U): the chance that a positive row scores higher than a negative
+    row, ties counting half. NaN for replicates without both classes."""
+    counts = counts.astype(float)
+    order = np.argsort(scores, kind="mergesort")
+    scores, positive, counts = scores[order], positive[order], counts[:, order]
+
+    # Weight of the negatives of every group of tied scores, and of all lower scores.
+    group_starts = np.flatnonzero(np.r_[True, scores[1:] != scores[:-1]])
+    groups = np.cumsum(np.r_[True, scores[1:] != scores[:-1]]) - 1
+    negatives_per_group = np.add.reduceat(counts * ~positive, group_starts, axis=1)
+    negatives_below = np.cumsum(negatives_per_group, axis=1) - negatives_per_group
+
+    positive_counts = counts[:, positive]
+    positive_groups = groups[positive]
+    wins = (
+        negatives_below[:, positive_groups]
+        + 0.5 * negatives_per_group[:, positive_groups]
+    )
+    n_pairs = positive_counts.sum(axis=1) * negatives_per_group.sum(axis=1)
+    with np.errstate(invalid="ignore", divide="ignore"):
+        auc = (positive_counts * wins).sum(axis=1) / n_pairs
+    return np.where(n_pairs > 0, auc, np.nan)
+
+
+def bootstrap_metrics(
+    y_true: pd.Series,
+    y_pred: pd.Series,
+    probabilities: Optional[pd.Series] = None,
+    n_boot: int = 10000,
+    confidence: float = 0.95,
+    random_seed: int = 0,
+    pos_label: int = 0,
+    max_cells: int = 10_000_000,
+) -> pd.DataFrame:
+    """Calculate percentile bootstrap confidence intervals of the classification
+    metrics (see `classification_metrics`) and, given the probabilities, the ROC
+    AUC.
+
+    All replicates are computed at once: the resamples are a (n_boot x n_samples)
+    matrix of row counts, and the metrics of every replicate are weighted sums over
+    the rows (the AUC from the ranks of the scores), without a loop over replicates.
+
+    Arguments:
+        y_true -- The ground truth labels (0 or 1).
+        y_pred -- The predicted labels.
+
+    Keyword Arguments:
+        probabilities -- The predicted probabilities of the class labelled 1.
+            (default: {None})
+        n_boot -- The number of bootstrap replicates. (default: {10000})
+        confidence -- The confidence level of the intervals. (default: {0.95})
+        random_seed -- The seed of the resampling. (default: {0})
+        pos_label -- The class precision, recall, F-score and AUC are calculated
+            for. (default: {0})
+        max_cells -- The largest count matrix computed at once, the replicates are
+            computed in chunks for large data sets. (default: {10_000_000})
+
+    Returns:
+        A data frame with the estimate (on all rows), the lower and upper bound of
+        the interval and the standard error of every metric.
+    """
+    y_true = np.asarray(y_true)
+    y_pred = np.asarray(y_pred)
+    scores = None if probabilities is None else class_scores(probabilities, pos_label)
+
+    def metrics(counts: np.ndarray) -> Dict[str, np.ndarray]:
+        result = _weighted_classification_metrics(counts, y_true, y_pred, pos_label)
+        if scores is not None:
+            result["roc_auc"] = _weighted_roc_auc(counts, y_true == pos_label, scores)
+        return result
+
+    estimates = metrics(np.ones((1, len(y_true)), dtype=int))
+
+    rng = np.random.default_rng(random_seed)
+    chunk_size = max(1, max_cells // max(1, len(y_true)))
+    replicates: Dict[str, List[np.ndarray]] = {name: [] for name in estimates}
+    for start in range(0, n_boot, chunk_size):
+        counts = _resample_counts(rng, min(chunk_size, n_boot - start), len(y_true))
+        for name, values in metrics(counts).items():
+            replicates[name].append(values)
+
+    alpha = (1 - confidence) / 2
+    rows = []
+    for name, values in replicates.items():
+        values = np.concatenate(values)
+        lower, upper = np.nanquantile(values, [alpha, 1 - alpha])
+        rows.append(
+            {
+                "metric": name,
+                "estimate": estimates[name][0],
+                "lower": lower,
+                "upper": upper,
+                "std": np.nanstd(values),
+            }
+        )
+    return pd.DataFrame(rows)
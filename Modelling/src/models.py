@@ -1,37 +1,135 @@
 from abc import ABC, abstractmethod
 from pathlib import Path
-from typing import Any, Optional
+from typing import Any, Callable, Dict, List, Optional, Type
 
-import eli5
 import numpy as np
 import pandas as pd
-import xgboost as xgb
-from sklearn.model_selection import KFold, cross_val_score
-from tensorflow import keras
+
+from src.dataloader import DataLoader
+
+# NOTE! The model backends (xgboost, tensorflow, eli5, sklearn) are imported inside
+# the methods that use them, so only the backend of the configured model is loaded.
+# Importing tensorflow alone takes several seconds.
 
 XGBOOST_MODEL_NAME = "xgboost"
 KERAS_MODEL_NAME = "keras_feed_forward"
 
+# Rows with a predicted probability above the threshold are labelled 1.
+DECISION_THRESHOLD = 0.5
+
+# Maps the `model` name of a model config to its model class.
+MODEL_REGISTRY: Dict[str, Type["BaseModel"]] = {}
+
+
+def register_model(name: str) -> Callable[[Type["BaseModel"]], Type["BaseModel"]]:
+    """Class decorator adding a model class to the model registry.
+
+    Arguments:
+        name -- The model name used in the `model` field of the model config.
+    """
+
+    def register(model_class: Type["BaseModel"]) -> Type["BaseModel"]:
+        assert name not in MODEL_REGISTRY, f"ERROR: Model '{name}' registered twice."
+        MODEL_REGISTRY[name] = model_class
+        return model_class
+
+    return register
+
+
+def get_model_class(name: str) -> Type["BaseModel"]:
+    """Returns the model class registered under the given model name.
+
+    Arguments:
+        name -- The model name from the model config.
+    """
+    assert name in MODEL_REGISTRY, (
+        f"ERROR: No matching model type '{name}' found (available: "
+        f"{', '.join(MODEL_REGISTRY)})! Check spelling in the model config file?"
+    )
+    return MODEL_REGISTRY[name]
+
+
 class BaseModel(ABC):
     """A base class for machine learning models.
 
     Public methods:
+    from_config -- Create a model from its config, or load it from disk.
     train -- Trains the model on the training data.
-    inference -- Run inference on the predictor data set.
+    predict_proba -- Predict the probability of the class labelled 1.
+    inference -- Predict the class labels of the predictor data set.
     save_model -- Save the model at the specified location.
     load_model -- Loads an existing model from a directory.
+
+    Class variables:
+    SUPPORTS_SPARSE -- If the model can be trained on (and run inference on) a
+        scipy sparse matrix instead of a Pandas dataframe. NOTE! XGBoost reads the
+        absent entries of a sparse matrix as missing values, not as 0. A model
+        trained on the sparse mutations of its training data therefore predicts on
+        sparse mutations too (`DataLoader.get_sparse_data`, also for new data
+        with dense gene columns), never on the genes as dense zeros.
+    N_JOBS_ARG -- Name of the model `args` entry setting the number of threads
+        the model uses, if it can be set.
+    BUDGET_ARG -- Name of the model `args` entry setting the training budget
+        (boosting rounds, epochs) used by successive halving search.
     """
 
+    SUPPORTS_SPARSE = False
+    N_JOBS_ARG: Optional[str] = None
+    BUDGET_ARG: Optional[str] = None
+
     def __init__(self) -> None:
         pass
 
+    @classmethod
+    def from_config(
+        cls,
+        config: dict,
+        dataloader: DataLoader,
+        model_path: Optional[Path] = None,
+    ) -> "BaseModel":
+        """Create a model from its config, or load it from disk.
+
+        Arguments:
+            config -- The model configuration.
+            dataloader -- The data loader of the data the model is used on.
+
+        Keyword Arguments:
+            model_path -- Path to a stored model. If given, the model will be loaded
+                from disk. (default: {None})
+        """
+        return cls(config, model_path)
+
     @abstractmethod
     def train(self, x_train: pd.DataFrame, y_train: pd.DataFrame) -> None:
         """Method for training the model."""
 
     @abstractmethod
-    def inference(self, x_test: pd.DataFrame) -> pd.DataFrame:
-        """Method for inference (prediction) on a trained model."""
+    def predict_proba(
+        self, x_test: pd.DataFrame, batch_size: Optional[int] = None
+    ) -> np.ndarray:
+        """Method predicting the probability of the class labelled 1, one per row."""
+
+    def inference(
+        self,
+        x_test: pd.DataFrame,
+        batch_size: Optional[int] = None,
+        threshold: float = DECISION_THRESHOLD,
+    ) -> np.ndarray:
+        """Predict the class labels of the predictor data set, by thresholding the
+        predicted probabilities.
+
+        Arguments:
+            x_test -- The predictor data set.
+
+        Keyword Arguments:
+            batch_size -- Number of rows per prediction batch. (default: {None})
+            threshold -- Rows with a probability above the threshold are labelled 1.
+                (default: {DECISION_THRESHOLD})
+
+        Returns:
+            The predicted class labels, one per row.
+        """
+        return (self.predict_proba(x_test, batch_size) > threshold).astype(int)
 
     @abstractmethod
     def save_model(self, folder: Path) -> None:
@@ -42,13 +140,14 @@ class BaseModel(ABC):
         """Internal method for loading an previously trained model from disk."""
 
 
+@register_model(XGBOOST_MODEL_NAME)
 class XGBoost(BaseModel):
     """An wrapper for the XGBoost model.
 
     Public methods:
     train -- Trains the model on the training data.
     explain_weights -- Returns an eli5 explanation of the model.
-    inference -- Run inference on the predictor data set.
+    predict_proba -- Predict the probability of the class labelled 1.
     save_model -- Save the model at the specified location.
     _load_model -- Loads an existing model from a directory.
 
@@ -58,6 +157,9 @@ class XGBoost(BaseModel):
     """
 
     MODEL_FILE_NAME = "model.json"
+    SUPPORTS_SPARSE = True
+    N_JOBS_ARG = "n_jobs"
+    BUDGET_ARG = "n_estimators"
 
     def __init__(self, config: dict, model_dir_path: Optional[Path] = None) -> None:
         """Initialize a XGBoost model.
@@ -75,6 +177,8 @@ class XGBoost(BaseModel):
             print(f"Loading model from: {model_dir_path /self.MODEL_FILE_NAME}")
             self.model = self._load_model(model_dir_path)
         else:
+            import xgboost as xgb
+
             print("Creating new model.")
             self.model = xgb.XGBClassifier(
                 **self.config["args"],
@@ -83,22 +187,25 @@ class XGBoost(BaseModel):
 
         super().__init__()
 
-    def train(self, x_train: pd.DataFrame, y_train: pd.DataFrame) -> None:
+    def train(
+        self,
+        x_train: pd.DataFrame,
+        y_train: pd.DataFrame,
+        feature_names: Optional[List[str]] = None,
+    ) -> None:
         """Trains the model on the given training data.
 
         Arguments:
-            x_train -- The training data set.
+            x_train -- The training data set (a dataframe or a scipy sparse matrix).
             y_train -- The corresponding ground truth.
-        """
 
+        Keyword Arguments:
+            feature_names -- The column names when training on a sparse matrix.
+                (default: {None})
+        """
         self.model.fit(x_train, y_train)
-
-        scores = cross_val_score(self.model, x_train, y_train, cv=5)
-        print("Mean cross-validation score: %.2f" % scores.mean())
-
-        kfold = KFold(n_splits=10, shuffle=True)
-        kf_cv_scores = cross_val_score(self.model, x_train, y_train, cv=kfold)
-        print("K-fold CV average score: %.2f" % kf_cv_scores.mean())
+        if feature_names is not None:
+            self.model.get_booster().feature_names = feature_names
 
     def explain_weights(self) -> str:
         """Returns an eli5 explanation of the model.
@@ -106,19 +213,30 @@ class XGBoost(BaseModel):
         Returns:
             The eli5 explination as a string.
         """
+        import eli5
+
         weights = eli5.format_as_text(eli5.explain_weights(self.model))
         return f"Eli5 XGBoost weights\n {weights}"
 
-    def inference(self, x_test: pd.DataFrame) -> pd.DataFrame:
-        """Run inference on the predictor data set.
+    def predict_proba(
+        self, x_test: pd.DataFrame, batch_size: Optional[int] = None
+    ) -> np.ndarray:
+        """Predict the probability of the class labelled 1.
+
+        Predicts with the booster's inplace_predict, directly on the data frame (or
+        sparse matrix) without copying it into a DMatrix first.
 
         Arguments:
             x_test -- The predictor data set.
 
+        Keyword Arguments:
+            batch_size -- Not used, the booster predicts all rows at once.
+                (default: {None})
+
         Returns:
-            A Pandas dataframe with the predicted values.
+            The predicted probabilities, one per row.
         """
-        return self.model.predict(x_test)
+        return self.model.get_booster().inplace_predict(x_test)
 
     def save_model(self, directory: Path) -> None:
         """Save the model at the specified location.
@@ -140,6 +258,7 @@ class XGBoost(BaseModel):
         """
         model_path = model_dir_path / self.MODEL_FILE_NAME
         assert model_path.is_file, f"ERROR: No model found at {model_path}"
+        import xgboost as xgb
 
         model = xgb.XGBClassifier()
         booster = xgb.Booster()
@@ -148,6 +267,7 @@ class XGBoost(BaseModel):
         return model
 
 
+@register_model(KERAS_MODEL_NAME)
 class KerasFeedForward(BaseModel):
     """A keras feed forward model. Currently only dense (fully connected)
     layers are impelemnted.
@@ -158,7 +278,7 @@ class KerasFeedForward(BaseModel):
 
     Public methods:
     train -- Trains the model on the training data.
-    inference -- Run inference on the predictor data set.
+    predict_proba -- Predict the probability of the class labelled 1.
     save_model -- Save the model at the specified location.
     _load_model -- Loads an existing model from a directory.
 
@@ -167,14 +287,20 @@ class KerasFeedForward(BaseModel):
     model -- The network model instance.
     """
 
+    BUDGET_ARG = "nr_of_epochs"
+
     def __init__(
-        self, config: dict, number_of_columns: int, model_path: Optional[Path] = None
+        self,
+        config: dict,
+        number_of_columns: Optional[int],
+        model_path: Optional[Path] = None,
     ) -> None:
         """Initializes a Keras Feed forward model from scratch or by loading from file.
 
         Arguments:
             config -- A dictionary used to configure the model.
-            number_of_columns -- The number of columns in the input data.
+            number_of_columns -- The number of columns in the input data (only
+                used when creating a new model).
 
         Keyword Arguments:
             model_path -- Path to the direcotry containing the saved model. If given,
@@ -193,12 +319,36 @@ class KerasFeedForward(BaseModel):
 
         super().__init__()
 
+    @classmethod
+    def from_config(
+        cls,
+        config: dict,
+        dataloader: DataLoader,
+        model_path: Optional[Path] = None,
+    ) -> "KerasFeedForward":
+        """Create a model from its config, or load it from disk.
+
+        Arguments:
+            config -- The model configuration.
+            dataloader -- The data loader, used for the number of input columns.
+
+        Keyword Arguments:
+            model_path -- Path to the directory containing the saved model. If
+                given, the model will be loaded from disk. (default: {None})
+        """
+        # Get number of columns in the input data. It is only needed when building
+        # a new model.
+        number_of_columns = None if model_path else len(dataloader.get_data().columns)
+        return cls(config, number_of_columns, model_path)
+
     def _create_model(self, number_of_columns: int) -> None:
         """Initialise a new model using the supplied configuration.
 
         Arguments:
             number_of_columns -- The number of columns in the input data.
         """
+        from tensorflow import keras
+
         model_conf = self.config["args"]
         layer_conf = model_conf["layers"]
 
@@ -240,13 +390,15 @@ class KerasFeedForward(BaseModel):
             y_train -- The ground truth data.
         """
         self.model.fit(
-            x_train.to_numpy(),  # Keras wants numpy arrays.
+            x_train.to_numpy(dtype=np.float32),  # Keras wants numpy arrays.
             y_train.to_numpy(),
             epochs=self.config["args"]["nr_of_epochs"],
         )
 
-    def inference(self, x_test: pd.DataFrame) -> pd.DataFrame:
-        """Run inference on the predictor data set.
+    def predict_proba(
+        self, x_test: pd.DataFrame, batch_size: Optional[int] = None
+    ) -> np.ndarray:
+        """Predict the probability of the class labelled 1 (the sigmoid output).
 
         NOTE! The supplied data set must not contain any NaNs and all
             categorical variables transformed into dummy variables.
@@ -254,12 +406,16 @@ class KerasFeedForward(BaseModel):
         Arguments:
             x_test -- The predictor data set.
 
+        Keyword Arguments:
+            batch_size -- Number of rows per prediction batch. Keras uses 32 if not
+                given. (default: {None})
+
         Returns:
-            A Pandas dataframe with the predicted values.
+            The predicted probabilities, one per row.
         """
         y_pred = self.model.predict(
-            x_test.to_numpy(),  # Keras wants numpy arrays.
-            batch_size=None,
+            x_test.to_numpy(dtype=np.float32),  # Keras wants numpy arrays.
+            batch_size=batch_size,
             verbose="auto",
             steps=None,
             callbacks=None,
@@ -267,8 +423,7 @@ class KerasFeedForward(BaseModel):
             workers=1,
             use_multiprocessing=False,
         )
-        classes = np.round(y_pred).astype(int)
-        return classes
+        return np.ravel(y_pred)
 
     def save_model(self, directory: Path) -> None:
         """Save the model at the specified location.
@@ -287,4 +442,6 @@ class KerasFeedForward(BaseModel):
         Returns:
             The loaded Keras feed forward model.
         """
+        from tensorflow import keras
+
         return keras.models.load_model(model_path)
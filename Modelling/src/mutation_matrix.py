@@ -0,0 +1,264 @@
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+# Suffix of the file storing the mutation matrix next to a data file,
+# e.g. train_data.csv -> train_data_mutations.npz.
+MUTATIONS_FILE_SUFFIX = "_mutations.npz"
+
+
+def mutations_path_for(data_path: Path) -> Path:
+    """Returns the path of the mutation matrix file belonging to a data file."""
+    data_path = Path(data_path)
+    return data_path.with_name(f"{data_path.stem}{MUTATIONS_FILE_SUFFIX}")
+
+
+def mutation_genes_for(data_path: Path) -> Optional[List[str]]:
+    """Returns the genes of the mutation matrix file belonging to a data file
+    (without loading the matrix), None if there is no such file."""
+    path = mutations_path_for(data_path)
+    if not path.is_file():
+        return None
+    with np.load(path, allow_pickle=False) as f:
+        return f["genes"].tolist()
+
+
+def read_gene_panel(panel_path: Path) -> List[str]:
+    """Read the gene list of a cBioPortal gene panel file
+    (e.g. data_gene_panel_impact468.txt).
+
+    Arguments:
+        panel_path -- The path to the gene panel file.
+
+    Returns:
+        The genes of the panel.
+    """
+    with open(panel_path) as f:
+        for line in f:
+            if line.startswith("gene_list:"):
+                return [gene.strip() for gene in line.split("\t")[1:] if gene.strip()]
+    assert False, f"ERROR: No 'gene_list:' line found in {panel_path}"
+
+
+class MutationMatrix:
+    """A sparse (CSR) sample by gene mutation matrix with sample and gene index maps.
+
+    Mutation data is mostly zeros, so storing it in compressed sparse row format
+    keeps the memory proportional to the number of mutations instead of
+    samples x genes.
+
+    NOTE! Sparse consumers like XGBoost read the absent (zero) entries as missing
+    values, not as 0, so a model trained on the matrix (see `hstack`) must predict
+    on a mutation matrix too: the same genes as dense zeros give other predictions.
+
+    Public methods:
+    from_dataframe -- Create a mutation matrix from the gene columns of a data frame.
+    read_csv -- Read the gene columns of a delimited file chunk by chunk.
+    load -- Load a mutation matrix saved with `save`.
+    save -- Save the mutation matrix to a .npz file.
+    select_genes -- Keep only the given genes.
+    drop_genes -- Remove the given genes.
+    take_samples -- Select samples (rows) by position.
+    to_dataframe -- Return the matrix as a pandas data frame with sparse columns.
+    hstack -- Combine numerical data frame columns with the mutation matrix.
+
+    Instance variables:
+    matrix -- The scipy CSR matrix with shape [n_samples, n_genes].
+    samples -- The sample identifiers, one per row.
+    genes -- The gene names, one per column.
+    sample_index -- Maps a sample identifier to its row.
+    gene_index -- Maps a gene name to its column.
+    """
+
+    DTYPE = np.float32
+
+    def __init__(
+        self, matrix: sparse.spmatrix, samples: Iterable[str], genes: Iterable[str]
+    ) -> None:
+        """Create a mutation matrix.
+
+        Arguments:
+            matrix -- A scipy sparse matrix with shape [n_samples, n_genes].
+            samples -- The sample identifiers, one per row.
+            genes -- The gene names, one per column.
+        """
+        self.matrix = sparse.csr_matrix(matrix, dtype=self.DTYPE)
+        self.samples = [str(s) for s in samples]
+        self.genes = [str(g) for g in genes]
+        assert self.matrix.shape == (
+            len(self.samples),
+            len(self.genes),
+        ), "ERROR: The mutation matrix shape does not match the sample and gene lists."
+
+        self.sample_index: Dict[str, int] = {s: i for i, s in enumerate(self.samples)}
+        self.gene_index: Dict[str, int] = {g: i for i, g in enumerate(self.genes)}
+
+    @property
+    def shape(self) -> Tuple[int, int]:
+        return self.matrix.shape
+
+    @classmethod
+    def from_dataframe(
+        cls, df: pd.DataFrame, genes: List[str], sample_column: Optional[str] = None
+    ) -> "MutationMatrix":
+        """Create a mutation matrix from the gene columns of a data frame.
+
+        Missing values are stored as zeros (not mutated).
+
+        Arguments:
+            df -- The data frame.
+            genes -- The names of the gene columns.
+
+        Keyword Arguments:
+            sample_column -- Column holding the sample identifiers. The data frame
+                index is used if not given. (default: {None})
+        """
+        samples = df[sample_column] if sample_column else df.index
+        values = df[genes].fillna(0).to_numpy(dtype=cls.DTYPE)
+        return cls(sparse.csr_matrix(values), samples, genes)
+
+    @classmethod
+    def read_csv(
+        cls,
+        data_path: Path,
+        genes: List[str],
+        sep: str = ",",
+        chunksize: int = 10000,
+        sample_column: Optional[str] = None,
+    ) -> "MutationMatrix":
+        """Read the gene columns of a delimited file chunk by chunk, so the dense
+        gene columns are never held in memory for more than one chunk.
+
+        Arguments:
+            data_path -- The path to the file.
+            genes -- The names of the gene columns to read.
+
+        Keyword Arguments:
+            sep -- The column delimiter. (default: {","})
+            chunksize -- Number of rows to read per chunk. (default: {10000})
+            sample_column -- Column holding the sample identifiers. The row index
+                of the file is used if not given. (default: {None})
+        """
+        usecols = genes + [sample_column] if sample_column else genes
+        blocks, samples = [], []
+        for chunk in pd.read_csv(data_path, sep=sep, usecols=usecols, chunksize=chunksize):
+            block = cls.from_dataframe(chunk, genes, sample_column)
+            blocks.append(block.matrix)
+            samples.extend(block.samples)
+
+        if not blocks:
+            return cls(sparse.csr_matrix((0, len(genes))), [], genes)
+        return cls(sparse.vstack(blocks, format="csr"), samples, genes)
+
+    @classmethod
+    def load(cls, path: Path) -> "MutationMatrix":
+        """Load a mutation matrix saved with `save`.
+
+        Arguments:
+            path -- The path to the .npz file.
+        """
+        with np.load(path, allow_pickle=False) as f:
+            matrix = sparse.csr_matrix(
+                (f["data"], f["indices"], f["indptr"]), shape=tuple(f["shape"])
+            )
+            return cls(matrix, f["samples"].tolist(), f["genes"].tolist())
+
+    def save(self, path: Path) -> None:
+        """Save the mutation matrix to a .npz file.
+
+        Arguments:
+            path -- The path to the .npz file.
+        """
+        np.savez_compressed(
+            path,
+            data=self.matrix.data,
+            indices=self.matrix.indices,
+            indptr=self.matrix.indptr,
+            shape=np.array(self.matrix.shape),
+            samples=np.array(self.samples, dtype=str),
+            genes=np.array(self.genes, dtype=str),
+        )
+
+    def select_genes(self, genes: List[str]) -> "MutationMatrix":
+        """Keep only the given genes (in the given order). Unknown genes are ignored.
+
+        Arguments:
+            genes -- The genes to keep.
+        """
+        genes = [g for g in genes if g in self.gene_index]
+        columns = [self.gene_index[g] for g in genes]
+        return MutationMatrix(self.matrix[:, columns], self.samples, genes)
+
+    def drop_genes(self, genes: Iterable[str]) -> "MutationMatrix":
+        """Remove the given genes. Unknown genes are ignored.
+
+        Arguments:
+            genes -- The genes to remove.
+        """
+        genes = set(genes)
+        return self.select_genes([g for g in self.genes if g not in genes])
+
+    def take_samples(self, rows: Iterable[int]) -> "MutationMatrix":
+        """Select samples (rows) by position.
+
+        Arguments:
+            rows -- The row positions to keep.
+        """
+        rows = np.asarray(list(rows), dtype=int)
+        return MutationMatrix(
+            self.matrix[rows], [self.samples[i] for i in rows], self.genes
+        )
+
+    def to_dataframe(self, index: Optional[pd.Index] = None) -> pd.DataFrame:
+        """Return the matrix as a pandas data frame with sparse (not densified) columns.
+
+        Keyword Arguments:
+            index -- The index of the data frame. Defaults to the sample identifiers.
+                (default: {None})
+        """
+        return pd.DataFrame.sparse.from_spmatrix(
+            self.matrix,
+            index=self.samples if index is None else index,
+            columns=self.genes,
+        )
+
+    def hstack(self, df: pd.DataFrame) -> Tuple[sparse.csr_matrix, List[str]]:
+        """Combine the columns of a data frame with the mutation matrix into one
+        sparse matrix. Categorical columns are represented by their category codes
+        (missing values as nan).
+
+        Arguments:
+            df -- The data frame, with one row per sample (in the same order).
+
+        Returns:
+            A tuple with the CSR matrix and the names of its columns.
+        """
+        assert len(df) == self.shape[0], "ERROR: Row count mismatch with the mutations."
+        columns = {}
+        for name, column in df.items():
+            if pd.api.types.is_categorical_dtype(column):
+                column = column.cat.codes.replace(-1, np.nan)
+            columns[name] = column.to_numpy(dtype=self.DTYPE, na_value=np.nan)
+
+        # The data frame columns are stored with explicit zeros. Sparse consumers like
+        # XGBoost treat absent entries as missing, which is only wanted for the genes.
+        n_rows = len(df)
+        dense = (
+            np.column_stack(list(columns.values()))
+            if columns
+            else np.empty((n_rows, 0), dtype=self.DTYPE)
+        )
+        n_columns = dense.shape[1]
+        dense_block = sparse.csr_matrix(
+            (
+                dense.ravel(),
+                np.tile(np.arange(n_columns), n_rows),
+                np.arange(n_rows + 1) * n_columns,
+            ),
+            shape=dense.shape,
+        )
+        matrix = sparse.hstack([dense_block, self.matrix], format="csr")
+        return matrix, list(columns.keys()) + self.genes
@@ -1,7 +1,8 @@
 import itertools
 import random
+from pathlib import Path
 from textwrap import wrap
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 import matplotlib.pyplot as plt
 import numpy as np
@@ -9,14 +10,42 @@ import pandas as pd
 import seaborn
 import sklearn
 from matplotlib import colors as mcolors
+from matplotlib.backends.backend_agg import FigureCanvasAgg
+from matplotlib.figure import Figure
 from matplotlib.ticker import MaxNLocator
-from sklearn.manifold import TSNE
+
+from src.embedding import embed_2d
 
 # Constants.
 PLT_COLORS_BASE = list(dict(mcolors.BASE_COLORS).keys())
 PLT_COLORS_CSS4 = list(dict(mcolors.CSS4_COLORS).keys())
 PLT_TABLEU_COLORS = list(dict(mcolors.TABLEAU_COLORS).keys())
 
+# NOTE! The plot functions draw on the given axis (`ax`), or else on a new pyplot
+# figure. Use `figure_axes` to draw without the global pyplot state, e.g. when
+# rendering figures in worker processes.
+
+
+def figure_axes(**figure_kwargs) -> Tuple[Figure, plt.Axes]:
+    """Create a figure with a single axis, rendered with the Agg backend and not
+    registered with pyplot (so it does not need to be closed).
+
+    Keyword Arguments:
+        figure_kwargs -- Any arguments for the figure.
+
+    Returns:
+        The figure and its axis.
+    """
+    fig = Figure(**figure_kwargs)
+    FigureCanvasAgg(fig)
+    return fig, fig.add_subplot(1, 1, 1)
+
+
+def _new_axes(**figure_kwargs) -> plt.Axes:
+    """Returns the axis of a new pyplot figure."""
+    fig = plt.figure(**figure_kwargs)
+    return fig.add_subplot(1, 1, 1)
+
 
 def scatter_plot(
     df: pd.DataFrame,
@@ -24,6 +53,7 @@ def scatter_plot(
     y_column: str,
     category_column: Optional[str] = None,
     plotargs: Dict[str, Any] = {},
+    ax: Optional[plt.Axes] = None,
 ) -> None:
     """Generates a scatter plot over two variables.
 
@@ -36,12 +66,9 @@ def scatter_plot(
         category_column -- The name of a column containing categories
             for the plot color of each data point. (default: {None})
         plotargs -- Any additional arguments for the scatter plot.
-
-    Returns:
-        The resulting plot as a seaborn facet grid.
+        ax -- A matplotlib axis to plot on. (default: {None})
     """
-    fig = plt.figure(facecolor="w", edgecolor="k")
-    ax = fig.add_subplot(1, 1, 1)
+    ax = ax or _new_axes(facecolor="w", edgecolor="k")
 
     color_cycler = color_cycler_plt()
     for group in df[category_column].unique():
@@ -88,7 +115,12 @@ def confusion_matrix(
         fig.tight_layout()
         ax = fig.add_subplot(1, 1, 1)
 
-    n_classes = predicted_labels.shape[0]
+    # (One class per label, not per row.)
+    n_classes = (
+        len(class_labels)
+        if class_labels
+        else int(max(np.max(predicted_labels), np.max(ground_truth_labels))) + 1
+    )
     confusion_matrix = sklearn.metrics.confusion_matrix(
         ground_truth_labels,
         predicted_labels,
@@ -176,6 +208,7 @@ def histogram(
     data: pd.Series,
     type: str,
     plotargs: Dict,
+    ax: Optional[plt.Axes] = None,
 ) -> None:
     """Create a histogram plot.
 
@@ -183,12 +216,16 @@ def histogram(
         data -- The data to use for the histogram.
         type -- The type of histogram plot. [categorical, continuous]
         plotargs -- Any additional arguments for the histogram plot.
+
+    Keyword Arguments:
+        ax -- A matplotlib axis to plot on. (default: {None})
     """
-    fig = plt.figure()
-    ax = fig.add_subplot(1, 1, 1)
+    ax = ax or _new_axes()
 
     if type == "categorical":
-        _histogram_categorical(ax, data.value_counts(), data.unique(), **plotargs)
+        # (The labels of the counts, in the order of the counts.)
+        counts = data.value_counts()
+        _histogram_categorical(ax, counts.to_numpy(), counts.index.tolist(), **plotargs)
     elif type == "continuous":
         _histogram(ax, data.to_numpy(), **plotargs)
 
@@ -268,6 +305,8 @@ def scatter_tsne_2d(
     columns: List[str],
     groupby: str,
     scatter_kwargs: Dict[str, Any] = {},
+    ax: Optional[plt.Axes] = None,
+    cache_dir: Optional[Path] = None,
 ) -> None:
     """Wrapper function for the scatter 2D TSNE plot. Scatter the 2D
         TSNE decomoposition of a dataset.
@@ -278,10 +317,14 @@ def scatter_tsne_2d(
         data -- The input data.
         columns -- Which columns to use in the TSNE decomposition.
         groupby -- How to group the data (a.k.a. the colors of the data points).
-        scatter_kwargs -- Any additional arguments for the histogram plot.
+        scatter_kwargs -- Any additional arguments for `_scatter_tsne_2d`.
+
+    Keyword Arguments:
+        ax -- A matplotlib axis to plot on. (default: {None})
+        cache_dir -- A folder caching the embeddings (see `src.embedding`).
+            (default: {None})
     """
-    fig = plt.figure()
-    ax = fig.add_subplot(1, 1, 1)
+    ax = ax or _new_axes()
     groups = []
     labels = []
     for g in data[groupby].unique():
@@ -289,22 +332,30 @@ def scatter_tsne_2d(
         groups.append(data.iloc[ix][columns].to_numpy())
         labels.append(f"{groupby}_{g}")
 
-    _scatter_tsne_2d(ax, groups, labels, **scatter_kwargs)
+    _scatter_tsne_2d(
+        ax, groups, labels, feature_names=columns, cache_dir=cache_dir, **scatter_kwargs
+    )
 
 
-# NOTE: scikit-learn recommends using PCA to reduce the number of dimensions to
-# less than 50 if it is higher than that before transforming with TSNE.
 def _scatter_tsne_2d(
     ax: plt.Axes,
     data: List[np.ndarray],
     labels: Optional[List[str]] = None,
     keep_ratio: float = 1.0,
     scatter_kwargs: Dict[str, Any] = {},
+    method: str = "tsne",
+    pca_components: Optional[int] = None,
+    max_samples: Optional[int] = None,
+    random_seed: int = 0,
+    method_kwargs: Dict[str, Any] = {},
+    feature_names: Optional[List[str]] = None,
+    cache_dir: Optional[Path] = None,
 ):
-    """Scatter the 2D TSNE decomoposition of a dataset.
+    """Scatter the 2D TSNE decomoposition (or another 2D embedding, see
+    `src.embedding`) of a dataset.
 
-    NOTE: scikit-learn recommends using PCA to reduce the number of dimensions to
-        less than 50 if it is higher than that before transforming with TSNE.
+    The data is subsampled before the embedding is fitted, so large cohorts only
+    pay for the plotted samples.
 
     Arguments:
         ax -- the matplotlib axis to draw on
@@ -313,31 +364,48 @@ def _scatter_tsne_2d(
 
     Keyword Arguments:
         labels -- the labels for the legende (default: {None})
-        keep_ratio -- keep keep_ratio of the data for plotting. TSNE transform is unaffected. (default: {1.0})
+        keep_ratio -- embed and plot keep_ratio of the samples of every category. (default: {1.0})
         scatter_kwargs -- extra arguments for configuring the plot (default: {{}})
+        method -- the embedding method: tsne, pca or random_projection. (default: {"tsne"})
+        pca_components -- reduce the data with PCA to this many dimensions before the
+            embedding. (default: {None})
+        max_samples -- embed and plot at most this many samples (the categories are
+            subsampled with the same ratio). (default: {None})
+        random_seed -- the seed of the subsampling and the embedding. (default: {0})
+        method_kwargs -- extra arguments for the embedding method, e.g. the
+            `perplexity` or `angle` of TSNE. (default: {{}})
+        feature_names -- the names of the features, part of the cache key. (default: {None})
+        cache_dir -- a folder caching the embeddings. (default: {None})
     """
-    # Data downsampling (1/2) - Calculate downsampling indices.
-    downsampling_indices = []
-    if keep_ratio < 1.0:
-        for i, category_data in enumerate(data):
-            n_new_samples = int(keep_ratio * len(category_data))
-            downsampling_indices.append(
-                np.random.permutation(len(category_data))[:n_new_samples].astype(int)
-            )
-
-    # Concatenate all data for compability with TSNE fit_transform().
+    # Subsample every category with the same ratio, before the embedding is fitted.
+    n_samples = sum(len(category_data) for category_data in data)
+    ratio = keep_ratio
+    if max_samples and n_samples * ratio > max_samples:
+        ratio = max_samples / n_samples
+    if ratio < 1.0:
+        rng = np.random.default_rng(random_seed)
+        data = [
+            category_data[
+                np.sort(
+                    rng.permutation(len(category_data))[: int(ratio * len(category_data))]
+                )
+            ]
+            for category_data in data
+        ]
+
+    # Concatenate all data for compability with the embedding.
     x_all = np.concatenate(tuple(data), axis=0)
 
-    # Calculate TSNE transform.
-    tsne = TSNE(n_components=2)
-    x_transformed = tsne.fit_transform(x_all)
-
-    # Data downsampling (2/2) - Apply downsampling.
-    if downsampling_indices:
-        for i in range(1, len(downsampling_indices)):
-            downsampling_indices[i] += len(downsampling_indices[i - 1])
-        downsampling_indices = np.concatenate(tuple(downsampling_indices), axis=0)
-        x_transformed = x_all[downsampling_indices]
+    # Calculate (or load the cached) embedding.
+    x_transformed = embed_2d(
+        x_all,
+        method,
+        pca_components,
+        random_seed,
+        method_kwargs,
+        feature_names,
+        cache_dir,
+    )
 
     # Create dummy labels if none.
     n_labels = len(data)
@@ -358,6 +426,128 @@ def _scatter_tsne_2d(
     ax.legend(labels=labels, handles=scatter_handles)
 
 
+def roc_curve(
+    ground_truth_labels: np.ndarray,
+    scores: np.ndarray,
+    pos_label: int = 0,
+    plotargs: Dict[str, Any] = {},
+    ax: Optional[plt.Axes] = None,
+) -> float:
+    """Plot the receiver operating characteristic (ROC) curve of predicted scores.
+
+    Arguments:
+        ground_truth_labels -- The ground truth values.
+        scores -- The predicted scores of the `pos_label` class.
+
+    Keyword Arguments:
+        pos_label -- The class the scores belong to. (default: {0})
+        plotargs -- Any additional arguments for the line plot. (default: {{}})
+        ax -- A matplotlib axis to plot on. (default: {None})
+
+    Returns:
+        The area under the curve.
+    """
+    fpr, tpr, _ = sklearn.metrics.roc_curve(ground_truth_labels, scores, pos_label=pos_label)
+    auc = sklearn.metrics.auc(fpr, tpr)
+
+    ax = ax or _new_axes(facecolor="w", edgecolor="k")
+    ax.plot(fpr, tpr, label=f"AUC = {auc:.3f}", **plotargs)
+    ax.plot([0, 1], [0, 1], color="grey", linestyle="--")
+    ax.set_xlabel("False positive rate", fontsize=14)
+    ax.set_ylabel("True positive rate", fontsize=14)
+    ax.legend(loc="lower right")
+    return auc
+
+
+def precision_recall_curve(
+    ground_truth_labels: np.ndarray,
+    scores: np.ndarray,
+    pos_label: int = 0,
+    plotargs: Dict[str, Any] = {},
+    ax: Optional[plt.Axes] = None,
+) -> float:
+    """Plot the precision-recall curve of predicted scores.
+
+    Arguments:
+        ground_truth_labels -- The ground truth values.
+        scores -- The predicted scores of the `pos_label` class.
+
+    Keyword Arguments:
+        pos_label -- The class the scores belong to. (default: {0})
+        plotargs -- Any additional arguments for the line plot. (default: {{}})
+        ax -- A matplotlib axis to plot on. (default: {None})
+
+    Returns:
+        The average precision.
+    """
+    precision, recall, _ = sklearn.metrics.precision_recall_curve(
+        ground_truth_labels, scores, pos_label=pos_label
+    )
+    average_precision = sklearn.metrics.average_precision_score(
+        ground_truth_labels, scores, pos_label=pos_label
+    )
+
+    ax = ax or _new_axes(facecolor="w", edgecolor="k")
+    ax.step(recall, precision, where="post", label=f"AP = {average_precision:.3f}", **plotargs)
+    ax.axhline(np.mean(ground_truth_labels == pos_label), color="grey", linestyle="--")
+    ax.set_xlabel("Recall", fontsize=14)
+    ax.set_ylabel("Precision", fontsize=14)
+    ax.set_ylim(0, 1.05)
+    ax.legend(loc="lower left")
+    return average_precision
+
+
+def calibration_curve(
+    calibration: pd.DataFrame,
+    plotargs: Dict[str, Any] = {},
+    ax: Optional[plt.Axes] = None,
+) -> None:
+    """Plot a reliability diagram: the observed rate against the mean predicted
+    probability of every probability bin.
+
+    Arguments:
+        calibration -- The calibration table, see `src.metrics.calibration_table`.
+
+    Keyword Arguments:
+        plotargs -- Any additional arguments for the line plot. (default: {{}})
+        ax -- A matplotlib axis to plot on. (default: {None})
+    """
+    ax = ax or _new_axes(facecolor="w", edgecolor="k")
+    ax.plot([0, 1], [0, 1], color="grey", linestyle="--", label="Perfectly calibrated")
+    ax.plot(
+        calibration["mean_probability"],
+        calibration["observed_rate"],
+        marker="o",
+        label="Model",
+        **plotargs,
+    )
+    ax.set_xlabel("Mean predicted probability", fontsize=14)
+    ax.set_ylabel("Observed rate", fontsize=14)
+    ax.legend(loc="upper left")
+
+
+def metrics_vs_threshold(
+    sweep: pd.DataFrame,
+    plotargs: Dict[str, Any] = {},
+    ax: Optional[plt.Axes] = None,
+) -> None:
+    """Plot the classification metrics against the decision threshold.
+
+    Arguments:
+        sweep -- The metrics per threshold, see `src.metrics.threshold_sweep`.
+
+    Keyword Arguments:
+        plotargs -- Any additional arguments for the line plots. (default: {{}})
+        ax -- A matplotlib axis to plot on. (default: {None})
+    """
+    ax = ax or _new_axes(facecolor="w", edgecolor="k")
+    for column in sweep.columns.drop("threshold"):
+        ax.plot(sweep["threshold"], sweep[column], label=column, **plotargs)
+    ax.set_xlabel("Threshold", fontsize=14)
+    ax.set_ylabel("Metric", fontsize=14)
+    ax.legend()
+
+
 # Plot utils below
 ##########################################################
 
@@ -0,0 +1,143 @@
+import json
+from pathlib import Path
+from typing import Any, Dict, List
+
+import numpy as np
+import pandas as pd
+
+# Name of the schema file, saved in the data folder next to the data files it
+# describes (train_data.csv and test_data.csv share one schema).
+SCHEMA_FILE_NAME = "schema.json"
+
+CATEGORY_DTYPE = "category"
+
+
+def schema_path_for(data_path: Path) -> Path:
+    """Returns the path of the schema file belonging to a data file."""
+    return Path(data_path).with_name(SCHEMA_FILE_NAME)
+
+
+def _smallest_int_dtype(values: pd.Series) -> str:
+    """Returns the smallest signed integer type holding all values of a column."""
+    for dtype in ["int8", "int16", "int32"]:
+        info = np.iinfo(dtype)
+        if values.min() >= info.min and values.max() <= info.max:
+            return dtype
+    return "int64"
+
+
+def _nullable_dtype(dtype: Any) -> Any:
+    """Returns the pandas nullable type of a boolean or integer type (e.g. Int8 for
+    int8), other types unchanged."""
+    if dtype == "bool":
+        return "boolean"
+    if isinstance(dtype, str) and dtype.startswith("int"):
+        return dtype.capitalize()
+    return dtype
+
+
+class DatasetSchema:
+    """The column types of a preprocessed data set, so the data is read with
+    compact types and every file of the data set gets the same category codes.
+
+    Column types:
+        bool -- Boolean columns.
+        int8/int16/int32/int64 -- Integer columns without missing values (e.g.
+            the gene flags), the smallest type holding all values.
+        float32 -- Other numerical columns (e.g. TMB and age).
+
+    The boolean and integer columns are stored with these types, but read with
+    the pandas nullable types (boolean, Int8, ..), as other data (e.g. new data to
+    predict on) may have missing values.
+        category -- Text columns, with fixed (sorted) levels.
+
+    Public methods:
+    from_data -- Derive the schema from the data.
+    load -- Load a schema saved with `save`.
+    save -- Save the schema to a json file.
+    dtypes -- The types to read the columns with (e.g. by `pd.read_csv`).
+    storage_dtypes -- The types to store the columns with.
+    categories -- The levels of the categorical columns.
+
+    Instance variables:
+    columns -- The name and type (and levels) of every column, in column order.
+    """
+
+    def __init__(self, columns: List[Dict[str, Any]]) -> None:
+        """Create a schema.
+
+        Arguments:
+            columns -- Dicts with the `name` and `dtype` (and for categorical
+                columns the `categories`) of every column.
+        """
+        self.columns = columns
+
+    @classmethod
+    def from_data(cls, data: pd.DataFrame) -> "DatasetSchema":
+        """Derive the schema from the data, e.g. the concatenated training and test
+        sets, so the categorical columns have the levels of both.
+
+        Arguments:
+            data -- The data set.
+        """
+        columns = []
+        for name, values in data.items():
+            column: Dict[str, Any] = {"name": str(name)}
+            if pd.api.types.is_bool_dtype(values):
+                column["dtype"] = "bool"
+            elif pd.api.types.is_numeric_dtype(values):
+                integral = values.notna().all() and (values == values.round()).all()
+                column["dtype"] = _smallest_int_dtype(values) if integral else "float32"
+            else:
+                column["dtype"] = CATEGORY_DTYPE
+                column["categories"] = sorted(values.dropna().astype(str).unique())
+            columns.append(column)
+        return cls(columns)
+
+    @classmethod
+    def load(cls, path: Path) -> "DatasetSchema":
+        """Load a schema saved with `save`.
+
+        Arguments:
+            path -- The path to the json file.
+        """
+        with open(path) as f:
+            return cls(json.load(f)["columns"])
+
+    def save(self, path: Path) -> None:
+        """Save the schema to a json file.
+
+        Arguments:
+            path -- The path to the json file.
+        """
+        with open(path, "w") as f:
+            json.dump({"columns": self.columns}, f, indent=2)
+
+    def storage_dtypes(self) -> Dict[str, Any]:
+        """Returns the types to store the columns with (e.g. in parquet files),
+        categorical columns get a pandas CategoricalDtype with the fixed levels."""
+        dtypes = {}
+        for column in self.columns:
+            if column["dtype"] == CATEGORY_DTYPE:
+                dtypes[column["name"]] = pd.CategoricalDtype(column["categories"])
+            else:
+                dtypes[column["name"]] = column["dtype"]
+        return dtypes
+
+    def dtypes(self) -> Dict[str, Any]:
+        """Returns the types to read the columns with, like `storage_dtypes` but
+        with the boolean and integer columns as pandas nullable types, so missing
+        values (e.g. in new data) are read as <NA>. Values of categorical columns
+        that are not one of the levels are read as missing values."""
+        return {
+            name: _nullable_dtype(dtype)
+            for name, dtype in self.storage_dtypes().items()
+        }
+
+    def categories(self) -> Dict[str, List[str]]:
+        """Returns the levels of the categorical columns."""
+        return {
+            column["name"]: column["categories"]
+            for column in self.columns
+            if column["dtype"] == CATEGORY_DTYPE
+        }
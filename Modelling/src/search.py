@@ -0,0 +1,291 @@
+import copy
+import math
+import multiprocessing
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.array_frame import load_frame, save_frame
+from src.cross_validation import cross_validate, make_fold_plan
+from src.dataloader import DataLoader
+from src.models import BaseModel, get_model_class
+
+RANDOM_SEARCH = "random"
+SUCCESSIVE_HALVING = "successive_halving"
+
+# Data loaders of the memory-mapped frames, cached per worker process so every
+# frame is only loaded once per worker.
+_WORKER_DATALOADERS: Dict[str, DataLoader] = {}
+
+
+def sample_params(space: Dict[str, dict], rng: np.random.Generator) -> Dict[str, Any]:
+    """Draw one set of model arguments from a search space.
+
+    Every entry of the space is a dict with a `type`:
+        int -- An integer in [low, high].
+        float -- A float uniformly drawn from [low, high].
+        log_float -- A float log-uniformly drawn from [low, high].
+        choice -- One of `values`.
+
+    Arguments:
+        space -- The search space, mapping model argument names to distributions.
+        rng -- The random number generator.
+    """
+    params = {}
+    for name, dist in space.items():
+        if dist["type"] == "int":
+            params[name] = int(rng.integers(dist["low"], dist["high"], endpoint=True))
+        elif dist["type"] == "float":
+            params[name] = float(rng.uniform(dist["low"], dist["high"]))
+        elif dist["type"] == "log_float":
+            log_value = rng.uniform(np.log(dist["low"]), np.log(dist["high"]))
+            params[name] = float(np.exp(log_value))
+        elif dist["type"] == "choice":
+            params[name] = dist["values"][rng.integers(len(dist["values"]))]
+        else:
+            assert False, f"ERROR: Unknown search space type '{dist['type']}' for {name}."
+    return params
+
+
+def trial_config(
+    config: dict, params: Dict[str, Any], budget: Optional[int] = None
+) -> dict:
+    """Returns a copy of a model config with the model arguments of a trial.
+
+    Arguments:
+        config -- The model config.
+        params -- The model arguments of the trial.
+
+    Keyword Arguments:
+        budget -- The training budget (see BaseModel.BUDGET_ARG). (default: {None})
+    """
+    config = copy.deepcopy(config)
+    config["args"].update(params)
+    if budget is not None:
+        config["args"][get_model_class(config["model"]).BUDGET_ARG] = budget
+    return config
+
+
+def _worker_dataloader(frame_dir: str, gt_column: str) -> DataLoader:
+    """Returns the data loader of a memory-mapped frame, loading it on first use."""
+    if frame_dir not in _WORKER_DATALOADERS:
+        data, mutations = load_frame(Path(frame_dir))
+        _WORKER_DATALOADERS[frame_dir] = DataLoader.from_frame(data, gt_column, mutations)
+    return _WORKER_DATALOADERS[frame_dir]
+
+
+def run_trial(
+    frame_dir: str,
+    config: dict,
+    fold_plan: np.ndarray,
+    metric: str,
+    n_threads: int,
+) -> Dict[str, float]:
+    """Cross-validate one trial configuration (runs in a worker process).
+
+    Arguments:
+        frame_dir -- The folder of the memory-mapped training data.
+        config -- The model config of the trial.
+        fold_plan -- The fold number of every row.
+        metric -- The metric to score the trial with.
+        n_threads -- The thread budget of the trial.
+
+    Returns:
+        A dict with the mean and standard deviation of the metric over the folds
+        and the run time of the trial.
+    """
+    start = time.perf_counter()
+    dataloader = _worker_dataloader(frame_dir, config["gt_column"])
+    model_class = get_model_class(config["model"])
+
+    if dataloader.has_mutations() and model_class.SUPPORTS_SPARSE:
+        x, feature_names = dataloader.get_sparse_data()
+    else:
+        x, feature_names = dataloader.get_data(), None
+
+    def make_model(threads: int) -> BaseModel:
+        fold_config = copy.deepcopy(config)
+        if model_class.N_JOBS_ARG:
+            fold_config["args"][model_class.N_JOBS_ARG] = threads
+        return model_class.from_config(fold_config, dataloader)
+
+    results = cross_validate(
+        make_model,
+        x,
+        dataloader.get_ground_truth(),
+        fold_plan,
+        n_jobs=n_threads,
+        threaded_model=model_class.N_JOBS_ARG is not None,
+        feature_names=feature_names,
+    )
+    return {
+        "score": results[metric].mean(),
+        "score_std": results[metric].std(),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def successive_halving_rungs(
+    n_trials: int, min_budget: int, max_budget: int, eta: int
+) -> List[Tuple[int, int]]:
+    """Returns the rungs of a successive halving search: the number of trials
+    and the budget per rung. Every rung keeps the best 1/eta of the trials of the
+    previous rung and multiplies their budget by eta, up to max_budget.
+
+    Arguments:
+        n_trials -- The number of trials in the first rung.
+        min_budget -- The budget of the first rung.
+        max_budget -- The maximum budget.
+        eta -- The reduction factor.
+    """
+    rungs = [(n_trials, min_budget)]
+    while rungs[-1][0] > 1 and rungs[-1][1] < max_budget:
+        n, budget = rungs[-1]
+        rungs.append((math.ceil(n / eta), min(budget * eta, max_budget)))
+    return rungs
+
+
+class HyperparameterSearch:
+    """Random or successive halving search over the model arguments of a model
+    config. Trials run in a pool of worker processes; the training data is saved
+    once as memory-mapped arrays which every worker maps instead of receiving a
+    pickled copy per trial. Every trial is scored by cross-validation on a single
+    fold plan shared by all trials.
+
+    Public methods:
+    run -- Run the search and return the leaderboard and the best config.
+
+    Instance variables:
+    config -- The model config, including the `search` block.
+    search_config -- The `search` block of the model config.
+    dataloader -- The data loader holding the training data.
+    """
+
+    def __init__(self, config: dict, dataloader: DataLoader) -> None:
+        """Initialize the search.
+
+        Arguments:
+            config -- The model config, including the `search` block.
+            dataloader -- The data loader holding the (loaded) training data.
+        """
+        self.config = config
+        self.search_config = config["search"]
+        self.dataloader = dataloader
+
+    def _run_rung(
+        self,
+        executor: ProcessPoolExecutor,
+        frame_dir: str,
+        trials: List[Dict[str, Any]],
+        fold_plan: np.ndarray,
+        n_threads: int,
+        budget: Optional[int],
+    ) -> List[Dict[str, Any]]:
+        """Run a set of trials with the given budget in the worker pool."""
+        metric = self.search_config.get("metric", "accuracy")
+        futures = [
+            executor.submit(
+                run_trial,
+                frame_dir,
+                trial_config(self.config, trial["params"], budget),
+                fold_plan,
+                metric,
+                n_threads,
+            )
+            for trial in trials
+        ]
+        results = []
+        for trial, future in zip(trials, futures):
+            result = {**trial, "budget": budget, **future.result()}
+            print(
+                f"Trial {result['trial']:>3} (budget {budget}): "
+                f"{metric} {result['score']:.3f} in {result['seconds']:.1f} s"
+            )
+            results.append(result)
+        return results
+
+    def run(self) -> Tuple[pd.DataFrame, dict]:
+        """Run the search.
+
+        Returns:
+            A tuple with the leaderboard (one row per trial and rung, best first)
+            and the model config of the best trial.
+        """
+        method = self.search_config.get("method", RANDOM_SEARCH)
+        assert method in [RANDOM_SEARCH, SUCCESSIVE_HALVING], (
+            f"ERROR: Unknown search method '{method}'! "
+            f"Use '{RANDOM_SEARCH}' or '{SUCCESSIVE_HALVING}'."
+        )
+        seed = self.search_config.get("random_seed", self.config["random_seed"])
+        rng = np.random.default_rng(seed)
+        trials = [
+            {"trial": i, "params": sample_params(self.search_config["space"], rng)}
+            for i in range(self.search_config.get("n_trials", 10))
+        ]
+
+        if method == SUCCESSIVE_HALVING:
+            budget_config = self.search_config["budget"]
+            rungs = successive_halving_rungs(
+                len(trials),
+                budget_config["min"],
+                budget_config["max"],
+                budget_config.get("eta", 3),
+            )
+        else:
+            rungs = [(len(trials), None)]
+
+        y = self.dataloader.get_ground_truth()
+        group_column = self.search_config.get("group_column")
+        fold_plan = make_fold_plan(
+            y,
+            n_splits=self.search_config.get("n_splits", 3),
+            random_seed=seed,
+            stratify=self.search_config.get("stratify", False),
+            groups=self.dataloader.data[group_column] if group_column else None,
+        )
+
+        n_workers = self.search_config.get("n_workers", 1)
+        n_threads = max(1, self.search_config.get("n_jobs", n_workers) // n_workers)
+        print(
+            f"Running a {method} search with {len(trials)} trials in {len(rungs)} "
+            f"rung(s), {n_workers} worker(s) with {n_threads} thread(s) each."
+        )
+
+        leaderboard = []
+        with tempfile.TemporaryDirectory() as frame_dir:
+            save_frame(self.dataloader.data, Path(frame_dir), self.dataloader.mutations)
+
+            # Spawn (not fork) the workers, forking a process that already uses
+            # threads (xgboost, tensorflow) is not safe.
+            context = multiprocessing.get_context("spawn")
+            with ProcessPoolExecutor(n_workers, mp_context=context) as executor:
+                for rung, (n_keep, budget) in enumerate(rungs):
+                    results = self._run_rung(
+                        executor, frame_dir, trials[:n_keep], fold_plan, n_threads, budget
+                    )
+                    for result in results:
+                        result["rung"] = rung
+                    leaderboard.extend(results)
+                    trials = sorted(results, key=lambda r: r["score"], reverse=True)
+
+        best = trials[0]
+        leaderboard = pd.DataFrame(
+            [
+                {
+                    "trial": r["trial"],
+                    "rung": r["rung"],
+                    "budget": r["budget"],
+                    **r["params"],
+                    "score": r["score"],
+                    "score_std": r["score_std"],
+                    "seconds": r["seconds"],
+                }
+                for r in leaderboard
+            ]
+        ).sort_values(["rung", "score"], ascending=False, ignore_index=True)
+        return leaderboard, trial_config(self.config, best["params"], best["budget"])
@@ -0,0 +1,468 @@
+import json
+import queue
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.data_format import data_columns
+from src.dataloader import DataLoader
+from src.encoding import OneHotEncoder, model_encoder_path
+from src.models import DECISION_THRESHOLD, BaseModel, get_model_class
+from src.mutation_matrix import MutationMatrix, mutation_genes_for
+from src.utils import read_config
+
+# The longest time a request waits for the predictions of its batch.
+REQUEST_TIMEOUT_SECONDS = 60.0
+
+
+class ServerStats:
+    """Thread safe latency and throughput counters of the prediction server.
+
+    Public methods:
+    count -- Increase a counter.
+    record_request -- Record a finished prediction request.
+    record_batch -- Record a model inference call.
+    to_dict -- Returns the counters and derived statistics.
+    """
+
+    # Number of most recent request latencies kept for the percentiles.
+    LATENCY_WINDOW = 1000
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._counters: Dict[str, int] = {
+            "requests": 0,
+            "errors": 0,
+            "rows": 0,
+            "batches": 0,
+            "batch_rows": 0,
+            "cache_hits": 0,
+            "cache_misses": 0,
+            "cache_evictions": 0,
+        }
+        self._latencies: deque = deque(maxlen=self.LATENCY_WINDOW)
+        self._inference_seconds = 0.0
+
+    def count(self, name: str, value: int = 1) -> None:
+        """Increase a counter.
+
+        Arguments:
+            name -- The name of the counter.
+
+        Keyword Arguments:
+            value -- The amount to add. (default: {1})
+        """
+        with self._lock:
+            self._counters[name] += value
+
+    def record_request(self, seconds: float, n_rows: int) -> None:
+        """Record a finished prediction request.
+
+        Arguments:
+            seconds -- The latency of the request.
+            n_rows -- The number of predicted rows.
+        """
+        with self._lock:
+            self._counters["requests"] += 1
+            self._counters["rows"] += n_rows
+            self._latencies.append(seconds)
+
+    def record_batch(self, seconds: float, n_rows: int) -> None:
+        """Record a model inference call.
+
+        Arguments:
+            seconds -- The duration of the inference call.
+            n_rows -- The number of rows in the batch.
+        """
+        with self._lock:
+            self._counters["batches"] += 1
+            self._counters["batch_rows"] += n_rows
+            self._inference_seconds += seconds
+
+    def to_dict(self) -> Dict[str, Any]:
+        """Returns the counters and derived statistics (latencies in milliseconds)."""
+        with self._lock:
+            stats: Dict[str, Any] = dict(self._counters)
+            latencies = np.array(self._latencies) * 1000
+            inference_seconds = self._inference_seconds
+        uptime = time.perf_counter() - self._start
+
+        stats["uptime_seconds"] = uptime
+        stats["requests_per_second"] = stats["requests"] / uptime
+        stats["rows_per_second"] = stats["rows"] / uptime
+        stats["mean_batch_rows"] = stats["batch_rows"] / max(1, stats["batches"])
+        stats["inference_seconds"] = inference_seconds
+        if len(latencies):
+            stats["latency_ms"] = {
+                "mean": float(latencies.mean()),
+                "p50": float(np.percentile(latencies, 50)),
+                "p95": float(np.percentile(latencies, 95)),
+                "max": float(latencies.max()),
+            }
+        return stats
+
+
+class BatcherStopped(RuntimeError):
+    """Raised when rows are submitted to a stopped (e.g. evicted) batcher."""
+
+
+class MicroBatcher:
+    """Collects concurrent prediction requests for one model into batches, so that
+    the model runs a single inference call per batch instead of one per request.
+    The result of every request is the predicted probabilities of its rows.
+
+    A batch is run when it holds `max_batch_rows` rows, or `max_wait_ms` after its
+    first request arrived.
+
+    Public methods:
+    prepare -- Check and convert the rows of a request like the training data.
+    submit -- Queue rows for prediction and return a future of the probabilities.
+    stop -- Stop the batching thread.
+
+    Instance variables:
+    model -- The model used for inference.
+    categories -- The categories of the categorical columns (None to derive them
+        from every batch).
+    encoder -- The one hot encoder of the model, applied to rows that are not
+        encoded (None if the model was trained on data without one).
+    columns -- The predictor columns of the training data, in order (None if not
+        known).
+    genes -- The genes of a model trained on sparse mutations, predicted on as a
+        sparse mutation matrix like in training (None for other models).
+    max_batch_rows -- The maximum number of rows per batch.
+    max_wait_ms -- The maximum time to wait for more requests.
+    stats -- The server counters.
+    """
+
+    def __init__(
+        self,
+        model: BaseModel,
+        categories: Optional[Dict[str, List[str]]],
+        max_batch_rows: int,
+        max_wait_ms: float,
+        stats: ServerStats,
+        encoder: Optional[OneHotEncoder] = None,
+        columns: Optional[List[str]] = None,
+        genes: Optional[List[str]] = None,
+    ) -> None:
+        self.model = model
+        self.categories = categories
+        self.encoder = encoder
+        self.columns = columns
+        self.genes = genes
+        self.max_batch_rows = max_batch_rows
+        self.max_wait_ms = max_wait_ms
+        self.stats = stats
+        self._queue: queue.Queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def prepare(self, rows: pd.DataFrame) -> pd.DataFrame:
+        """Encode the rows of a request, and order and convert its columns like the
+        training data, so a request with missing columns (or values of the wrong
+        type) fails on its own instead of failing the batch it would be part of.
+
+        Arguments:
+            rows -- The predictor rows of a request.
+
+        Returns:
+            The rows to `submit`.
+        """
+        if self.encoder and self.encoder.applies_to(rows):
+            rows = self.encoder.transform(rows)
+        if self.columns is None:
+            return rows
+        expected = self.columns + (self.genes or [])
+        missing = [column for column in expected if column not in rows.columns]
+        assert not missing, (
+            f"ERROR: Column(s) {', '.join(missing)} of the training data not in the "
+            "request!"
+        )
+        return self._convert_types(rows.reindex(columns=expected))
+
+    def submit(self, rows: pd.DataFrame) -> Future:
+        """Queue rows for prediction. Raises `BatcherStopped` after `stop`.
+
+        Arguments:
+            rows -- The predictor rows, see `prepare`.
+
+        Returns:
+            A future of the predicted probabilities of the rows.
+        """
+        future: Future = Future()
+        # Under the lock, so no rows are queued after the stop sentinel.
+        with self._lock:
+            if self._stopped:
+                raise BatcherStopped("The batcher of the model is stopped.")
+            self._queue.put((rows, future))
+        return future
+
+    def stop(self) -> None:
+        """Stop the batching thread (after the queued requests are handled)."""
+        with self._lock:
+            self._stopped = True
+            self._queue.put(None)
+
+    def _next_batch(self) -> Optional[List[Tuple[pd.DataFrame, Future]]]:
+        """Wait for the next batch of requests. Returns None when stopped."""
+        item = self._queue.get()
+        if item is None:
+            return None
+        batch = [item]
+        n_rows = len(item[0])
+        deadline = time.perf_counter() + self.max_wait_ms / 1000
+        while n_rows < self.max_batch_rows:
+            try:
+                item = self._queue.get(timeout=max(0.0, deadline - time.perf_counter()))
+            except queue.Empty:
+                break
+            if item is None:
+                self._queue.put(None)  # Stop after this batch.
+                break
+            batch.append(item)
+            n_rows += len(item[0])
+        return batch
+
+    def _convert_types(self, data: pd.DataFrame) -> pd.DataFrame:
+        """Convert the categorical columns like the DataLoader does."""
+        # NOTE! The column types can not be derived from the values of a small batch
+        # (e.g. a numerical column holding only nulls is an object column), so
+        # convert by name: the categorical columns of the training data, and the
+        # other columns are numerical.
+        for column in data.columns:
+            if column in self.categories:
+                categories = self.categories[column]
+                data[column] = pd.Categorical(data[column], categories=categories)
+            elif data[column].dtype == "object":
+                data[column] = data[column].astype(float)
+        return data
+
+    def _to_sparse(self, data: pd.DataFrame) -> Any:
+        """Stack the predictors and the genes as a sparse mutation matrix, like
+        `DataLoader.get_sparse_data` does for the training data (XGBoost reads the
+        absent entries as missing values, not as the zeros of dense columns)."""
+        mutations = MutationMatrix.from_dataframe(data, self.genes)
+        matrix, _ = mutations.hstack(data[self.columns])
+        return matrix
+
+    def _run(self) -> None:
+        while True:
+            batch = self._next_batch()
+            if batch is None:
+                return
+            try:
+                data = pd.concat([rows for rows, _ in batch], ignore_index=True)
+                if self.categories is None:
+                    # Without training data, the categories are the batch values.
+                    object_columns = data.columns[data.dtypes == "object"].tolist()
+                    data[object_columns] = data[object_columns].astype("category")
+                if self.genes:
+                    data = self._to_sparse(data)
+                start = time.perf_counter()
+                probabilities = np.ravel(self.model.predict_proba(data))
+                self.stats.record_batch(time.perf_counter() - start, data.shape[0])
+            except Exception as error:  # Report the error to every waiting request.
+                for _, future in batch:
+                    future.set_exception(error)
+                continue
+
+            offset = 0
+            for rows, future in batch:
+                future.set_result(probabilities[offset : offset + len(rows)])
+                offset += len(rows)
+
+
+class ModelCache:
+    """A least recently used cache of loaded experiments (model, config and micro
+    batcher), so repeated requests do not reload the config and the model.
+
+    Public methods:
+    get -- Returns the (possibly cached) config and batcher of an experiment.
+
+    Instance variables:
+    max_models -- The maximum number of loaded experiments.
+    max_batch_rows -- The maximum number of rows per inference batch.
+    max_wait_ms -- The maximum time a batch waits for more requests.
+    stats -- The server counters.
+    """
+
+    def __init__(
+        self, max_models: int, max_batch_rows: int, max_wait_ms: float, stats: ServerStats
+    ) -> None:
+        self.max_models = max_models
+        self.max_batch_rows = max_batch_rows
+        self.max_wait_ms = max_wait_ms
+        self.stats = stats
+        self._entries: OrderedDict = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _load(self, experiment_folder: Path) -> Tuple[dict, MicroBatcher]:
+        """Load the config and model of an experiment folder."""
+        config = read_config(experiment_folder / "config/model_config.yml")
+        model_class = get_model_class(config["model"])
+        model = model_class.from_config(config, None, experiment_folder / "model")
+
+        encoder = None
+        data_path = Path(config.get("preprocessed_data_path", ""))
+        encoder_path = model_encoder_path(experiment_folder, data_path)
+        if encoder_path.is_file():
+            encoder = OneHotEncoder.load(encoder_path)
+
+        # Use the categories of the training data, so the category codes do not
+        # depend on the rows of a batch, and its columns (encoded like the
+        # DataLoader encodes them) and sparse mutation genes.
+        categories, columns, genes = None, None, None
+        if data_path.is_file():
+            dataloader = DataLoader(data_path, config["gt_column"])
+            categories = dataloader.categories()
+            header = pd.DataFrame(columns=data_columns(data_path))
+            if encoder and encoder.applies_to(header):
+                header = encoder.transform(header)
+            columns = [c for c in header.columns if c != config["gt_column"]]
+            if model_class.SUPPORTS_SPARSE:
+                genes = mutation_genes_for(data_path)
+
+        batcher = MicroBatcher(
+            model,
+            categories,
+            self.max_batch_rows,
+            self.max_wait_ms,
+            self.stats,
+            encoder,
+            columns,
+            genes,
+        )
+        return config, batcher
+
+    def get(self, experiment_folder: Path) -> Tuple[dict, MicroBatcher]:
+        """Returns the config and batcher of an experiment, loading it on a cache miss
+        and evicting the least recently used experiment when the cache is full.
+
+        Arguments:
+            experiment_folder -- The experiment folder of the trained model.
+        """
+        key = str(Path(experiment_folder).resolve())
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.stats.count("cache_hits")
+                return self._entries[key]
+
+            # NOTE! Loading holds the lock, concurrent misses are loaded one at a time.
+            self.stats.count("cache_misses")
+            entry = self._load(Path(experiment_folder))
+            self._entries[key] = entry
+            if len(self._entries) > self.max_models:
+                _, (_, evicted) = self._entries.popitem(last=False)
+                evicted.stop()
+                self.stats.count("cache_evictions")
+            return entry
+
+
+def make_handler(cache: ModelCache, stats: ServerStats) -> type:
+    """Create the request handler class of the prediction server.
+
+    Endpoints:
+        POST /predict -- Body: {"experiment_folder": <path>, "data": [<row>, ...]}
+            where every row maps the columns of the training data (in any order)
+            to values. Returns
+            {"predicted": [...], "probability": [...]} with the predicted label
+            and the probability of the class labelled 1 of every row.
+        GET /stats -- Returns the latency, throughput and cache counters.
+
+    Arguments:
+        cache -- The model cache.
+        stats -- The server counters.
+    """
+
+    class PredictionHandler(BaseHTTPRequestHandler):
+        def _send_json(self, status: int, body: dict) -> None:
+            content = json.dumps(body).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+
+        def do_GET(self) -> None:
+            if self.path == "/stats":
+                self._send_json(200, stats.to_dict())
+            else:
+                self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+        def do_POST(self) -> None:
+            if self.path != "/predict":
+                self._send_json(404, {"error": f"Unknown path {self.path}"})
+                return
+
+            start = time.perf_counter()
+            try:
+                length = int(self.headers.get("Content-Length", 0))
+                request = json.loads(self.rfile.read(length))
+                experiment_folder = Path(request["experiment_folder"])
+                config, batcher = cache.get(experiment_folder)
+                rows = pd.DataFrame.from_records(request["data"])
+                rows = rows.drop(columns=[config["gt_column"]], errors="ignore")
+                rows = batcher.prepare(rows)
+                try:
+                    future = batcher.submit(rows)
+                except BatcherStopped:
+                    # Evicted after the lookup, the experiment is loaded again.
+                    _, batcher = cache.get(experiment_folder)
+                    future = batcher.submit(rows)
+                probabilities = future.result(timeout=REQUEST_TIMEOUT_SECONDS)
+            except Exception as error:
+                stats.count("errors")
+                self._send_json(400, {"error": f"{type(error).__name__}: {error}"})
+                return
+
+            stats.record_request(time.perf_counter() - start, len(rows))
+            predicted = (probabilities > DECISION_THRESHOLD).astype(int)
+            self._send_json(
+                200,
+                {"predicted": predicted.tolist(), "probability": probabilities.tolist()},
+            )
+
+        def log_message(self, format: str, *args: Any) -> None:
+            pass  # Keep the terminal clean, see /stats for the request counters.
+
+    return PredictionHandler
+
+
+class PredictionServer(ThreadingHTTPServer):
+    """A threaded HTTP server with a listen backlog for bursts of concurrent clients."""
+
+    request_queue_size = 128
+
+
+def create_server(
+    host: str = "127.0.0.1",
+    port: int = 8080,
+    cache_size: int = 4,
+    max_batch_rows: int = 256,
+    max_wait_ms: float = 5.0,
+) -> PredictionServer:
+    """Create a (threaded) HTTP prediction server. Start it with `serve_forever()`.
+
+    Keyword Arguments:
+        host -- The host to listen on. (default: {"127.0.0.1"})
+        port -- The port to listen on, 0 picks a free port. (default: {8080})
+        cache_size -- The maximum number of loaded experiments. (default: {4})
+        max_batch_rows -- The maximum number of rows per inference batch.
+            (default: {256})
+        max_wait_ms -- The maximum time a batch waits for more requests.
+            (default: {5.0})
+    """
+    stats = ServerStats()
+    cache = ModelCache(cache_size, max_batch_rows, max_wait_ms, stats)
+    return PredictionServer((host, port), make_handler(cache, stats))
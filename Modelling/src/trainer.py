@@ -1,12 +1,22 @@
+import copy
+import time
 from pathlib import Path
 from typing import Optional
 
+import numpy as np
 import pandas as pd
 
+from src.cross_validation import (cross_validate, make_fold_plan,
+                                  save_cross_validation)
+from src.data_format import densify, write_data
 from src.dataloader import DataLoader
-from src.models import (KERAS_MODEL_NAME, XGBOOST_MODEL_NAME, BaseModel,
-                        KerasFeedForward, XGBoost)
-from src.utils import prepare_save_folder, read_config
+from src.encoding import ENCODER_FILE_NAME, model_encoder_path
+from src.models import DECISION_THRESHOLD, BaseModel, get_model_class
+from src.mutation_matrix import mutation_genes_for
+from src.schema import schema_path_for
+from src.search import HyperparameterSearch
+from src.utils import (prepare_save_folder, read_config,
+                       resolve_preprocessed_data_path)
 
 MODEL_OUTPUT_FOLDER = Path("output/models")
 
@@ -16,14 +26,18 @@ class Trainer:
 
     Public methods:
     train -- Train the model using the training data.
+    search -- Search the model arguments, then train and save the best model.
     predict -- Run inference on the input data set
             and save the intput data together with the predictions.
+    predict_streaming -- Like predict, but read, predict and save the input
+            data in chunks of rows.
 
     Instance variables:
     config -- The path to the model configuration.
     dataloader -- The configured data loader.
     model_type -- The type of machine learning model to load.
     model -- A instance of the BaseModel machine learning class.
+    output_dir -- The experiment folder of the last trained model.
     """
 
     def __init__(
@@ -31,6 +45,7 @@ class Trainer:
         config_path: Path,
         resume_model: Optional[Path] = None,
         data_path: Optional[Path] = None,
+        load_data: bool = True,
     ):
         """Initialize the trainer class.
 
@@ -42,13 +57,31 @@ class Trainer:
                 (default: {None})
             data_path -- The path to the input data set. Note! The path to the
                 training data is configured using the config file. (default: {None})
+            load_data -- Load the complete data set at initialization. Not needed
+                for `predict_streaming`. (default: {True})
         """
         self.config = read_config(config_path)
 
         if not data_path:
+            resolve_preprocessed_data_path(self.config)
             data_path = Path(self.config["preprocessed_data_path"])
-        self.dataloader = DataLoader(data_path, self.config["gt_column"])
-        self.dataloader.load_data()
+        # Read any data with the schema of the training data, so the categories
+        # (and category codes) are the ones the model was trained with, one hot
+        # encode data that is not encoded with the encoder of the model, and keep the
+        # genes of a model trained on sparse mutations as sparse mutations.
+        training_data_path = Path(self.config["preprocessed_data_path"])
+        experiment_folder = Path(resume_model).parent if resume_model else None
+        self.dataloader = DataLoader(
+            data_path,
+            self.config["gt_column"],
+            schema_path_for(training_data_path),
+            model_encoder_path(experiment_folder, training_data_path)
+            if experiment_folder
+            else None,
+            mutation_genes_for(training_data_path),
+        )
+        if load_data:
+            self.dataloader.load_data()
 
         self.model_type = self.config["model"]
         self.model = self._init_model(resume_model)
@@ -62,20 +95,15 @@ class Trainer:
                 (default: {None})
         """
         print("Initiating the model..")
-        if self.model_type == XGBOOST_MODEL_NAME:
-            return XGBoost(self.config, model_path)
-        elif self.model_type == KERAS_MODEL_NAME:
-            # Get number of columns in the input data. It is needed when building the model.
-            number_of_columns = len(self.dataloader.get_data().columns)
+        model_class = get_model_class(self.model_type)
+        return model_class.from_config(self.config, self.dataloader, model_path)
 
-            return KerasFeedForward(self.config, number_of_columns, model_path)
-        else:
-            assert (
-                False
-            ), "ERROR: No matching model type found! Check spelling in the model config file?"
+    def _save_trained_model(self) -> Path:
+        """Save the machine learning model to disk.
 
-    def _save_trained_model(self) -> None:
-        """Save the machine learning model to disk."""
+        Returns:
+            The path to the experiment folder.
+        """
         # Prepare save folder.
         output_dir = prepare_save_folder(
             MODEL_OUTPUT_FOLDER,
@@ -86,12 +114,65 @@ class Trainer:
 
         # Save the model in the model directory.
         self.model.save_model(output_dir / "model")
+        # The encoder of the training data, to encode the data the model predicts on.
+        if self.dataloader.encoder:
+            self.dataloader.encoder.save(output_dir / ENCODER_FILE_NAME)
         print(f"Saved the model artifacts to {output_dir}")
+        return output_dir
+
+    def _cross_validate(self, output_dir: Path) -> None:
+        """Cross-validate the configured model on the training data (see the
+        `cross_validation` block of the model config) and save the per fold
+        metrics and timings in the experiment folder.
+
+        Arguments:
+            output_dir -- The experiment folder.
+        """
+        cv_config = self.config["cross_validation"]
+        model_class = get_model_class(self.model_type)
+
+        if self.dataloader.has_mutations() and model_class.SUPPORTS_SPARSE:
+            x, feature_names = self.dataloader.get_sparse_data()
+        else:
+            x, feature_names = self.dataloader.get_data(), None
+        y = self.dataloader.get_ground_truth()
+
+        group_column = cv_config.get("group_column")
+        fold_plan = make_fold_plan(
+            y,
+            n_splits=cv_config.get("n_splits", 5),
+            random_seed=cv_config.get("random_seed", self.config["random_seed"]),
+            stratify=cv_config.get("stratify", False),
+            groups=self.dataloader.data[group_column] if group_column else None,
+        )
+
+        # Every fold trains a new model, with the number of threads given by the
+        # thread budget.
+        def make_model(n_threads: int) -> BaseModel:
+            config = copy.deepcopy(self.config)
+            if model_class.N_JOBS_ARG:
+                config["args"][model_class.N_JOBS_ARG] = n_threads
+            return model_class.from_config(config, self.dataloader)
+
+        print("\n--------Cross-validating-------")
+        start = time.perf_counter()
+        results = cross_validate(
+            make_model,
+            x,
+            y,
+            fold_plan,
+            n_jobs=cv_config.get("n_jobs", 1),
+            threaded_model=model_class.N_JOBS_ARG is not None,
+            feature_names=feature_names,
+        )
+        save_cross_validation(
+            results, fold_plan, output_dir / "cross_validation", time.perf_counter() - start
+        )
 
     def _save_prediction(
         self,
         data: pd.DataFrame,
-        y_pred: pd.DataFrame,
+        probabilities: np.ndarray,
         y_true: pd.DataFrame,
         output_file: Path,
     ) -> None:
@@ -99,20 +180,46 @@ class Trainer:
 
         Arguments:
             data -- The input data set (predictor data set).
-            y_pred -- The predicted values.
+            probabilities -- The predicted probabilities of the class labelled 1.
             y_true -- The ground truth values.
             output_path -- The path where to save the resulting data set.
         """
         print(f"\nSaving predictions to {output_file}")
         output_file.parent.mkdir(exist_ok=True, parents=True)
 
-        # Save predictions to csv file.
+        # Save predictions in the format of the file suffix (csv, parquet, feather).
         data[self.config["gt_column"]] = y_true
-        data["predicted"] = y_pred
-        data.to_csv(output_file, index=False)
+        self._add_predictions(data, probabilities)
+        write_data(data, output_file)
 
-    def train(self) -> None:
-        """Train the model using the training data (specified in the config file)."""
+    @staticmethod
+    def _add_predictions(data: pd.DataFrame, probabilities: np.ndarray) -> None:
+        """Add the predicted labels and the predicted probabilities (the scores,
+        from which the analysis can evaluate other thresholds) to a data set.
+
+        Arguments:
+            data -- The data set to add the prediction columns to.
+            probabilities -- The predicted probabilities of the class labelled 1.
+        """
+        data["predicted"] = (probabilities > DECISION_THRESHOLD).astype(int)
+        data["probability"] = probabilities
+
+    def _train_sparse(self) -> None:
+        """Train the model on the predictors and the sparse mutation matrix
+        without densifying the mutations."""
+        x_train, feature_names = self.dataloader.get_sparse_data()
+        y_train = self.dataloader.get_ground_truth()
+
+        print(
+            f"\n\nTraining on a sparse matrix with {x_train.shape[0]} rows, "
+            f"{x_train.shape[1]} columns and {x_train.nnz} stored values."
+        )
+        print("\n--------Training model-------")
+        self.model.train(x_train, y_train, feature_names=feature_names)
+        print("\n---------Finished!----------")
+
+    def _train_dense(self) -> None:
+        """Train the model on the predictors as a Pandas dataframe."""
         x_train = self.dataloader.get_data()
         y_train = self.dataloader.get_ground_truth()
 
@@ -127,20 +234,106 @@ class Trainer:
         self.model.train(x_train, y_train)
         print("\n---------Finished!----------")
 
-        self._save_trained_model()
+    def train(self) -> None:
+        """Train the model using the training data (specified in the config file)."""
+        if self.dataloader.has_mutations() and self.model.SUPPORTS_SPARSE:
+            self._train_sparse()
+        else:
+            self._train_dense()
+
+        self.output_dir = self._save_trained_model()
+        if "cross_validation" in self.config:
+            self._cross_validate(self.output_dir)
+
+    def search(self) -> None:
+        """Search the model arguments (see the `search` block of the model config),
+        then train the best configuration on all training data and save it together
+        with the search leaderboard."""
+        assert "search" in self.config, "ERROR: No `search` block in the model config."
+        print("\n--------Searching model arguments-------")
+        leaderboard, best_config = HyperparameterSearch(self.config, self.dataloader).run()
+        print(f"\nLeaderboard:\n{leaderboard.to_string(index=False)}")
+        print(f"\nBest model arguments: {best_config['args']}")
+
+        # Train the best configuration. The saved config reproduces it with train.py.
+        self.config = best_config
+        self.model = self._init_model()
+        self.train()
+
+        search_dir = self.output_dir / "search"
+        search_dir.mkdir(exist_ok=True)
+        leaderboard.to_csv(search_dir / "leaderboard.csv", index=False)
+        print(f"Saved the search leaderboard to {search_dir}")
+
+    def _predict_proba(
+        self, dataloader: DataLoader, batch_size: Optional[int] = None
+    ) -> np.ndarray:
+        """Predict the probabilities of the class labelled 1 for the predictors of a
+        data loader.
+
+        Arguments:
+            dataloader -- The data loader holding the input data.
+
+        Keyword Arguments:
+            batch_size -- Number of rows per prediction batch. (default: {None})
+
+        Returns:
+            The predicted probabilities, one per row.
+        """
+        if dataloader.has_mutations() and self.model.SUPPORTS_SPARSE:
+            x_test, _ = dataloader.get_sparse_data()
+        else:
+            x_test = dataloader.get_data()
+        return np.ravel(self.model.predict_proba(x_test, batch_size=batch_size))
 
-    def predict(self, output_file: Path) -> None:
+    def predict(self, output_file: Path, batch_size: Optional[int] = None) -> None:
         """Run inference on the input data set and save the results.
 
         Arguments:
             output_file -- The path to where to save the resulting data set.
+
+        Keyword Arguments:
+            batch_size -- Number of rows per prediction batch. (default: {None})
         """
         x_test = self.dataloader.get_data()
         y_true = self.dataloader.get_ground_truth()
 
         print("Performing inference...")
-        y_pred = pd.DataFrame(self.model.inference(x_test), index=None, columns=None)
+        probabilities = self._predict_proba(self.dataloader, batch_size)
 
         self._save_prediction(
-            data=x_test, y_true=y_true, y_pred=y_pred, output_file=output_file
+            data=x_test,
+            y_true=y_true,
+            probabilities=probabilities,
+            output_file=output_file,
         )
+
+    def predict_streaming(
+        self, output_file: Path, chunk_size: int, batch_size: Optional[int] = None
+    ) -> None:
+        """Run inference on the input data set in chunks of rows and append the
+        results of every chunk to the output file, so that at most one chunk is held
+        in memory. The output is the same as the output of `predict`.
+
+        Arguments:
+            output_file -- The path to where to save the resulting data set.
+            chunk_size -- Number of rows to read, predict and save at a time.
+
+        Keyword Arguments:
+            batch_size -- Number of rows per prediction batch. (default: {None})
+        """
+        print(f"\nPerforming inference in chunks of {chunk_size} rows...")
+        output_file.parent.mkdir(exist_ok=True, parents=True)
+
+        n_rows = 0
+        for i, chunk in enumerate(self.dataloader.iter_chunks(chunk_size)):
+            data = chunk.get_data()
+            data[self.config["gt_column"]] = chunk.get_ground_truth()
+            self._add_predictions(data, self._predict_proba(chunk, batch_size))
+
+            # Write the header with the first chunk, append the following chunks.
+            densify(data).to_csv(
+                output_file, mode="a" if i else "w", header=not i, index=False
+            )
+            n_rows += len(data)
+            print(f"Saved predictions for {n_rows} rows to {output_file}")
@@ -1,3 +1,5 @@
+import hashlib
+import json
 from datetime import datetime
 from pathlib import Path
 from typing import Dict, List, Optional
@@ -5,6 +7,14 @@ from typing import Dict, List, Optional
 import git
 import oyaml
 
+from src.data_format import DATA_FORMATS
+
+PREPROCESSED_DATA_FOLDER = Path("data/preprocessed")
+
+# Name of the file (in a preprocessed data folder) holding the fingerprint of the
+# input data, preprocess config and preprocessing code the data was created from.
+FINGERPRINT_FILE_NAME = "fingerprint.json"
+
 
 def read_config(config_path: Path) -> dict:
     """Extract a configuration dict from a .yaml file.
@@ -100,3 +110,79 @@ def prepare_save_folder(
     save_git_status(output_dir)
 
     return output_dir
+
+
+def file_sha1(path: Path, chunk_size: int = 1 << 20) -> str:
+    """Returns the sha1 hash of the content of a file, read in chunks.
+
+    Arguments:
+        path -- The path to the file.
+
+    Keyword Arguments:
+        chunk_size -- Number of bytes to read at a time. (default: {1 MB})
+    """
+    sha = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+def find_preprocessed_data(
+    fingerprint: str, data_folder: Path = PREPROCESSED_DATA_FOLDER
+) -> Optional[Path]:
+    """Find the preprocessed data folder with the given fingerprint.
+
+    Arguments:
+        fingerprint -- The fingerprint, or a unique prefix of it.
+
+    Keyword Arguments:
+        data_folder -- The folder holding the preprocessed data folders.
+            (default: {PREPROCESSED_DATA_FOLDER})
+
+    Returns:
+        The path to the preprocessed data folder, None if there is no match.
+    """
+    matches = []
+    for fingerprint_file in sorted(Path(data_folder).glob(f"*/{FINGERPRINT_FILE_NAME}")):
+        with open(fingerprint_file) as f:
+            if json.load(f)["fingerprint"].startswith(fingerprint):
+                matches.append(fingerprint_file.parent)
+    assert len(matches) <= 1, (
+        f"ERROR: The fingerprint '{fingerprint}' matches several folders "
+        f"({', '.join(map(str, matches))})! Use a longer prefix."
+    )
+    return matches[0] if matches else None
+
+
+def resolve_preprocessed_data_path(
+    config: dict, data_folder: Path = PREPROCESSED_DATA_FOLDER
+) -> dict:
+    """Set the `preprocessed_data_path` of a model config from its
+    `preprocessed_data_fingerprint` (if given), i.e. the training data of the
+    preprocessed data folder with that fingerprint.
+
+    Arguments:
+        config -- The model config.
+
+    Keyword Arguments:
+        data_folder -- The folder holding the preprocessed data folders.
+            (default: {PREPROCESSED_DATA_FOLDER})
+
+    Returns:
+        The model config.
+    """
+    fingerprint = config.get("preprocessed_data_fingerprint")
+    if not fingerprint:
+        return config
+
+    folder = find_preprocessed_data(str(fingerprint), data_folder)
+    assert folder, (
+        f"ERROR: No preprocessed data with fingerprint '{fingerprint}' found in "
+        f"{data_folder}! Run preprocess.py first."
+    )
+    train_paths = [folder / f"data/train_data{suffix}" for suffix in DATA_FORMATS.values()]
+    train_path = next(path for path in train_paths if path.is_file())
+    print(f"Using the preprocessed data {train_path} (fingerprint {fingerprint}).")
+    config["preprocessed_data_path"] = str(train_path)
+    return config
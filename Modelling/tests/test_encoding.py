@@ -0,0 +1,31 @@
+import numpy as np
+import pandas as pd
+
+from src.encoding import OneHotEncoder
+
+
+def test_drop_first_encodes_unknown_levels_as_missing() -> None:
+    training_data = pd.DataFrame(
+        {"Sex": ["Female", "Male", "Male"], "Histology": ["Adeno", "Squamous", "Adeno"]}
+    )
+    encoder = OneHotEncoder.combine(
+        [
+            OneHotEncoder.fit(training_data, ["Sex"], drop_first=True),
+            OneHotEncoder.fit(training_data, ["Histology"]),
+        ]
+    )
+
+    # The first level, a known level, an unknown level and a missing value.
+    new_data = pd.DataFrame(
+        {
+            "Sex": ["Female", "Male", "Other", None],
+            "Histology": ["Adeno", "Squamous", "Other", None],
+        }
+    )
+    encoded = encoder.transform(new_data)
+
+    np.testing.assert_array_equal(encoded["Sex_Male"], [0, 1, np.nan, np.nan])
+    # Without drop_first, all zeros is not a level.
+    assert encoded["Histology_Adeno"].tolist() == [1, 0, 0, 0]
+    assert encoded["Histology_Squamous"].tolist() == [0, 1, 0, 0]
+    assert encoded["Histology_Adeno"].dtype == np.uint8
@@ -0,0 +1,91 @@
+from pathlib import Path
+from typing import Callable, Tuple
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import infer
+from conftest import GENES, GT_COLUMN
+from src.schema import SCHEMA_FILE_NAME, DatasetSchema
+
+
+@pytest.fixture
+def experiment_folder(tmp_path: Path, train_xgboost: Callable[[Path], Path]) -> Path:
+    """Train a small XGBoost model on complete data with a schema (the flag and
+    ground truth columns are stored as integers)."""
+    rng = np.random.default_rng(0)
+    n_rows = 80
+    data = pd.DataFrame(
+        {
+            GT_COLUMN: rng.integers(0, 2, n_rows),
+            "Histology": rng.choice(["Adenocarcinoma", "Squamous"], n_rows),
+            "Diagnosis_Age": rng.uniform(40, 80, n_rows),
+            "Pan_2020_compound_muts": rng.integers(0, 2, n_rows),
+        }
+    )
+    data_folder = tmp_path / "data"
+    data_folder.mkdir()
+    data.to_csv(data_folder / "train_data.csv", index=False)
+    DatasetSchema.from_data(data).save(data_folder / SCHEMA_FILE_NAME)
+    return train_xgboost(data_folder / "train_data.csv")
+
+
+@pytest.fixture
+def data_with_missing_values(tmp_path: Path) -> Path:
+    """New data without labels and with missing values in an integer flag."""
+    data = pd.DataFrame(
+        {
+            GT_COLUMN: [np.nan, np.nan, np.nan],
+            "Histology": ["Adenocarcinoma", "Squamous", None],
+            "Diagnosis_Age": [55.0, np.nan, 70.0],
+            "Pan_2020_compound_muts": [1, np.nan, 0],
+        }
+    )
+    data_path = tmp_path / "new_data.csv"
+    data.to_csv(data_path, index=False)
+    return data_path
+
+
+@pytest.mark.parametrize("chunk_size", [None, 2])
+def test_infer_on_data_with_missing_values(
+    experiment_folder: Path,
+    data_with_missing_values: Path,
+    tmp_path: Path,
+    chunk_size: int,
+) -> None:
+    output_file = tmp_path / "predictions.csv"
+    infer.main(
+        experiment_folder, data_with_missing_values, output_file, chunk_size, None
+    )
+
+    predictions = pd.read_csv(output_file)
+    assert len(predictions) == 3
+    assert predictions[GT_COLUMN].isna().all()
+    assert predictions["probability"].between(0, 1).all()
+
+
+@pytest.mark.filterwarnings("error::FutureWarning")
+def test_sparse_model_predicts_dense_and_sparse_genes_alike(
+    sparse_experiment: Path,
+    sparse_new_data: Tuple[pd.DataFrame, Path],
+    tmp_path: Path,
+) -> None:
+    # The same rows with dense gene columns (in another column order).
+    new_data, sparse_path = sparse_new_data
+    dense_path = tmp_path / "dense_data.csv"
+    new_data[GENES[::-1] + [GT_COLUMN, "TMB", "Histology"]].to_csv(
+        dense_path, index=False
+    )
+
+    probabilities = []
+    runs = [(sparse_path, None), (dense_path, None), (dense_path, 7)]
+    for data_path, chunk_size in runs:
+        output_file = tmp_path / f"predictions_{data_path.stem}_{chunk_size}.csv"
+        infer.main(sparse_experiment, data_path, output_file, chunk_size, None)
+        predictions = pd.read_csv(output_file)
+        assert predictions[GENES].equals(new_data[GENES])
+        probabilities.append(predictions["probability"])
+
+    for other in probabilities[1:]:
+        np.testing.assert_allclose(other, probabilities[0], rtol=1e-6)
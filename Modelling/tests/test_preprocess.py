@@ -0,0 +1,97 @@
+from pathlib import Path
+from typing import List, Tuple
+
+import oyaml
+import pandas as pd
+import pytest
+
+from preprocess import preprocessor
+from preprocess.davids_preprocess import GENETIC_COLS_TO_REMOVE
+from src import utils
+from src.mutation_matrix import MutationMatrix, mutations_path_for
+
+DATA_PATH = Path(__file__).parent.parent / "data/all_features_control_included.tsv"
+
+# Gene columns of the data kept by the pipeline config below.
+KEPT_GENES = ["KRAS", "STK11", "TP53", "EGFR"]
+
+CONFIGS = {
+    "davids_preprocessor": {
+        "studies_to_exclude": ["Jordan_2017", "Model_Control"],
+    },
+    "pipeline": {
+        "steps": [
+            {
+                "step": "drop_columns",
+                "columns": [
+                    gene for gene in GENETIC_COLS_TO_REMOVE if gene not in KEPT_GENES
+                ],
+            },
+            {"step": "dropna", "subset": ["Histology"]},
+        ],
+    },
+}
+
+
+def write_config(tmp_path: Path, name: str, gene_panel: List[str] = None) -> Path:
+    """Write the preprocess config of the given preprocessor (reading the genes of
+    the gene panel as a sparse mutation matrix, if given)."""
+    config = {
+        "preprocessor_name": name,
+        "test_set_size": 0.2,
+        "random_seed": 42,
+        "output_name": name,
+        "data_path": str(DATA_PATH),
+        **CONFIGS[name],
+    }
+    if gene_panel:
+        panel_path = tmp_path / "gene_panel.txt"
+        panel_path.write_text("gene_list:\t" + "\t".join(gene_panel) + "\n")
+        config["sparse_mutations"] = {"gene_panel_path": str(panel_path)}
+    config_path = tmp_path / f"{name}_config.yml"
+    config_path.write_text(oyaml.dump(config))
+    return config_path
+
+
+def run_preprocessor(
+    tmp_path: Path, name: str, gene_panel: List[str] = None
+) -> Tuple[pd.DataFrame, List[str]]:
+    """Preprocess the data with the given preprocessor and return the training data
+    and the genes of its sparse mutation matrix (if any)."""
+    config_path = write_config(tmp_path, name, gene_panel)
+    output_dir = preprocessor.Preprocessor(config_path).process(force=True)
+    train_path = output_dir / "data/train_data.csv"
+    genes = []
+    if gene_panel:
+        genes = MutationMatrix.load(mutations_path_for(train_path)).genes
+    return pd.read_csv(train_path), genes
+
+
+@pytest.mark.parametrize("name", list(CONFIGS))
+def test_sparse_mutations_keep_the_dense_features(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch, name: str
+) -> None:
+    monkeypatch.setattr(preprocessor, "DATA_FOLDER", tmp_path / "preprocessed")
+    dense, _ = run_preprocessor(tmp_path, name)
+    sparse, genes = run_preprocessor(tmp_path, name, GENETIC_COLS_TO_REMOVE)
+
+    assert not set(genes) & set(sparse.columns)
+    assert sorted(sparse.columns.tolist() + genes) == sorted(dense.columns)
+    assert len(sparse) == len(dense)
+    if name == "pipeline":
+        assert sorted(genes) == sorted(KEPT_GENES)
+
+
+def test_forced_preprocessing_replaces_the_fingerprint(
+    tmp_path: Path, monkeypatch: pytest.MonkeyPatch
+) -> None:
+    monkeypatch.setattr(preprocessor, "DATA_FOLDER", tmp_path / "preprocessed")
+    # A new folder name for every run.
+    times = iter(["20260101-000000", "20260101-000001"])
+    monkeypatch.setattr(utils, "get_current_datetime", lambda: next(times))
+    config_path = write_config(tmp_path, "pipeline")
+
+    first = preprocessor.Preprocessor(config_path).process()
+    forced = preprocessor.Preprocessor(config_path).process(force=True)
+    assert forced != first
+    assert preprocessor.Preprocessor(config_path).process() == forced
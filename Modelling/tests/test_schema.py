@@ -0,0 +1,33 @@
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from src.dataloader import DataLoader
+from src.schema import SCHEMA_FILE_NAME, DatasetSchema
+
+
+def test_flags_are_read_as_nullable_integers(tmp_path: Path) -> None:
+    training_data = pd.DataFrame(
+        {
+            "Treatment_Outcome": [0, 1, 1],
+            "KRAS": [0, 1, 0],
+            "TMB": [1.5, 10.25, 3.0],
+            "Histology": ["Adenocarcinoma", "Squamous", "Squamous"],
+        }
+    )
+    DatasetSchema.from_data(training_data).save(tmp_path / SCHEMA_FILE_NAME)
+
+    # New data: no labels and a missing gene flag.
+    data_path = tmp_path / "new_data.csv"
+    new_data = training_data.assign(Treatment_Outcome=np.nan, KRAS=[1, np.nan, 0])
+    new_data.to_csv(data_path, index=False)
+
+    dataloader = DataLoader(data_path, "Treatment_Outcome")
+    dataloader.load_data()
+    dtypes = dataloader.data.dtypes
+    assert dtypes["KRAS"] == "Int8"
+    assert dtypes["TMB"] == "float32"
+    assert dtypes["Histology"] == "category"
+    assert dataloader.data["KRAS"].isna().tolist() == [False, True, False]
+    assert dataloader.get_ground_truth().isna().all()
@@ -0,0 +1,185 @@
+import json
+import threading
+import urllib.error
+import urllib.request
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import infer
+from conftest import GT_COLUMN, mutation_data
+from src.schema import SCHEMA_FILE_NAME, DatasetSchema
+from src.server import BatcherStopped, ModelCache, ServerStats, create_server
+
+
+@pytest.fixture
+def start_server() -> Iterator[Callable[..., str]]:
+    """Returns a function starting a prediction server on a free localhost port
+    (with the given `create_server` arguments) and returning its url."""
+    servers = []
+
+    def start(**kwargs: Any) -> str:
+        server = create_server(port=0, **kwargs)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        servers.append(server)
+        return f"http://127.0.0.1:{server.server_address[1]}"
+
+    yield start
+    for server in servers:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def experiments(tmp_path: Path, train_xgboost: Callable[..., Path]) -> List[Path]:
+    """Train two small XGBoost models on data with dense gene columns."""
+    data_folder = tmp_path / "data"
+    data_folder.mkdir()
+    data = mutation_data(80, seed=0)
+    data.to_csv(data_folder / "train_data.csv", index=False)
+    DatasetSchema.from_data(data).save(data_folder / SCHEMA_FILE_NAME)
+    return [
+        train_xgboost(data_folder / "train_data.csv", name) for name in ["a", "b"]
+    ]
+
+
+@pytest.fixture
+def rows() -> List[Dict[str, Any]]:
+    """Rows to predict on."""
+    return records(mutation_data(8, seed=1).drop(columns=[GT_COLUMN]))
+
+
+def post(url: str, experiment_folder: Path, rows: List[dict]) -> Tuple[int, dict]:
+    """Post a prediction request, returns the status and the response body."""
+    body = json.dumps({"experiment_folder": str(experiment_folder), "data": rows})
+    request = urllib.request.Request(
+        f"{url}/predict",
+        data=body.encode(),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, json.loads(response.read())
+    except urllib.error.HTTPError as error:
+        return error.code, json.loads(error.read())
+
+
+def post_concurrently(
+    url: str, experiment_folder: Path, requests: List[List[dict]]
+) -> List[Tuple[int, dict]]:
+    """Post the requests at the same time, returns the status and the response body
+    of every request."""
+    results: List[Tuple[int, dict]] = [None] * len(requests)
+
+    def send(i: int) -> None:
+        results[i] = post(url, experiment_folder, requests[i])
+
+    threads = [threading.Thread(target=send, args=(i,)) for i in range(len(requests))]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def stats(url: str) -> dict:
+    """Returns the server counters."""
+    with urllib.request.urlopen(f"{url}/stats", timeout=30) as response:
+        return json.loads(response.read())
+
+
+def records(data: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Returns the rows of a data frame as json records."""
+    return json.loads(data.to_json(orient="records"))
+
+
+def test_sparse_model_predicts_like_infer(
+    start_server: Callable[..., str],
+    sparse_experiment: Path,
+    sparse_new_data: Tuple[pd.DataFrame, Path],
+    tmp_path: Path,
+) -> None:
+    new_data, sparse_path = sparse_new_data
+    output_file = tmp_path / "predictions.csv"
+    infer.main(sparse_experiment, sparse_path, output_file, None, None)
+    expected = pd.read_csv(output_file)["probability"]
+
+    url = start_server()
+    status, response = post(
+        url, sparse_experiment, records(new_data.drop(columns=[GT_COLUMN]))
+    )
+    assert status == 200, response
+    np.testing.assert_allclose(response["probability"], expected, rtol=1e-6)
+
+
+def test_concurrent_requests_are_batched(
+    start_server: Callable[..., str], experiments: List[Path], rows: List[dict]
+) -> None:
+    url = start_server(max_wait_ms=200)
+    _, expected = post(url, experiments[0], rows)
+
+    results = post_concurrently(url, experiments[0], [[row] for row in rows])
+    assert [status for status, _ in results] == [200] * len(rows)
+    probabilities = [response["probability"][0] for _, response in results]
+    np.testing.assert_allclose(probabilities, expected["probability"], rtol=1e-6)
+
+    counters = stats(url)
+    assert counters["requests"] == len(rows) + 1
+    assert counters["batches"] < counters["requests"]
+    assert counters["batch_rows"] == 2 * len(rows)
+
+
+def test_rows_are_reordered_like_the_training_data(
+    start_server: Callable[..., str], experiments: List[Path], rows: List[dict]
+) -> None:
+    url = start_server()
+    _, expected = post(url, experiments[0], rows)
+    reversed_rows = [dict(reversed(list(row.items()))) for row in rows]
+    status, response = post(url, experiments[0], reversed_rows)
+    assert status == 200, response
+    assert response == expected
+
+
+def test_a_bad_request_fails_alone(
+    start_server: Callable[..., str], experiments: List[Path], rows: List[dict]
+) -> None:
+    url = start_server(max_wait_ms=200)
+    results = post_concurrently(
+        url, experiments[0], [[row] for row in rows] + [[{"bogus": 1}]]
+    )
+    assert [status for status, _ in results] == [200] * len(rows) + [400]
+    assert "not in the request" in results[-1][1]["error"]
+    assert stats(url)["errors"] == 1
+
+
+def test_cache_hits_and_evictions(
+    start_server: Callable[..., str], experiments: List[Path], rows: List[dict]
+) -> None:
+    url = start_server(cache_size=1)
+    first, second = experiments
+    for experiment_folder in [first, first, second, first]:
+        status, _ = post(url, experiment_folder, rows)
+        assert status == 200
+
+    counters = stats(url)
+    assert counters["cache_hits"] == 1
+    assert counters["cache_misses"] == 3
+    assert counters["cache_evictions"] == 2
+
+
+def test_an_evicted_batcher_takes_no_requests(
+    experiments: List[Path], rows: List[dict]
+) -> None:
+    cache = ModelCache(1, 256, 5.0, ServerStats())
+    _, batcher = cache.get(experiments[0])
+    prepared = batcher.prepare(pd.DataFrame.from_records(rows))
+    future = batcher.submit(prepared)
+    cache.get(experiments[1])  # Evicts the first experiment.
+
+    # Rows queued before the eviction are still predicted.
+    assert len(future.result(timeout=30)) == len(rows)
+    with pytest.raises(BatcherStopped):
+        batcher.submit(prepared)
@@ -5,10 +5,13 @@ from src.trainer import Trainer
 from src.utils import check_git_status
 
 
-def main(config_path: Path) -> None:
+def main(config_path: Path, search: bool) -> None:
     check_git_status()
     trainer = Trainer(config_path)
-    trainer.train()
+    if search:
+        trainer.search()
+    else:
+        trainer.train()
 
 
 if __name__ == "__main__":
@@ -26,6 +29,13 @@ if __name__ == "__main__":
         help="Path to model config file.",
         default="config/model/xgboost_model_config.yml",
     )
+    parser.add_argument(
+        "-s",
+        "--search",
+        action="store_true",
+        help="Search the model arguments using the `search` block of the config, "
+        "then train and save the best model.",
+    )
     args = vars(parser.parse_args())
 
     main(**args)